@@ -4,6 +4,11 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from .database import engine_options, configure_engine
+from .routing import RoutingSession, init_replicas
+from .instrumentation import init_instrumentation
+from .profiling import ProfilingMiddleware
+from .http_compression import CompressionMiddleware
 
 
 # Configure logging
@@ -12,7 +17,7 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
 
 
@@ -28,17 +33,104 @@ def create_app():
 
     # Configure the database
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///scriptscope.db")
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    # Optional read replicas (comma-separated URLs) used by GET requests
+    app.config["DATABASE_REPLICA_URLS"] = os.environ.get("DATABASE_REPLICA_URLS", "")
+    app.config["REPLICA_STICKY_SECONDS"] = int(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+    # Comment listing APIs are keyset-paginated; clients may ask for up to the max per page
+    app.config["COMMENTS_PAGE_SIZE"] = int(os.environ.get("COMMENTS_PAGE_SIZE", "20"))
+    app.config["COMMENTS_MAX_PAGE_SIZE"] = int(os.environ.get("COMMENTS_MAX_PAGE_SIZE", "100"))
+    app.config["SEARCH_PAGE_SIZE"] = int(os.environ.get("SEARCH_PAGE_SIZE", "20"))
+    # Apply pending schema migrations at startup; set AUTO_MIGRATE=0 to run
+    # `flask --app main db-upgrade` as a separate deploy step instead.
+    app.config["AUTO_MIGRATE"] = os.environ.get("AUTO_MIGRATE", "1") == "1"
+    # Per-request SQL stats: Server-Timing header, JSON log line, N+1 warnings
+    app.config["SQL_INSTRUMENTATION"] = os.environ.get("SQL_INSTRUMENTATION", "1") == "1"
+    app.config["SERVER_TIMING"] = os.environ.get("SERVER_TIMING", "1") == "1"
+    app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", "200"))
+    app.config["SQL_REPEAT_THRESHOLD"] = int(os.environ.get("SQL_REPEAT_THRESHOLD", "5"))
+    app.config["SQL_SLOWEST_STATEMENTS"] = int(os.environ.get("SQL_SLOWEST_STATEMENTS", "3"))
+    # Prometheus /metrics; with METRICS_TOKEN set, scrapers must send it as a bearer token
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN", "")
+    # Per-request profiling: admins send the header, or a fraction of requests is sampled
+    app.config["PROFILE_HEADER"] = os.environ.get("PROFILE_HEADER", "X-Profile")
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    app.config["PROFILE_SAMPLE_INTERVAL_MS"] = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+    app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", "")
+    app.config["PROFILE_KEEP"] = int(os.environ.get("PROFILE_KEEP", "50"))
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, app)
+    # gzip/brotli responses; static files use the siblings written by `compress-static`
+    app.config["COMPRESSION_ENABLED"] = os.environ.get("COMPRESSION_ENABLED", "1") == "1"
+    app.config["COMPRESSION_MIN_SIZE"] = int(os.environ.get("COMPRESSION_MIN_SIZE", "500"))
+    app.config["COMPRESSION_GZIP_LEVEL"] = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+    app.config["COMPRESSION_BROTLI_QUALITY"] = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, app)
+    # Fingerprinted bundles (backend/assets.py) are rebuilt when their sources change;
+    # unset means only in debug mode, deploys run `flask assets-build` instead
+    app.config["ASSETS_AUTO_BUILD"] = {"1": True, "0": False}.get(os.environ.get("ASSETS_AUTO_BUILD", ""))
+    # Rendered fragment cache (backend/pagecache.py): memory, sqlite, filesystem or none
+    app.config["PAGE_CACHE_BACKEND"] = os.environ.get("PAGE_CACHE_BACKEND", "sqlite")
+    app.config["PAGE_CACHE_PATH"] = os.environ.get("PAGE_CACHE_PATH", "")
+    app.config["PAGE_CACHE_MAX_ENTRIES"] = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", "5000"))
+    app.config["PAGE_CACHE_MAX_BYTES"] = int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    # Comment inserts: "direct" commits each one in its request; "queued" acknowledges at
+    # once and writes them in batches from a background thread (backend/comment_queue.py)
+    app.config["COMMENT_WRITE_MODE"] = os.environ.get("COMMENT_WRITE_MODE", "direct")
+    app.config["COMMENT_QUEUE_SIZE"] = int(os.environ.get("COMMENT_QUEUE_SIZE", "1000"))
+    app.config["COMMENT_QUEUE_TIMEOUT_MS"] = float(os.environ.get("COMMENT_QUEUE_TIMEOUT_MS", "100"))
+    app.config["COMMENT_BATCH_SIZE"] = int(os.environ.get("COMMENT_BATCH_SIZE", "200"))
+    app.config["COMMENT_FLUSH_MS"] = float(os.environ.get("COMMENT_FLUSH_MS", "50"))
+    app.config["COMMENT_QUEUE_DURABILITY"] = os.environ.get("COMMENT_QUEUE_DURABILITY", "log")
+    app.config["COMMENT_QUEUE_DIR"] = os.environ.get("COMMENT_QUEUE_DIR", "")
+    # Live comment streams (backend/comment_stream.py). Each open stream holds a
+    # connection, so only turn this on with gevent or gthread workers (see gunicorn.conf.py)
+    app.config["COMMENT_STREAM_ENABLED"] = os.environ.get("COMMENT_STREAM_ENABLED", "0") == "1"
+    app.config["COMMENT_STREAM_POLL_MS"] = float(os.environ.get("COMMENT_STREAM_POLL_MS", "1000"))
+    app.config["COMMENT_STREAM_HEARTBEAT_S"] = float(os.environ.get("COMMENT_STREAM_HEARTBEAT_S", "15"))
+    app.config["COMMENT_STREAM_MAX_SECONDS"] = float(os.environ.get("COMMENT_STREAM_MAX_SECONDS", "300"))
+    app.config["COMMENT_STREAM_MAX_CLIENTS"] = int(os.environ.get("COMMENT_STREAM_MAX_CLIENTS", "1000"))
+    app.config["COMMENT_STREAM_BACKLOG"] = int(os.environ.get("COMMENT_STREAM_BACKLOG", "200"))
+    # Largest operation list accepted by POST /api/batch (backend/batch.py)
+    app.config["BATCH_MAX_OPERATIONS"] = int(os.environ.get("BATCH_MAX_OPERATIONS", "100"))
+
+    # Section bodies are stored compressed (backend/compression.py): zlib, zstd or none
+    app.config["SECTION_COMPRESSION"] = os.environ.get("SECTION_COMPRESSION", "zlib")
+    app.config["SECTION_COMPRESSION_MIN_BYTES"] = int(os.environ.get("SECTION_COMPRESSION_MIN_BYTES", "1024"))
 
     db.init_app(app)
 
     # All model and blueprint imports/registrations must be inside app context
     with app.app_context():
+        configure_engine(db.engine)
+        replicas = init_replicas(app)
+        init_instrumentation(app, [db.engine] + replicas)
+        from .compression import init_compression
+        init_compression(app)
         from . import models
-        db.create_all()
+        from . import counters
+        from . import search
+        from . import rendering
+        from . import ordering
+        from .pagecache import init_page_cache
+        init_page_cache(app)
+        from .assets import init_assets
+        init_assets(app)
+        from .metrics import init_metrics
+        init_metrics(app, [db.engine] + replicas)
+        if app.config["AUTO_MIGRATE"]:
+            from .migrations import upgrade
+            upgrade(db.engine)
+        from .comment_stream import init_comment_stream
+        init_comment_stream(app)
+        from .comment_queue import init_comment_queue
+        init_comment_queue(app)
         from . import routes
         app.register_blueprint(routes.routes_bp)
 
+    from .commands import register_commands
+    register_commands(app)
+
     return app
 
 # Create app instance for production use
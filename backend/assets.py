@@ -0,0 +1,428 @@
+"""Static asset pipeline: vendored libraries, bundles and fingerprinted filenames.
+
+``flask --app main assets-build`` does three things:
+
+1. Downloads the third-party files in ``VENDOR`` (Bootstrap, Font Awesome,
+   the Inter font, the editor libraries) into ``frontend/vendor/``, following
+   ``url()`` references in their CSS (web fonts). Every download is checked
+   against its SHA-256 in the committed ``frontend/vendor.lock.json``; a file
+   without an entry is refused unless ``--update-lock`` records it.
+2. Concatenates and minifies the files of every bundle in ``BUNDLES``
+   (minification needs the optional ``rcssmin``/``rjsmin`` packages). Fonts
+   and images referenced from CSS are copied next to the bundle and the
+   ``url()`` is rewritten.
+3. Writes everything to ``frontend/static/dist/`` under content-hashed names
+   (``app.3f9c2a1b7d.css``) with ``manifest.json`` mapping bundle names to
+   files. The previous build's files are kept, so pages rendered just before
+   a deploy still load.
+
+Templates refer to bundles by name with ``{{ asset_tags('app.css') }}``
+(or ``asset_url()`` for a single file). Files under ``dist/`` never change
+once written, so they are served with a one-year ``immutable`` cache
+lifetime.
+
+With ``ASSETS_AUTO_BUILD`` (on by default only in debug mode) the bundles are
+rebuilt at startup without downloading when the manifest is missing or older
+than its sources; otherwise build them as part of the deploy. Builds take a
+lock file in ``dist/``, so workers starting together build once. A vendor
+bundle whose files haven't been downloaded yet falls back to the public CDN
+URLs, with ``integrity`` attributes from the lock file.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import urllib.request
+from contextlib import contextmanager
+from urllib.parse import urljoin
+from flask import current_app, request, url_for
+from markupsafe import Markup, escape
+
+try:
+    import rcssmin
+except ImportError:  # optional dependency
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:  # optional dependency
+    rjsmin = None
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+BUILD_LOCK = '.build.lock'
+ONE_YEAR = 365 * 24 * 3600
+
+_INTER = 'https://cdn.jsdelivr.net/npm/@fontsource/inter@5.0.16/latin-{}.css'
+_INTER_WEIGHTS = (300, 400, 500, 600, 700, 800)
+
+# Local path under frontend/vendor -> pinned upstream URL
+VENDOR = {
+    'bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
+    'bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+    'fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+    **{f'inter/latin-{weight}.css': _INTER.format(weight) for weight in _INTER_WEIGHTS},
+    'quill/quill.snow.css': 'https://cdn.jsdelivr.net/npm/quill@2.0.3/dist/quill.snow.css',
+    'quill/quill.js': 'https://cdn.jsdelivr.net/npm/quill@2.0.3/dist/quill.js',
+    'highlight/highlight.min.js': 'https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/highlight.min.js',
+    'highlight/atom-one-dark.min.css':
+        'https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/styles/atom-one-dark.min.css',
+    'katex/katex.min.css': 'https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.css',
+    'katex/katex.min.js': 'https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.js',
+}
+
+# Bundle name -> sources, in load order. ``vendor/`` sources come from VENDOR,
+# the rest are paths under frontend/static.
+BUNDLES = {
+    'vendor.css': ['vendor/bootstrap/bootstrap.min.css', 'vendor/fontawesome/css/all.min.css',
+                   *(f'vendor/inter/latin-{weight}.css' for weight in _INTER_WEIGHTS)],
+    'vendor.js': ['vendor/bootstrap/bootstrap.bundle.min.js'],
+    'app.css': ['css/styles.css'],
+    'admin.js': ['js/main.js'],
+    'section.css': ['css/highlight.css'],
+    'chapter_detail.js': ['js/chapter_detail.js'],
+    'section_detail.js': ['js/section_detail.js'],
+    'editor.css': ['vendor/quill/quill.snow.css', 'vendor/highlight/atom-one-dark.min.css',
+                   'vendor/katex/katex.min.css'],
+    'editor.js': ['vendor/highlight/highlight.min.js', 'vendor/quill/quill.js', 'vendor/katex/katex.min.js'],
+}
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def frontend_dir(app):
+    return os.path.dirname(app.static_folder)
+
+
+def vendor_dir(app):
+    return os.path.join(frontend_dir(app), 'vendor')
+
+
+def dist_dir(app):
+    return os.path.join(app.static_folder, DIST)
+
+
+def _source_path(app, source):
+    if source.startswith('vendor/'):
+        return os.path.join(vendor_dir(app), source[len('vendor/'):])
+    return os.path.join(app.static_folder, source)
+
+
+def _is_relative(ref):
+    return not ref.startswith(('data:', 'http:', 'https:', '//', '/', '#'))
+
+
+def _write(path, data):
+    directory, name = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=f'.{name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+# --- Vendor downloads ---
+
+def _download(url):
+    request_ = urllib.request.Request(url, headers={'User-Agent': 'scriptscope-assets'})
+    with urllib.request.urlopen(request_, timeout=30) as response:
+        return response.read()
+
+
+def _lock_path(app):
+    return os.path.join(frontend_dir(app), 'vendor.lock.json')
+
+
+def read_lock(app):
+    """Vendor file name -> hex SHA-256, from ``vendor.lock.json``."""
+    try:
+        with open(_lock_path(app)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _fetch(root, name, url, lock, echo, update_lock):
+    path = os.path.join(root, name)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+    else:
+        if name not in lock and not update_lock:
+            raise ValueError(f'vendor/{name} has no SHA-256 in vendor.lock.json; '
+                             'run assets-build --update-lock to record it')
+        data = _download(url)
+        digest = hashlib.sha256(data).hexdigest()
+        if lock.setdefault(name, digest) != digest:
+            raise ValueError(f'{url} does not match the SHA-256 in vendor.lock.json')
+        _write(path, data)
+        echo(f'fetched vendor/{name} ({len(data)} bytes)')
+    if name.endswith('.css'):
+        for _, ref in _CSS_URL.findall(data.decode('utf-8')):
+            ref = ref.split('?', 1)[0].split('#', 1)[0]
+            if not ref or not _is_relative(ref):
+                continue
+            target = os.path.normpath(os.path.join(os.path.dirname(name), ref)).replace(os.sep, '/')
+            if target.startswith('..'):
+                continue
+            _fetch(root, target, urljoin(url, ref), lock, echo, update_lock)
+
+
+def fetch_vendor(app, echo=None, update_lock=False):
+    """Download missing vendor files (and the fonts their CSS refers to).
+
+    Raises ``ValueError`` for a download that doesn't match the lock file, or
+    that has no entry there unless ``update_lock`` is set, in which case its
+    hash is added. Returns the names that could not be downloaded.
+    """
+    echo = echo or (lambda message: None)
+    lock = read_lock(app)
+    failed = []
+    for name, url in VENDOR.items():
+        try:
+            _fetch(vendor_dir(app), name, url, lock, echo, update_lock)
+        except OSError as e:
+            failed.append(name)
+            echo(f'could not fetch {url}: {e}')
+    if update_lock:
+        _write(_lock_path(app), (json.dumps(lock, indent=2, sort_keys=True) + '\n').encode())
+    return failed
+
+
+# --- Building ---
+
+def _fingerprinted(name, data):
+    stem, ext = os.path.splitext(os.path.basename(name))
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+
+
+def _rewrite_urls(css, css_path, out, copied):
+    """Copy files referenced by ``url()`` into ``out`` under hashed names and point the CSS at them."""
+    def replace(match):
+        quote, ref = match.groups()
+        if not _is_relative(ref):
+            return match.group(0)
+        path_part = re.split(r'[?#]', ref, 1)[0]
+        suffix = ref[len(path_part):]
+        target = os.path.normpath(os.path.join(os.path.dirname(css_path), path_part))
+        if target not in copied:
+            if not os.path.isfile(target):
+                logger.warning('%s refers to missing %s', css_path, target)
+                return match.group(0)
+            with open(target, 'rb') as f:
+                data = f.read()
+            copied[target] = _fingerprinted(target, data)
+            _write(os.path.join(out, copied[target]), data)
+        return f'url({quote}{copied[target]}{suffix}{quote})'
+    return _CSS_URL.sub(replace, css)
+
+
+def _minify(text, kind, source):
+    if '.min.' in os.path.basename(source):
+        return text
+    if kind == '.css' and rcssmin is not None:
+        return rcssmin.cssmin(text)
+    if kind == '.js' and rjsmin is not None:
+        return rjsmin.jsmin(text)
+    return text
+
+
+def _read_manifest(app):
+    try:
+        with open(os.path.join(dist_dir(app), MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _build_lock(app):
+    """Hold an exclusive lock on ``dist/.build.lock`` (blocks while another process builds)."""
+    out = dist_dir(app)
+    os.makedirs(out, exist_ok=True)
+    with open(os.path.join(out, BUILD_LOCK), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _unsuffixed(entry):
+    """The bundle file a ``.gz``/``.br`` sibling belongs to."""
+    for suffix in ('.gz', '.br'):
+        if entry.endswith(suffix):
+            return entry[:-len(suffix)]
+    return entry
+
+
+def build(app, echo=None):
+    """Build every bundle into ``static/dist`` and write the manifest; returns the manifest."""
+    with _build_lock(app):
+        return _build(app, echo)
+
+
+def _build(app, echo=None):
+    echo = echo or (lambda message: None)
+    out = dist_dir(app)
+    previous = _read_manifest(app) or {}
+    bundles = {}
+    copied = {}
+    for name, sources in BUNDLES.items():
+        paths = [_source_path(app, source) for source in sources]
+        if not all(os.path.isfile(path) for path in paths):
+            # Vendor files not downloaded yet: load them from the CDN
+            bundles[name] = {'urls': [VENDOR[source[len('vendor/'):]] for source in sources]}
+            echo(f'{name}: vendor files missing, using CDN URLs')
+            continue
+        kind = os.path.splitext(name)[1]
+        parts = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            if kind == '.css':
+                text = _rewrite_urls(text, path, out, copied)
+            parts.append(_minify(text, kind, path))
+        # A separator keeps one script's missing semicolon from merging into the next
+        data = ('\n' if kind == '.css' else '\n;\n').join(parts).encode('utf-8')
+        filename = _fingerprinted(name, data)
+        if not os.path.exists(os.path.join(out, filename)):
+            _write(os.path.join(out, filename), data)
+        bundles[name] = {'file': filename}
+        echo(f'{name}: {filename} ({len(data)} bytes)')
+
+    files = sorted({bundle['file'] for bundle in bundles.values() if 'file' in bundle} | set(copied.values()))
+    manifest = {'bundles': bundles, 'files': files,
+                'version': hashlib.sha256(json.dumps(bundles, sort_keys=True).encode()).hexdigest()[:12]}
+    keep = set(files) | set(previous.get('files', [])) | {MANIFEST}
+    for entry in os.listdir(out):
+        # Dot files are the lock and temporary files of writes in progress
+        if not entry.startswith('.') and not entry.endswith('.tmp') and _unsuffixed(entry) not in keep:
+            os.remove(os.path.join(out, entry))
+    _write(os.path.join(out, MANIFEST), (json.dumps(manifest, indent=2, sort_keys=True) + '\n').encode())
+    return manifest
+
+
+def _stale(app, manifest):
+    if manifest is None or set(manifest.get('bundles', {})) != set(BUNDLES):
+        return True
+    built = os.path.getmtime(os.path.join(dist_dir(app), MANIFEST))
+    for name, sources in BUNDLES.items():
+        paths = [_source_path(app, source) for source in sources]
+        present = [os.path.getmtime(path) for path in paths if os.path.isfile(path)]
+        if 'urls' in manifest['bundles'][name]:
+            if len(present) == len(paths):
+                return True  # vendor files have been downloaded since
+        elif len(present) < len(paths) or max(present) > built:
+            return True
+    return False
+
+
+# --- Runtime ---
+
+def _auto_build(app):
+    setting = app.config['ASSETS_AUTO_BUILD']
+    return app.debug if setting is None else setting
+
+
+def _manifest():
+    app = current_app._get_current_object()
+    manifest = app.extensions.get('assets')
+    if manifest is None or (app.debug and _auto_build(app) and _stale(app, manifest)):
+        manifest = _load(app)
+    return manifest
+
+
+def _load(app):
+    manifest = _read_manifest(app)
+    if _auto_build(app) and _stale(app, manifest):
+        try:
+            with _build_lock(app):
+                # Another worker may have finished the build while this one waited
+                manifest = _read_manifest(app)
+                if _stale(app, manifest):
+                    manifest = _build(app)
+        except OSError:
+            logger.exception('Could not build static assets')
+    app.extensions['assets'] = manifest = manifest or {'bundles': {}, 'files': [], 'version': ''}
+    return manifest
+
+
+def asset_urls(name):
+    """URLs to load for a bundle: its fingerprinted file, or the unbundled sources before a build."""
+    bundle = _manifest()['bundles'].get(name)
+    if bundle and 'file' in bundle:
+        return [url_for('static', filename=f"{DIST}/{bundle['file']}")]
+    if bundle:
+        return bundle['urls']
+    sources = BUNDLES[name]
+    return [VENDOR[source[len('vendor/'):]] if source.startswith('vendor/') else url_for('static', filename=source)
+            for source in sources]
+
+
+def asset_url(name):
+    """URL of a built bundle."""
+    return asset_urls(name)[0]
+
+
+def _integrity(app, url):
+    """``integrity`` attribute for a CDN URL of a locked vendor file, else ''."""
+    hashes = app.extensions.get('vendor_integrity')
+    if hashes is None:
+        lock = read_lock(app)
+        hashes = app.extensions['vendor_integrity'] = {
+            VENDOR[name]: 'sha256-' + base64.b64encode(bytes.fromhex(lock[name])).decode()
+            for name in VENDOR if name in lock}
+    if url not in hashes:
+        return ''
+    return f' integrity="{hashes[url]}" crossorigin="anonymous"'
+
+
+def asset_tags(name):
+    """``<link>`` or ``<script>`` tags loading a bundle."""
+    if name.endswith('.css'):
+        tag = '<link rel="stylesheet" href="{}"{}>'
+    else:
+        tag = '<script src="{}"{}></script>'
+    app = current_app._get_current_object()
+    return Markup('\n'.join(tag.format(escape(url), _integrity(app, url)) for url in asset_urls(name)))
+
+
+def asset_version(app):
+    """Changes whenever a build changes any bundle; part of page ETags."""
+    manifest = app.extensions.get('assets') or _read_manifest(app) or {}
+    return manifest.get('version', '')
+
+
+def cache_static_response(response, filename):
+    """Give fingerprinted files under ``dist/`` a one-year immutable cache lifetime."""
+    filename = filename.replace(os.sep, '/')
+    if filename.startswith(f'{DIST}/') and filename != f'{DIST}/{MANIFEST}' and response.status_code in (200, 304):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = ONE_YEAR
+        response.cache_control.immutable = True
+    return response
+
+
+def _cache_static(response):
+    if request.endpoint == 'static':
+        cache_static_response(response, request.view_args.get('filename', ''))
+    return response
+
+
+def init_assets(app):
+    _load(app)
+    app.jinja_env.globals.update(asset_tags=asset_tags, asset_url=asset_url)
+    app.after_request(_cache_static)
@@ -0,0 +1,231 @@
+"""Batched admin writes for ``POST /api/batch``.
+
+The body is an ordered list of chapter and section operations::
+
+    {"mode": "atomic",
+     "operations": [
+         {"op": "create", "type": "chapter", "name": "Generators"},
+         {"op": "create", "type": "section", "chapter_id": "$0", "name": "yield", "content": "..."},
+         {"op": "update", "type": "section", "id": 12, "name": "Renamed"},
+         {"op": "delete", "type": "chapter", "id": 7}
+     ]}
+
+``"$<n>"`` in place of an id refers to the row created by operation ``n``
+of the same batch. Operations run in order in one transaction, with the same
+checks as the single-item endpoints (ownership, required fields, duplicate
+names). Each one gets a result with its own HTTP-style ``status``. A section
+update may give ``base_version`` and fails with 409 if the section has changed
+since.
+
+``mode`` is ``atomic`` (default) or ``best_effort``. An atomic batch stops at
+the first failure and rolls everything back; the later operations are
+reported as ``skipped``. A best-effort batch runs every operation in its own
+savepoint, so a failed one is undone alone and the rest are committed
+together. Search indexing, counters and page cache invalidation happen
+through the usual session events.
+"""
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from backend.app import db
+from backend.models import Chapter, Section
+
+MODES = ('atomic', 'best_effort')
+
+
+class OperationError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _resolve(value, created):
+    """Turn a ``"$<n>"`` reference into the id created by operation n."""
+    if isinstance(value, str) and value.startswith('$'):
+        try:
+            return created[int(value[1:])]
+        except (ValueError, KeyError):
+            raise OperationError(400, f'{value} does not refer to an earlier create operation')
+    if not _is_id(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise OperationError(400, 'Ids must be integers or "$<n>" references')
+    return value
+
+
+def _text(op, field, required=False):
+    value = op.get(field)
+    if value is not None and not isinstance(value, str):
+        raise OperationError(400, f'{field} must be a string')
+    if required and not value:
+        raise OperationError(400, f'{field} is required')
+    return value
+
+
+def _own_chapter(admin_id, chapter_id):
+    chapter = db.session.get(Chapter, chapter_id)
+    if chapter is None:
+        raise OperationError(404, f'Chapter {chapter_id} not found')
+    if chapter.admin_id != admin_id:
+        raise OperationError(403, 'Permission denied')
+    return chapter
+
+
+def _own_section(admin_id, section_id):
+    section = db.session.get(Section, section_id)
+    if section is None:
+        raise OperationError(404, f'Section {section_id} not found')
+    _own_chapter(admin_id, section.chapter_id)
+    return section
+
+
+def _create_chapter(admin_id, op, created):
+    name = _text(op, 'name', required=True)
+    if Chapter.query.filter_by(name=name, admin_id=admin_id).first():
+        raise OperationError(400, 'A chapter with this name already exists.')
+    chapter = Chapter(name=name, admin_id=admin_id)
+    db.session.add(chapter)
+    db.session.flush()
+    return chapter
+
+
+def _update_chapter(admin_id, op, created):
+    chapter = _own_chapter(admin_id, _resolve(op.get('id'), created))
+    chapter.name = _text(op, 'name', required=True)
+    return chapter
+
+
+def _delete_chapter(admin_id, op, created):
+    chapter = _own_chapter(admin_id, _resolve(op.get('id'), created))
+    db.session.delete(chapter)
+    return None
+
+
+def _create_section(admin_id, op, created):
+    chapter = _own_chapter(admin_id, _resolve(op.get('chapter_id'), created))
+    name = _text(op, 'name', required=True)
+    content = _text(op, 'content')
+    if Section.query.filter_by(name=name, chapter_id=chapter.id).first():
+        raise OperationError(400, 'A section with this name already exists in this chapter.')
+    section = Section(name=name, content=content, chapter_id=chapter.id)
+    db.session.add(section)
+    db.session.flush()
+    return section
+
+
+def _update_section(admin_id, op, created):
+    section = _own_section(admin_id, _resolve(op.get('id'), created))
+    if 'base_version' in op and op['base_version'] != section.version:
+        raise OperationError(409, f'Section {section.id} was changed since version {op["base_version"]}')
+    if 'name' not in op and 'content' not in op:
+        raise OperationError(400, 'Nothing to update: give name and/or content')
+    if 'name' in op:
+        section.name = _text(op, 'name', required=True)
+    if 'content' in op:
+        section.content = _text(op, 'content')
+    section.updated_at = datetime.utcnow()
+    return section
+
+
+def _delete_section(admin_id, op, created):
+    section = _own_section(admin_id, _resolve(op.get('id'), created))
+    db.session.delete(section)
+    return None
+
+
+OPERATIONS = {
+    ('chapter', 'create'): _create_chapter,
+    ('chapter', 'update'): _update_chapter,
+    ('chapter', 'delete'): _delete_chapter,
+    ('section', 'create'): _create_section,
+    ('section', 'update'): _update_section,
+    ('section', 'delete'): _delete_section,
+}
+
+
+def _run(admin_id, op, created):
+    if not isinstance(op, dict):
+        raise OperationError(400, 'Each operation must be an object')
+    handler = OPERATIONS.get((op.get('type'), op.get('op')))
+    if handler is None:
+        raise OperationError(400, f"Unknown operation {op.get('op')!r} on {op.get('type')!r}")
+    row = handler(admin_id, op, created)
+    db.session.flush()
+    if row is None:
+        return {}
+    fields = {'id': row.id, 'name': row.name}
+    if isinstance(row, Section):
+        fields['version'] = row.version
+    return {op['type']: fields}
+
+
+def _prefetch(operations):
+    """Load the rows named by plain ids up front, with what a delete cascades to.
+
+    Later lookups then hit the session's identity map instead of costing a
+    few queries per operation. The identity map only holds weak references,
+    so the caller keeps the returned rows alive for the whole batch.
+    """
+    ids = {'chapter': set(), 'section': set()}
+    parents = set()
+    for op in operations:
+        if not isinstance(op, dict) or op.get('type') not in ids:
+            continue
+        if op.get('op') in ('update', 'delete') and _is_id(op.get('id')):
+            ids[op['type']].add(op['id'])
+        elif op.get('op') == 'create' and op['type'] == 'section' and _is_id(op.get('chapter_id')):
+            parents.add(op['chapter_id'])
+    rows = []
+    if ids['section']:
+        rows += Section.query.options(joinedload(Section.chapter), selectinload(Section.section_comments)) \
+            .filter(Section.id.in_(ids['section'])).all()
+    if ids['chapter']:
+        rows += Chapter.query.options(selectinload(Chapter.chapter_comments),
+                                      selectinload(Chapter.sections).selectinload(Section.section_comments)) \
+            .filter(Chapter.id.in_(ids['chapter'])).all()
+    if parents - ids['chapter']:
+        rows += Chapter.query.filter(Chapter.id.in_(parents - ids['chapter'])).all()
+    return rows
+
+
+def run_batch(admin_id, operations, mode='atomic'):
+    """Run the operations and commit; returns ``(results, committed)``.
+
+    ``committed`` is False only when an atomic batch was rolled back.
+    """
+    results = []
+    created = {}
+    prefetched = _prefetch(operations)  # referenced until the batch ends
+    for index, op in enumerate(operations):
+        try:
+            if mode == 'best_effort':
+                with db.session.begin_nested():
+                    outcome = _run(admin_id, op, created)
+            else:
+                outcome = _run(admin_id, op, created)
+        except (OperationError, SQLAlchemyError) as e:
+            if isinstance(e, OperationError):
+                status, message = e.status, e.message
+            elif isinstance(e, StaleDataError):
+                status, message = 409, 'Changed by another request meanwhile'
+            else:
+                status, message = 500, str(e.orig if getattr(e, 'orig', None) else e)
+            results.append({'index': index, 'success': False, 'status': status, 'message': message})
+            if mode == 'atomic':
+                db.session.rollback()
+                results += [{'index': skipped, 'success': False, 'status': 424, 'message': 'skipped'}
+                            for skipped in range(index + 1, len(operations))]
+                return results, False
+            continue
+        if op['op'] == 'create':
+            created[index] = outcome[op['type']]['id']
+        results.append(dict(outcome, index=index, success=True, status=200))
+    db.session.commit()
+    return results, True
@@ -0,0 +1,185 @@
+import click
+
+
+def register_commands(app):
+    """Attach the maintenance commands to ``flask --app main <command>``."""
+
+    @app.cli.command('recount')
+    def recount_command():
+        """Recompute denormalized section and comment counters."""
+        from backend.counters import recount_all
+        from backend.pagecache import invalidate
+        recount_all()
+        invalidate('catalog')
+        click.echo('Counters recomputed.')
+
+    @app.cli.command('search-rebuild')
+    def search_rebuild_command():
+        """Rebuild the full-text search index from chapters and sections."""
+        from backend.app import db
+        from backend.pagecache import invalidate
+        from backend.search import rebuild
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        invalidate('search')
+        click.echo('Search index rebuilt.')
+
+    @app.cli.command('render-sections')
+    @click.option('--all', 'render_all', is_flag=True, help='Re-render every section, not just stale ones.')
+    @click.option('--batch-size', default=500, show_default=True)
+    def render_sections_command(render_all, batch_size):
+        """Store rendered HTML for sections rendered by an older renderer version."""
+        from backend.app import db
+        from backend.rendering import RENDERER_VERSION, rerender
+        from backend.pagecache import clear
+        with db.engine.begin() as connection:
+            count = rerender(connection, batch_size=batch_size, force=render_all, echo=click.echo)
+        clear()
+        click.echo(f'Rendered {count} sections (renderer version {RENDERER_VERSION}).')
+
+    @app.cli.command('compress-sections')
+    @click.option('--train', is_flag=True, help='Train a new dictionary on the current content first.')
+    @click.option('--all', 'rewrite_all', is_flag=True, help='Rewrite every section, not just outdated ones.')
+    @click.option('--batch-size', default=200, show_default=True)
+    def compress_sections_command(train, rewrite_all, batch_size):
+        """Rewrite stored section content with the configured codec and dictionary."""
+        from backend.app import db
+        from backend.compression import recompress, train_dictionary
+        # Each batch commits on its own, so an interrupted run can simply be repeated
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            if train:
+                dict_id = train_dictionary(connection)
+                click.echo(f'Trained dictionary {dict_id}.' if dict_id else 'Not enough content to train on.')
+            count, before, after = recompress(connection, batch_size=batch_size, force=train or rewrite_all,
+                                              echo=click.echo)
+        click.echo(f'Rewrote {count} sections: {before} -> {after} bytes.')
+
+    @app.cli.command('compress-static')
+    @click.option('--force', is_flag=True, help='Rewrite siblings that are already up to date.')
+    @click.option('--min-size', default=256, show_default=True, help='Skip files smaller than this many bytes.')
+    def compress_static_command(force, min_size):
+        """Write .gz/.br siblings of static files, served without per-request compression."""
+        from backend.http_compression import precompress_static
+        count = precompress_static(app.static_folder, min_size=min_size, force=force, echo=click.echo)
+        click.echo(f'Wrote {count} precompressed files.')
+
+    @app.cli.command('assets-build')
+    @click.option('--no-fetch', is_flag=True, help='Only use vendor files that are already downloaded.')
+    @click.option('--update-lock', is_flag=True,
+                  help='Record the SHA-256 of vendor files missing from vendor.lock.json instead of refusing them.')
+    def assets_build_command(no_fetch, update_lock):
+        """Download vendor files and build the fingerprinted bundles in static/dist."""
+        from backend.assets import build, fetch_vendor
+        if not no_fetch:
+            try:
+                failed = fetch_vendor(app, echo=click.echo, update_lock=update_lock)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            if failed:
+                click.echo(f'{len(failed)} vendor files could not be downloaded; their bundles use CDN URLs.')
+        manifest = build(app, echo=click.echo)
+        app.extensions['assets'] = manifest
+        click.echo(f"Built {len(manifest['files'])} files (version {manifest['version']}). "
+                   'Run compress-static to precompress them.')
+
+    @app.cli.command('cache-clear')
+    def cache_clear_command():
+        """Invalidate every entry in the rendered page cache."""
+        from backend.pagecache import clear
+        clear()
+        click.echo('Page cache cleared.')
+
+    @app.cli.command('import-content')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--admin-email', required=True, help='Admin account that will own the chapters.')
+    def import_content_command(path, admin_email):
+        """Bulk import chapters and sections from a .json or .ndjson/.jsonl file."""
+        import json
+        from backend.models import Admin
+        from backend.importer import import_chapters, iter_json, iter_ndjson
+        admin = Admin.query.filter_by(email=admin_email).first()
+        if admin is None:
+            raise click.ClickException(f'No admin with email {admin_email}')
+        with open(path, encoding='utf-8') as f:
+            if path.endswith(('.ndjson', '.jsonl')):
+                result = import_chapters(admin.id, iter_ndjson(f))
+            else:
+                result = import_chapters(admin.id, iter_json(json.load(f)))
+        summary = result.as_dict()
+        click.echo(f"Chapters created: {summary['chapters_created']}, "
+                   f"updated: {summary['chapters_updated']}, "
+                   f"sections created: {summary['sections_created']}")
+        for error in summary['errors']:
+            click.echo(f"line {error['line']}: {error['message']} "
+                       f"(chapter={error['chapter']!r}, section={error['section']!r})", err=True)
+
+    @app.cli.command('generate-data')
+    @click.option('--admins', default=1, show_default=True)
+    @click.option('--users', default=100, show_default=True)
+    @click.option('--chapters', default=20, show_default=True)
+    @click.option('--sections-per-chapter', default=10, show_default=True)
+    @click.option('--comments-per-chapter', default=5, show_default=True)
+    @click.option('--comments-per-section', default=5, show_default=True)
+    @click.option('--content-size', default=2000, show_default=True, help='Approximate characters per section.')
+    @click.option('--seed', default=42, show_default=True)
+    @click.option('--batch-size', default=5000, show_default=True)
+    @click.option('--skip-search-index', is_flag=True, help='Leave the search index for search-rebuild.')
+    @click.option('--skip-render', is_flag=True, help='Leave section HTML for render-sections.')
+    @click.option('--reset', is_flag=True, help='Drop all tables and re-run migrations first.')
+    def generate_data_command(admins, users, chapters, sections_per_chapter, comments_per_chapter,
+                              comments_per_section, content_size, seed, batch_size, skip_search_index,
+                              skip_render, reset):
+        """Bulk-load a deterministic synthetic dataset for load testing."""
+        import time
+        from backend.app import db
+        from backend.synthetic import SYNTHETIC_PASSWORD, generate
+        if reset:
+            from backend.migrations import reset as reset_schema
+            reset_schema(db.engine)
+        started = time.perf_counter()
+        counts = generate(admins=admins, users=users, chapters=chapters,
+                          sections_per_chapter=sections_per_chapter,
+                          comments_per_chapter=comments_per_chapter,
+                          comments_per_section=comments_per_section,
+                          content_size=content_size, seed=seed, batch_size=batch_size,
+                          build_search_index=not skip_search_index,
+                          render_content=not skip_render, echo=click.echo)
+        click.echo(f'Inserted {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s '
+                   f'(password for every account: {SYNTHETIC_PASSWORD})')
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Apply pending schema migrations."""
+        from backend.app import db
+        from backend.migrations import upgrade
+        applied = upgrade(db.engine)
+        click.echo(f"Applied: {', '.join(applied)}" if applied else 'Schema is up to date.')
+
+    @app.cli.command('db-status')
+    def db_status_command():
+        """List schema migrations and whether each has been applied."""
+        from backend.app import db
+        from backend.migrations import applied_versions, discover
+        applied = applied_versions(db.engine)
+        for migration in discover():
+            state = 'applied' if migration.version in applied else 'pending'
+            click.echo(f'{migration.version}_{migration.name}: {state}')
+
+    @app.cli.command('replica-sync')
+    def replica_sync_command():
+        """Copy the primary SQLite database onto each SQLite replica (local testing)."""
+        from backend.app import db
+        replicas = app.extensions.get('db_replicas', [])
+        if db.engine.dialect.name != 'sqlite':
+            raise click.ClickException('replica-sync only copies SQLite files; use real replication for Postgres.')
+        for engine in replicas:
+            if engine.dialect.name != 'sqlite':
+                continue
+            source = db.engine.raw_connection()
+            target = engine.raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+                source.close()
+            click.echo(f'Copied primary to {engine.url.database}')
@@ -0,0 +1,379 @@
+"""Write-behind queue for comment inserts.
+
+With ``COMMENT_WRITE_MODE=queued`` the comment endpoints validate a comment,
+hand it to ``enqueue()`` and answer ``202 Accepted`` without writing to the
+database. A writer thread in each process drains the queue in batches: a
+batch is written when ``COMMENT_BATCH_SIZE`` comments are waiting or
+``COMMENT_FLUSH_MS`` after its first comment arrived, in one transaction with
+one executemany INSERT per comment table and one counter UPDATE per table.
+Comments show up on pages once their batch commits.
+
+Durability, ``COMMENT_QUEUE_DURABILITY``:
+
+    none   accepted comments are only held in memory until written
+    log    (default) each comment is appended to a log file before it is
+           acknowledged, so a crashed process loses nothing
+    fsync  like log, and the log is fsynced before acknowledging, so
+           comments also survive a power loss
+
+Each process appends to its own ``comments-<pid>-<time>.log`` in
+``COMMENT_QUEUE_DIR`` and holds an exclusive ``flock`` on it. After a batch
+commits, the writer appends a marker with the batch's last sequence number;
+the log is emptied whenever the queue drains. At startup, logs that no live
+process holds are replayed: comments after the last marker are inserted
+(skipping any that a crash between commit and marker already wrote) and the
+file is removed.
+
+A batch that fails with a transient error (a lost connection, a locked
+database) is retried with backoff. Any other error is narrowed down by
+writing the batch's comments one at a time, and the comments that still
+fail are appended to ``dead-letter.jsonl`` in ``COMMENT_QUEUE_DIR`` and
+dropped, so one bad comment can't stall the writer. Comments whose chapter
+or section was deleted after they were accepted are dropped with a warning.
+
+Backpressure: the queue holds at most ``COMMENT_QUEUE_SIZE`` comments. When
+it is full, ``enqueue()`` waits up to ``COMMENT_QUEUE_TIMEOUT_MS`` for room
+and then raises ``QueueFull``; the endpoints answer 503 with ``Retry-After``.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import DBAPIError, OperationalError, SQLAlchemyError
+from backend.app import db
+from backend.comment_stream import notify
+from backend.counters import add_counts
+from backend.metrics import COMMENT_QUEUE_DEPTH, COMMENT_QUEUE_REJECTED, record_writes
+from backend.models import Chapter, Section, ChapterComment, SectionComment
+from backend.pagecache import invalidate
+
+logger = logging.getLogger(__name__)
+
+# kind -> (comment model, parent model, parent column name)
+KINDS = {
+    'chapter': (ChapterComment, Chapter, 'chapter_id'),
+    'section': (SectionComment, Section, 'section_id'),
+}
+DURABILITY = ('none', 'log', 'fsync')
+DEAD_LETTER = 'dead-letter.jsonl'
+_RETRY_MAX_SECONDS = 5.0
+
+
+class QueueFull(Exception):
+    """The comment queue stayed full for the whole enqueue timeout."""
+
+
+def _item_rows(items):
+    """Group queued comments into INSERT parameters per kind."""
+    rows = {}
+    for item in items:
+        model, parent, column = KINDS[item['kind']]
+        rows.setdefault(item['kind'], []).append({
+            'content': item['content'],
+            'user_id': item['user_id'],
+            column: item['parent_id'],
+            'created_at': datetime.fromisoformat(item['created_at']),
+        })
+    return rows
+
+
+def write_comments(connection, items):
+    """Insert queued comments and bump their parents' counters; returns ``{kind: count}``.
+
+    Comments whose parent no longer exists are skipped (SQLite doesn't
+    enforce the foreign keys). Page cache tags are not invalidated here; do
+    that after the commit.
+    """
+    written = {}
+    for kind, rows in _item_rows(items).items():
+        model, parent, column = KINDS[kind]
+        parent_ids = {row[column] for row in rows}
+        existing = set(connection.execute(select(parent.id).where(parent.id.in_(parent_ids))).scalars())
+        if existing != parent_ids:
+            logger.warning('Dropping queued comments on missing %s %s', kind, sorted(parent_ids - existing))
+            rows = [row for row in rows if row[column] in existing]
+            if not rows:
+                continue
+        connection.execute(insert(model), rows)
+        add_counts(connection, parent, 'comment_count', Counter(row[column] for row in rows))
+        written[kind] = len(rows)
+    return written
+
+
+def _transient(error):
+    """Whether retrying the same write later can succeed."""
+    return isinstance(error, OperationalError) or (isinstance(error, DBAPIError) and error.connection_invalidated)
+
+
+def _committed(items, written):
+    invalidate(*{f"{item['kind']}:{item['parent_id']}" for item in items})
+    for kind, count in written.items():
+        record_writes(f'{kind}_comment', 'insert', count)
+    notify()
+
+
+def _already_written(connection, items):
+    """Drop comments that are already in the database (matched on user, parent and timestamp)."""
+    remaining = []
+    for kind, rows in _item_rows(items).items():
+        model, parent, column = KINDS[kind]
+        keys = [(row['user_id'], row[column], row['created_at']) for row in rows]
+        existing = set(connection.execute(
+            select(model.user_id, getattr(model, column), model.created_at)
+            .where(tuple_(model.user_id, getattr(model, column), model.created_at).in_(keys))
+        ).tuples())
+        remaining += [item for item, key in zip((i for i in items if i['kind'] == kind), keys)
+                      if key not in existing]
+    return remaining
+
+
+def _read_log(f):
+    items = []
+    committed = 0
+    for line in f:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue  # a write torn by the crash
+        if 'committed' in record:
+            committed = max(committed, record['committed'])
+        else:
+            items.append(record)
+    return [item for item in items if item['seq'] > committed]
+
+
+def replay(directory, batch_size=500):
+    """Insert the unwritten comments from logs left behind by stopped processes; returns the count."""
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(directory, 'comments-*.log'))):
+        try:
+            f = open(path, encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # a live process is still writing it
+            try:
+                if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                    continue
+            except FileNotFoundError:
+                continue  # replayed by another process meanwhile
+            pending = _read_log(f)
+            for start in range(0, len(pending), batch_size):
+                with db.engine.begin() as connection:
+                    batch = _already_written(connection, pending[start:start + batch_size])
+                    written = write_comments(connection, batch)
+                _committed(batch, written)
+                replayed += len(batch)
+            os.remove(path)
+        if pending:
+            logger.info('Replayed %d queued comments from %s', len(pending), path)
+    return replayed
+
+
+class CommentQueue:
+    def __init__(self, app):
+        config = app.config
+        self.app = app
+        self.batch_size = config['COMMENT_BATCH_SIZE']
+        self.flush_interval = config['COMMENT_FLUSH_MS'] / 1000
+        self.timeout = config['COMMENT_QUEUE_TIMEOUT_MS'] / 1000
+        self.durability = config['COMMENT_QUEUE_DURABILITY']
+        self.directory = config['COMMENT_QUEUE_DIR']
+        self.size = config['COMMENT_QUEUE_SIZE']
+        self._queue = queue.Queue()
+        # Free places in the queue; taken by enqueue(), given back once a comment is written
+        self._slots = threading.BoundedSemaphore(self.size)
+        # _lock guards starting the writer; _log_lock guards sequence numbers and the log
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._seq = 0
+        self._log = None
+        self._pid = None
+        self._thread = None
+
+    def _start(self):
+        """Start the writer (and open the log) on first use in this process; call with the lock held."""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        # A worker forked from the process that created the queue starts its own
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._log_lock = threading.Lock()
+        if self.durability != 'none':
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'comments-{self._pid}-{time.time_ns()}.log')
+            self._log = open(path, 'a', encoding='utf-8')
+            fcntl.flock(self._log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._thread = threading.Thread(target=self._run, name='comment-writer', daemon=True)
+        self._thread.start()
+
+    def _append(self, record):
+        self._log.write(json.dumps(record) + '\n')
+        self._log.flush()
+
+    def _sync(self):
+        """fsync the log; runs outside the log lock so concurrent requests share the disk flushes."""
+        log = self._log
+        if log is not None:
+            try:
+                os.fsync(log.fileno())
+            except ValueError:
+                pass  # closed by stop() meanwhile; the comment is written by then
+
+    def enqueue(self, kind, parent_id, user_id, content):
+        """Accept a comment for writing; raises ``QueueFull`` when there is no room in time."""
+        with self._lock:
+            self._start()
+        # Wait for room without holding the lock, which the writer needs to make room
+        if not self._slots.acquire(timeout=self.timeout):
+            COMMENT_QUEUE_REJECTED.inc()
+            raise QueueFull()
+        item = {'kind': kind, 'parent_id': parent_id, 'user_id': user_id,
+                'content': content, 'created_at': datetime.utcnow().isoformat()}
+        with self._log_lock:
+            # Sequence numbers follow log order, and queue order matches both
+            self._seq += 1
+            item['seq'] = self._seq
+            if self._log is not None:
+                self._append(item)
+            self._queue.put_nowait(item)
+        if self.durability == 'fsync':
+            self._sync()
+        COMMENT_QUEUE_DEPTH.inc()
+
+    def _next_batch(self):
+        """Wait for a comment, then collect more until the batch is full or the flush interval passes.
+
+        Returns None once the queue has been told to stop and is empty.
+        """
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Write what we have; the next call sees the stop request
+                self._queue.task_done()
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _write(self, batch):
+        """Write a batch, retrying while the database is unavailable.
+
+        On any other error the comments are written one by one, and those
+        that still fail go to the dead-letter file.
+        """
+        delay = self.flush_interval or 0.05
+        while True:
+            try:
+                with db.engine.begin() as connection:
+                    written = write_comments(connection, batch)
+                _committed(batch, written)
+                return
+            except SQLAlchemyError as e:
+                if not _transient(e):
+                    error = e
+                    break
+                logger.exception('Writing %d queued comments failed; retrying in %.2fs', len(batch), delay)
+                time.sleep(delay)
+                delay = min(delay * 2, _RETRY_MAX_SECONDS)
+        if len(batch) > 1:
+            for item in batch:
+                self._write([item])
+            return
+        logger.error('Could not write queued comment %s; moving it to %s', batch[0]['seq'], DEAD_LETTER,
+                     exc_info=error)
+        self._dead_letter(batch[0])
+
+    def _dead_letter(self, item):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, DEAD_LETTER), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(item) + '\n')
+        except OSError:
+            logger.exception('Could not save queued comment to the dead-letter file: %s', json.dumps(item))
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    self._queue.task_done()
+                    return
+                self._write(batch)
+                with self._log_lock:
+                    if self._log is not None:
+                        self._append({'committed': batch[-1]['seq']})
+                        if self._queue.empty():
+                            # Everything logged so far is in the database
+                            self._log.truncate(0)
+                for _ in batch:
+                    self._queue.task_done()
+                    self._slots.release()
+                COMMENT_QUEUE_DEPTH.dec(len(batch))
+
+    def flush(self):
+        """Block until every accepted comment has been written."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def stop(self, timeout=5.0):
+        """Write the remaining comments and stop the writer.
+
+        Whatever is still queued after ``timeout`` stays in the log for the next start.
+        """
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return
+        with self._log_lock:
+            if self._log is not None:
+                path = self._log.name
+                self._log.close()
+                self._log = None
+                os.remove(path)
+
+
+def comment_queue():
+    """The app's queue, or None when comments are written directly."""
+    return current_app.extensions.get('comment_queue')
+
+
+def init_comment_queue(app):
+    config = app.config
+    if config['COMMENT_WRITE_MODE'] not in ('direct', 'queued'):
+        raise ValueError(f"Unknown COMMENT_WRITE_MODE {config['COMMENT_WRITE_MODE']!r}")
+    if config['COMMENT_QUEUE_DURABILITY'] not in DURABILITY:
+        raise ValueError(f"Unknown COMMENT_QUEUE_DURABILITY {config['COMMENT_QUEUE_DURABILITY']!r}")
+    config['COMMENT_QUEUE_DIR'] = config['COMMENT_QUEUE_DIR'] or os.path.join(app.instance_path, 'comment_queue')
+    # Logs of crashed processes are replayed even if queueing has since been turned off
+    if os.path.isdir(config['COMMENT_QUEUE_DIR']):
+        replay(config['COMMENT_QUEUE_DIR'])
+    if config['COMMENT_WRITE_MODE'] == 'queued':
+        app.extensions['comment_queue'] = queue_ = CommentQueue(app)
+        atexit.register(queue_.stop)
@@ -0,0 +1,224 @@
+"""Server-Sent Events streams of new comments.
+
+``GET /api/chapter_comments/<id>/stream`` and ``/api/section_comments/<id>/stream``
+push each new comment of one chapter or section as an SSE event whose ``id``
+is the comment id and whose data is the same JSON as the listing API::
+
+    id: 4711
+    event: comment
+    data: {"id": 4711, "content": "...", "user_name": "...", "created_at": "..."}
+
+A client that reconnects sends ``Last-Event-ID`` (``EventSource`` does this
+by itself). A first connection may pass ``?last_event_id=`` with the newest
+id it got from the listing API. Either way, the comments it missed are sent
+first, up to ``COMMENT_STREAM_BACKLOG`` of the newest ones.
+
+Fan-out: each process runs one ``CommentBroker`` thread. While any stream is
+open, it polls both comment tables for new rows every
+``COMMENT_STREAM_POLL_MS`` and hands each row to the streams of its parent.
+One primary-key range query per table serves every open stream. A comment
+posted through this process wakes the broker at once (``notify()`` from the
+POST handlers and the comment queue), and comments posted through other
+workers show up within one poll. Rows are re-read for ``LOOKBACK_SECONDS``, so
+a transaction that commits a lower id after a higher one isn't missed.
+
+Streams only wait on a small per-stream queue; they hold no database
+connection. Under gunicorn's gevent worker (``-k gevent``) an idle stream
+costs a greenlet. With sync or thread workers each stream occupies a worker
+thread, so ``COMMENT_STREAM_MAX_CLIENTS`` caps the streams per process and
+``COMMENT_STREAM_MAX_SECONDS`` ends every stream eventually (the browser
+reconnects and resumes with ``Last-Event-ID``). A stream whose client reads
+too slowly to keep up is closed the same way.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from flask import current_app, has_app_context
+from backend.app import db
+from backend.models import ChapterComment, SectionComment
+from backend.queries import comment_dict, latest_comment_id, recent_comments
+
+logger = logging.getLogger(__name__)
+
+# kind -> (comment model, parent column)
+STREAMS = {
+    'chapter': (ChapterComment, ChapterComment.chapter_id),
+    'section': (SectionComment, SectionComment.section_id),
+}
+LOOKBACK_SECONDS = 5.0
+SUBSCRIBER_QUEUE_SIZE = 100
+_MIN_POLL_GAP = 0.05
+
+
+class TooManyStreams(Exception):
+    """This process already serves ``COMMENT_STREAM_MAX_CLIENTS`` streams."""
+
+
+class Subscription:
+    def __init__(self, broker, kind, parent_id, since):
+        self.broker = broker
+        self.kind = kind
+        self.parent_id = parent_id
+        # Highest comment id committed before the stream opened; newer ones are delivered live
+        self.since = since
+        self.queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, comment):
+        """Queue a comment; returns False if the client has fallen too far behind."""
+        try:
+            self.queue.put_nowait(comment)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        # Make room for the end-of-stream marker if the queue is full
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.queue.put_nowait(None)
+
+
+class CommentBroker:
+    def __init__(self, app):
+        self.app = app
+        self.poll_interval = app.config['COMMENT_STREAM_POLL_MS'] / 1000
+        self.max_clients = app.config['COMMENT_STREAM_MAX_CLIENTS']
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._thread = None
+        # kind -> highest id no longer re-read; kind -> {id: time first seen}
+        self._floor = {}
+        self._seen = {}
+
+    def subscribe(self, kind, parent_id, since):
+        with self._lock:
+            if self._count >= self.max_clients:
+                raise TooManyStreams()
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                # First stream in this process (possibly a forked worker)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='comment-broker', daemon=True)
+                self._thread.start()
+            subscription = Subscription(self, kind, parent_id, since)
+            self._subscribers.setdefault((kind, parent_id), set()).add(subscription)
+            self._count += 1
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get((subscription.kind, subscription.parent_id), set())
+            if subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.kind, subscription.parent_id]
+
+    def notify(self):
+        """Poll right away instead of at the next interval (a comment was just committed)."""
+        self._wake.set()
+
+    def _poll(self, kind):
+        model, parent_column = STREAMS[kind]
+        now = time.monotonic()
+        if kind not in self._floor:
+            # Start from the oldest point an open stream still needs; anything
+            # committed after a stream opened is above its ``since``
+            with self._lock:
+                since = [subscription.since for (sub_kind, _), subscriptions in self._subscribers.items()
+                         if sub_kind == kind for subscription in subscriptions]
+            self._floor[kind] = min(since) if since else latest_comment_id(model)
+            self._seen[kind] = {}
+        seen = self._seen[kind]
+        rows = recent_comments(model, parent_column, self._floor[kind])
+        with self._lock:
+            for row in rows:
+                if row.id in seen:
+                    continue
+                seen[row.id] = now
+                for subscription in list(self._subscribers.get((kind, row.parent_id), ())):
+                    if row.id <= subscription.since:
+                        continue
+                    if not subscription.deliver(comment_dict(row)):
+                        self._subscribers[kind, row.parent_id].discard(subscription)
+                        self._count -= 1
+                        subscription.close()
+                if not self._subscribers.get((kind, row.parent_id), True):
+                    del self._subscribers[kind, row.parent_id]
+        # Stop re-reading rows that have been visible for the whole lookback window
+        expired = [comment_id for comment_id, first_seen in seen.items() if now - first_seen > LOOKBACK_SECONDS]
+        for comment_id in expired:
+            del seen[comment_id]
+        if expired:
+            self._floor[kind] = max(self._floor[kind], max(expired))
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                if not self._count:
+                    # Idle: forget the cursors and sleep until a stream opens
+                    self._floor.clear()
+                    self._seen.clear()
+                    self._wake.wait()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                try:
+                    for kind in STREAMS:
+                        self._poll(kind)
+                except Exception:
+                    logger.exception('Polling for new comments failed')
+                finally:
+                    db.session.remove()
+                time.sleep(_MIN_POLL_GAP)
+
+
+def broker():
+    return current_app.extensions['comment_broker']
+
+
+def notify():
+    """Tell this process's streams that a comment was committed; no-op without an app."""
+    if has_app_context() and 'comment_broker' in current_app.extensions:
+        broker().notify()
+
+
+def event_stream(subscription, backlog, heartbeat, max_seconds):
+    """Yield the SSE body: the backlog, then live comments, with heartbeats while idle."""
+    sent = {comment['id'] for comment in backlog}
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield 'retry: 3000\n\n'
+        for comment in backlog:
+            yield _event(comment)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                comment = subscription.queue.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                if time.monotonic() < deadline:
+                    yield ': keep-alive\n\n'
+                continue
+            if comment is None:
+                return  # fell behind; the client reconnects with Last-Event-ID
+            if comment['id'] not in sent:
+                yield _event(comment)
+    finally:
+        subscription.broker.unsubscribe(subscription)
+
+
+def _event(comment):
+    return f"id: {comment['id']}\nevent: comment\ndata: {json.dumps(comment)}\n\n"
+
+
+def init_comment_stream(app):
+    app.extensions['comment_broker'] = CommentBroker(app)
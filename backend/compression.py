@@ -0,0 +1,304 @@
+"""Compressed storage for large section bodies.
+
+``Section.content`` uses the ``CompressedText`` column type: strings are
+compressed on the way into the database and decompressed when the column is
+loaded. The column is deferred (see ``backend/models.py``), so bodies are only
+fetched and decompressed where they are displayed or indexed.
+
+Stored values start with a small header naming the codec and the
+compression dictionary::
+
+    b'\\x01SC' + codec (b'z' zlib, b's' zstd) + dictionary id (4 bytes, 0 = none) + payload
+
+Anything without the header is plain UTF-8, so uncompressed rows (short
+bodies, ``SECTION_COMPRESSION=none``, rows written before the migration) keep
+working and codecs can be mixed while rows are converted.
+
+Dictionaries are trained on existing content and stored in the
+``compression_dictionary`` table; they are never modified or deleted, because
+rows keep referring to the dictionary they were written with. zstd needs the
+optional ``zstandard`` package; zlib (the default) is in the standard library
+and uses its preset-dictionary support.
+
+Settings:
+
+    SECTION_COMPRESSION            zlib (default), zstd or none
+    SECTION_COMPRESSION_MIN_BYTES  bodies shorter than this are stored plain (default 1024)
+"""
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import Text, LargeBinary, bindparam, func, insert, inspect, select, type_coerce, update
+from sqlalchemy.types import NullType, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+HEADER = b'\x01SC'
+CODECS = {'zlib': b'z', 'zstd': b's'}
+_CODEC_NAMES = {tag: name for name, tag in CODECS.items()}
+_PREFIX = len(HEADER) + 1 + 4
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+DICTIONARY_SIZE = 32 * 1024  # zlib uses at most the last 32 KiB of a preset dictionary
+
+_settings = {'codec': 'zlib', 'min_bytes': 1024}
+
+# id -> (codec, bytes); dictionaries are immutable so this never goes stale
+_dictionaries = {}
+# codec -> id of the dictionary new values are written with (None: no dictionary)
+_current = {}
+_lock = threading.Lock()
+
+
+def configure(codec=None, min_bytes=None):
+    if codec is not None:
+        if codec not in CODECS and codec != 'none':
+            raise ValueError(f'Unknown SECTION_COMPRESSION: {codec}')
+        if codec == 'zstd' and zstandard is None:
+            raise RuntimeError('SECTION_COMPRESSION=zstd requires the zstandard package')
+        _settings['codec'] = codec
+    if min_bytes is not None:
+        _settings['min_bytes'] = min_bytes
+
+
+def init_compression(app):
+    configure(app.config['SECTION_COMPRESSION'], app.config['SECTION_COMPRESSION_MIN_BYTES'])
+
+
+# --- Dictionaries ---
+
+def _load_dictionaries(connection=None):
+    from backend.app import db
+    from backend.models import CompressionDictionary
+    stmt = select(CompressionDictionary.id, CompressionDictionary.codec, CompressionDictionary.data)
+    if connection is None:
+        with db.engine.connect() as own:
+            rows = own.execute(stmt).all()
+    else:
+        rows = connection.execute(stmt).all()
+    with _lock:
+        for row in rows:
+            _dictionaries[row.id] = (row.codec, bytes(row.data))
+        for codec in CODECS:
+            ids = [dict_id for dict_id, (name, _) in _dictionaries.items() if name == codec]
+            _current[codec] = max(ids) if ids else None
+
+
+def _dictionary(dict_id):
+    if dict_id not in _dictionaries:
+        _load_dictionaries()
+    return _dictionaries[dict_id][1]
+
+
+def current_dictionary(codec, connection=None):
+    """Id of the dictionary new values for ``codec`` are written with, or None."""
+    if codec not in _current:
+        from backend.app import db
+        from backend.models import CompressionDictionary
+        if inspect(connection if connection is not None else db.engine).has_table(
+                CompressionDictionary.__tablename__):
+            _load_dictionaries(connection)
+        else:
+            _current.setdefault(codec, None)
+    return _current.get(codec)
+
+
+def _zlib_dictionary(samples, size=DICTIONARY_SIZE):
+    """Build a zlib preset dictionary from the lines and words shared by many samples."""
+    counts = Counter()
+    for sample in samples:
+        pieces = {line.strip() for line in sample.splitlines() if len(line.strip()) > 8}
+        pieces.update(word for word in sample.split() if len(word) > 3)
+        counts.update(pieces)
+    common = [piece for piece, count in counts.most_common() if count > 1]
+    chosen = []
+    total = 0
+    for piece in common:
+        encoded = piece.encode() + b'\n'
+        if total + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        total += len(encoded)
+    # Matches against the end of the dictionary are the cheapest to encode
+    return b''.join(reversed(chosen))
+
+
+def train_dictionary(connection, codec=None, sample_rows=2000, size=DICTIONARY_SIZE):
+    """Train a dictionary for ``codec`` on existing section bodies and store it.
+
+    New values are compressed with it from then on. Returns the dictionary id,
+    or None when there isn't enough content to train on.
+    """
+    from backend.models import CompressionDictionary, Section
+    codec = codec or _settings['codec']
+    if codec not in CODECS:
+        return None
+    samples = [content for content in connection.execute(
+        select(Section.content)
+        .where(Section.content.is_not(None))
+        .order_by(func.random())
+        .limit(sample_rows)
+    ).scalars() if content]
+    if len(samples) < 8:
+        return None
+    if codec == 'zstd':
+        try:
+            data = zstandard.train_dictionary(size * 4, [sample.encode() for sample in samples]).as_bytes()
+        except zstandard.ZstdError:
+            return None
+    else:
+        data = _zlib_dictionary(samples, size)
+    if not data:
+        return None
+    dict_id = connection.execute(
+        insert(CompressionDictionary).returning(CompressionDictionary.id),
+        {'codec': codec, 'data': data, 'created_at': datetime.utcnow()},
+    ).scalar_one()
+    with _lock:
+        _dictionaries[dict_id] = (codec, data)
+        _current[codec] = dict_id
+    return dict_id
+
+
+# --- Codecs ---
+
+def compress(text):
+    """Encode a section body for storage (compressed when worthwhile)."""
+    raw = text.encode('utf-8')
+    codec = _settings['codec']
+    if codec == 'none' or len(raw) < _settings['min_bytes']:
+        return raw
+    dict_id = current_dictionary(codec)
+    zdict = _dictionary(dict_id) if dict_id else None
+    if codec == 'zstd':
+        params = {'dict_data': zstandard.ZstdCompressionDict(zdict)} if zdict else {}
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL, **params).compress(raw)
+    else:
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=zdict) if zdict else zlib.compressobj(ZLIB_LEVEL)
+        payload = compressor.compress(raw) + compressor.flush()
+    if len(payload) + _PREFIX >= len(raw):
+        return raw
+    return HEADER + CODECS[codec] + (dict_id or 0).to_bytes(4, 'big') + payload
+
+
+def describe(value):
+    """Return ``(codec, dictionary id)`` of a stored value; codec is None for plain text."""
+    if isinstance(value, str) or value is None:
+        return None, None
+    value = bytes(value[:_PREFIX])
+    if not value.startswith(HEADER):
+        return None, None
+    return _CODEC_NAMES[value[len(HEADER):len(HEADER) + 1]], int.from_bytes(value[len(HEADER) + 1:_PREFIX], 'big')
+
+
+def decompress(value):
+    """Decode a stored section body back to text."""
+    if value is None or isinstance(value, str):
+        # NULL, or a plain TEXT value on SQLite
+        return value
+    value = bytes(value)
+    codec, dict_id = describe(value)
+    if codec is None:
+        return value.decode('utf-8')
+    payload = value[_PREFIX:]
+    zdict = _dictionary(dict_id) if dict_id else None
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstd-compressed content requires the zstandard package')
+        params = {'dict_data': zstandard.ZstdCompressionDict(zdict)} if zdict else {}
+        raw = zstandard.ZstdDecompressor(**params).decompress(payload)
+    else:
+        decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+        raw = decompressor.decompress(payload) + decompressor.flush()
+    return raw.decode('utf-8')
+
+
+class CompressedText(TypeDecorator):
+    """Text stored through ``compress()`` / ``decompress()``.
+
+    Postgres stores it as ``bytea``. SQLite keeps the declared ``TEXT`` type
+    (a TEXT column holds BLOB values as they are), so existing databases need
+    no table rebuild.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'sqlite':
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        return compress(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress(value)
+
+
+# --- Bulk conversion ---
+
+def _stored_size(value):
+    return len(value.encode('utf-8')) if isinstance(value, str) else len(value)
+
+
+def _is_current(value, codec, dict_id):
+    stored_codec, stored_dict = describe(value)
+    if stored_codec is None:
+        # Plain values stay plain when compression is off or they're too short
+        return codec == 'none' or _stored_size(value) < _settings['min_bytes']
+    return stored_codec == codec and stored_dict == (dict_id or 0)
+
+
+def recompress(connection, batch_size=200, force=False, echo=None):
+    """(Re)write stored section bodies with the current codec and dictionary.
+
+    Walks the table in id order, ``batch_size`` rows per round trip; rows
+    already in the current format are skipped unless ``force`` is set, so the
+    conversion can be interrupted and resumed. ``updated_at`` is left alone
+    (the content doesn't change). Returns ``(rows rewritten, bytes before,
+    bytes after)`` for the rewritten rows.
+    """
+    from backend.models import Section
+    echo = echo or (lambda message: None)
+    codec = _settings['codec']
+    dict_id = current_dictionary(codec, connection) if codec in CODECS else None
+    # Read the stored bytes as they are, without decompressing
+    raw_content = type_coerce(Section.__table__.c.content, NullType())
+    rewrite = (
+        update(Section)
+        .where(Section.id == bindparam('section_id'))
+        .values(content=bindparam('body'), updated_at=Section.updated_at)
+    )
+    last_id = 0
+    converted = before = after = 0
+    while True:
+        rows = connection.execute(
+            select(Section.id, raw_content.label('stored'))
+            .where(Section.id > last_id)
+            .order_by(Section.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        batch = []
+        for row in rows:
+            if row.stored is None or (not force and _is_current(row.stored, codec, dict_id)):
+                continue
+            text = decompress(row.stored)
+            body = compress(text)
+            before += _stored_size(row.stored)
+            after += len(body)
+            batch.append({'section_id': row.id, 'body': body})
+        if batch:
+            connection.execute(rewrite, batch)
+            converted += len(batch)
+            echo(f'{converted} sections rewritten (up to id {last_id})')
+    return converted, before, after
@@ -0,0 +1,73 @@
+"""Conditional GET: ETag / Last-Modified validators and 304 responses.
+
+Views compute a small state row (see the ``*_state`` helpers in
+``queries.py``) before loading anything else. The strong ETag hashes that
+state together with the viewer (pages differ for users and admins and show
+the user's name) and a digest of the templates and the asset build, so a
+deploy that changes the markup or a bundle also changes every ETag.
+``Last-Modified`` is the newest timestamp in the state. When the request's
+``If-None-Match``/``If-Modified-Since`` match, the view returns 304 without
+loading or rendering the page.
+"""
+import hashlib
+import os
+from datetime import datetime
+from flask import current_app, request, session
+from werkzeug.http import is_resource_modified
+from backend.assets import asset_version
+from backend.rendering import RENDERER_VERSION
+
+
+def template_digest(app):
+    """Digest of the templates and renderer version, computed once per app."""
+    digest = app.extensions.get('etag_salt')
+    if digest is None:
+        sha = hashlib.sha1(str(RENDERER_VERSION).encode())
+        # Pages link to fingerprinted bundles, so a new build changes them too
+        sha.update(asset_version(app).encode())
+        folder = os.path.join(app.root_path, app.template_folder)
+        for root, dirs, files in sorted(os.walk(folder)):
+            dirs.sort()
+            for name in sorted(files):
+                with open(os.path.join(root, name), 'rb') as f:
+                    sha.update(f.read())
+        digest = app.extensions['etag_salt'] = sha.hexdigest()[:12]
+    return digest
+
+
+def viewer():
+    """What a page's rendering depends on about the current visitor."""
+    return (session.get('user_id'), session.get('user_name'), session.get('admin_id'))
+
+
+def make_etag(*parts):
+    raw = repr((template_digest(current_app),) + parts).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def last_modified(*values):
+    """The newest of the given timestamps, ignoring everything that isn't one."""
+    stamps = [value for value in values if isinstance(value, datetime)]
+    return max(stamps) if stamps else None
+
+
+def not_modified(etag, modified=None, private=True):
+    """Return a 304 response if the client's copy is current, otherwise None."""
+    if session.get('_flashes'):
+        # A pending flash message has to be rendered into the page
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=modified):
+        return None
+    return with_validators(current_app.response_class(status=304), etag, modified, private)
+
+
+def with_validators(response, etag, modified=None, private=True):
+    """Attach validators to a response and make clients revalidate it on every use."""
+    response.set_etag(etag)
+    if modified is not None:
+        response.last_modified = modified
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+    return response
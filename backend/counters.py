@@ -0,0 +1,86 @@
+from sqlalchemy import bindparam, event, func, select, update
+from backend.app import db
+from backend.models import Chapter, Section, ChapterComment, SectionComment
+
+
+# Denormalized counters are adjusted inside the flush that inserts or deletes
+# the child row, so they commit (or roll back) together with it. This also
+# covers ORM cascades such as deleting a section with all of its comments.
+
+def _bump(connection, model, column, row_id, delta):
+    if row_id is None:
+        return
+    values = {column: getattr(model, column) + delta}
+    if 'updated_at' in model.__table__.c:
+        # A new comment or section doesn't edit the parent; keep onupdate from firing
+        values['updated_at'] = model.updated_at
+    connection.execute(
+        update(model)
+        .where(model.id == row_id)
+        .values(values)
+    )
+
+
+def add_counts(connection, model, column, deltas):
+    """Apply ``{row_id: delta}`` to a counter column with one executemany UPDATE (for Core bulk writes)."""
+    deltas = [{'row_id': row_id, 'delta': delta} for row_id, delta in deltas.items() if delta]
+    if not deltas:
+        return
+    values = {column: getattr(model, column) + bindparam('delta')}
+    if 'updated_at' in model.__table__.c:
+        values['updated_at'] = model.updated_at
+    connection.execute(update(model).where(model.id == bindparam('row_id')).values(values), deltas)
+
+
+@event.listens_for(Section, 'after_insert')
+def _section_inserted(mapper, connection, target):
+    _bump(connection, Chapter, 'section_count', target.chapter_id, 1)
+
+
+@event.listens_for(Section, 'after_delete')
+def _section_deleted(mapper, connection, target):
+    _bump(connection, Chapter, 'section_count', target.chapter_id, -1)
+
+
+@event.listens_for(ChapterComment, 'after_insert')
+def _chapter_comment_inserted(mapper, connection, target):
+    _bump(connection, Chapter, 'comment_count', target.chapter_id, 1)
+
+
+@event.listens_for(ChapterComment, 'after_delete')
+def _chapter_comment_deleted(mapper, connection, target):
+    _bump(connection, Chapter, 'comment_count', target.chapter_id, -1)
+
+
+@event.listens_for(SectionComment, 'after_insert')
+def _section_comment_inserted(mapper, connection, target):
+    _bump(connection, Section, 'comment_count', target.section_id, 1)
+
+
+@event.listens_for(SectionComment, 'after_delete')
+def _section_comment_deleted(mapper, connection, target):
+    _bump(connection, Section, 'comment_count', target.section_id, -1)
+
+
+def recount_all():
+    """Recompute every denormalized counter with three set-based UPDATEs."""
+    section_count = (
+        select(func.count(Section.id))
+        .where(Section.chapter_id == Chapter.id)
+        .scalar_subquery()
+    )
+    chapter_comment_count = (
+        select(func.count(ChapterComment.id))
+        .where(ChapterComment.chapter_id == Chapter.id)
+        .scalar_subquery()
+    )
+    section_comment_count = (
+        select(func.count(SectionComment.id))
+        .where(SectionComment.section_id == Section.id)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(Chapter).values(section_count=section_count, comment_count=chapter_comment_count)
+    )
+    db.session.execute(update(Section).values(comment_count=section_comment_count))
+    db.session.commit()
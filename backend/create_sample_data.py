@@ -6,10 +6,11 @@ Run this to populate the database with educational content.
 
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.app import app, db
-from models import User, Admin, Chapter, Section, Comment
+from backend.models import User, Admin, Chapter, Section, ChapterComment
+from backend.migrations import reset
 import datetime
 
 def create_sample_data():
@@ -17,8 +18,7 @@ def create_sample_data():
         print("Creating sample data...")
         
         # Clear existing data (be careful in production!)
-        db.drop_all()
-        db.create_all()
+        reset(db.engine)
         
         # Create sample admin
         admin1 = Admin(
@@ -582,11 +582,10 @@ DELETE FROM students WHERE id = 3;
         for i, user in enumerate(user_objects):
             for j, chapter in enumerate(chapters):
                 if (i + j) % 3 == 0:  # Add comments to some chapters
-                    comment = Comment(
+                    comment = ChapterComment(
                         content=comments_data[j % len(comments_data)],
                         user_id=user.id,
-                        chapter_id=chapter.id,
-                        section_id=None
+                        chapter_id=chapter.id
                     )
                     db.session.add(comment)
         
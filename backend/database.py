@@ -0,0 +1,80 @@
+"""Engine and connection-pool configuration, driven by environment variables.
+
+Pool settings (all engines except in-memory SQLite):
+
+    DB_POOL_SIZE       connections kept open per worker process (default 5)
+    DB_MAX_OVERFLOW    extra connections allowed under burst load (default 10)
+    DB_POOL_TIMEOUT    seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE    seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING   "1" to test connections on checkout (default 1)
+
+SQLite pragmas applied to every new connection:
+
+    SQLITE_JOURNAL_MODE   default WAL, so readers don't block behind writers
+    SQLITE_SYNCHRONOUS    default NORMAL (safe with WAL, far fewer fsyncs)
+    SQLITE_BUSY_TIMEOUT   milliseconds to wait on a locked database (default 5000)
+    SQLITE_MMAP_SIZE      bytes of the file to memory-map (default 256 MiB)
+    SQLITE_CACHE_SIZE     page cache, negative values are KiB (default -65536)
+"""
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def engine_options(database_uri):
+    """Return ``SQLALCHEMY_ENGINE_OPTIONS`` for the given database URI."""
+    url = make_url(database_uri)  # accepts a string or an existing URL
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite uses a single shared connection; pool sizing does not apply
+        return {}
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    }
+
+
+def sqlite_pragmas():
+    return {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': _env_int('SQLITE_BUSY_TIMEOUT', 5000),
+        'mmap_size': _env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        'cache_size': _env_int('SQLITE_CACHE_SIZE', -65536),
+    }
+
+
+def configure_engine(engine):
+    """Install per-connection setup on an engine (currently SQLite pragmas)."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def pool_stats(engine):
+    """Return a snapshot of an engine's connection pool for capacity planning."""
+    pool = engine.pool
+    stats = {'engine': engine.url.render_as_string(hide_password=True), 'pool': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    timeout = getattr(pool, 'timeout', None)
+    if callable(timeout):
+        stats['timeout'] = timeout()
+    return stats
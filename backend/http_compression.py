@@ -0,0 +1,274 @@
+"""gzip/brotli compression of HTTP responses.
+
+``CompressionMiddleware`` wraps ``app.wsgi_app``:
+
+* Static files with a precompressed sibling (``styles.css.br``,
+  ``main.js.gz``, written by ``flask --app main compress-static``) are served
+  straight from the sibling, with no per-request compression. A sibling older
+  than its source file is ignored.
+* Other text-like responses (HTML, JSON, CSS, JS, SVG, ...) are compressed on
+  the fly when the client accepts it and the body reaches
+  ``COMPRESSION_MIN_SIZE`` bytes. Bodies are compressed chunk by chunk and
+  each chunk is flushed, so streamed responses keep streaming. Strong ETags
+  become weak, since the bytes differ from the identity response.
+
+brotli needs the optional ``brotli`` package; without it only gzip is
+offered. Event streams, ranges, ``Cache-Control: no-transform`` and responses
+that already have a ``Content-Encoding`` are passed through untouched.
+
+Settings:
+
+    COMPRESSION_ENABLED         "1" (default) to compress dynamic responses
+    COMPRESSION_MIN_SIZE        smallest body worth compressing (default 500 bytes)
+    COMPRESSION_GZIP_LEVEL      zlib level for dynamic responses (default 6)
+    COMPRESSION_BROTLI_QUALITY  brotli quality for dynamic responses (default 4)
+"""
+import gzip
+import mimetypes
+import os
+import zlib
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+from backend.assets import cache_static_response
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'application/xml', 'application/x-ndjson',
+    'application/manifest+json', 'image/svg+xml', 'text/javascript',
+}
+# Compressing an event stream would hold events back in the compressor
+UNCOMPRESSIBLE_TYPES = {'text/event-stream'}
+
+
+def available_encodings():
+    """Encodings this process can produce, most preferred first."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def acceptable_encodings(accept_encoding):
+    """Return the encodings allowed by an ``Accept-Encoding`` header, best first."""
+    accept = parse_accept_header(accept_encoding or '')
+    ranked = []
+    for preference, encoding in enumerate(available_encodings()):
+        quality = accept.quality(encoding)
+        if quality > 0:
+            ranked.append((-quality, preference, encoding))
+    return [encoding for _, _, encoding in sorted(ranked)]
+
+
+def is_compressible(mimetype):
+    mimetype = (mimetype or '').split(';', 1)[0].strip().lower()
+    if mimetype in UNCOMPRESSIBLE_TYPES:
+        return False
+    return (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+            or mimetype.endswith(('+json', '+xml')))
+
+
+class _GzipEncoder:
+    def __init__(self, level):
+        # wbits 31: zlib stream with a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _CompressingBody:
+    """Response body that decides on compression once the headers and enough of the body are known."""
+
+    def __init__(self, middleware, environ, encodings, start_response):
+        self.config = middleware.app.config
+        self.environ = environ
+        self.encodings = encodings
+        self.server_start_response = start_response
+        self.status = None
+        self.headers = None
+        self.written = []
+        self.started = False
+        self.app_iter = ()
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info and self.started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        self.status = status
+        self.headers = Headers(headers)
+        return self.written.append
+
+    def _encoding(self):
+        """The encoding to use, or None to pass the response through (adding Vary where it matters)."""
+        code = int(self.status.split(' ', 1)[0])
+        headers = self.headers
+        if code < 200 or code in (204, 206, 304) or 'Content-Encoding' in headers:
+            return None
+        if not is_compressible(headers.get('Content-Type')):
+            return None
+        vary = headers.get('Vary', '')
+        if 'accept-encoding' not in vary.lower():
+            headers['Vary'] = f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'
+        if not self.encodings or self.environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        if 'no-transform' in headers.get('Cache-Control', ''):
+            return None
+        length = headers.get('Content-Length', type=int)
+        if length is not None and length < self.config['COMPRESSION_MIN_SIZE']:
+            return None
+        return self.encodings[0]
+
+    def _start(self, encoding=None):
+        if encoding:
+            self.headers['Content-Encoding'] = encoding
+            self.headers.pop('Content-Length', None)
+            etag = self.headers.get('ETag')
+            if etag and not etag.startswith('W/'):
+                self.headers['ETag'] = 'W/' + etag
+        self.started = True
+        self.server_start_response(self.status, self.headers.to_wsgi_list())
+
+    def _encoder(self, encoding):
+        if encoding == 'br':
+            return _BrotliEncoder(self.config['COMPRESSION_BROTLI_QUALITY'])
+        return _GzipEncoder(self.config['COMPRESSION_GZIP_LEVEL'])
+
+    def __iter__(self):
+        chunks = iter(self.app_iter)
+        pending = list(self.written)
+        size = sum(len(chunk) for chunk in pending)
+        encoding = None
+        decided = False
+        min_size = self.config['COMPRESSION_MIN_SIZE']
+        for chunk in chunks:
+            if not decided:
+                encoding = self._encoding()
+                decided = True
+            if encoding is None:
+                self._start()
+                yield from pending
+                yield chunk
+                yield from chunks
+                return
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= min_size:
+                break
+        else:
+            # The whole body is in hand and too small (or empty): send it as is
+            if not decided:
+                self._encoding()
+            self._start()
+            yield from pending
+            return
+
+        self._start(encoding)
+        encoder = self._encoder(encoding)
+        yield encoder.compress(b''.join(pending))
+        for chunk in chunks:
+            if chunk:
+                yield encoder.compress(chunk)
+        yield encoder.finish()
+
+    def close(self):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+
+
+class CompressionMiddleware:
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.app = app
+
+    def _precompressed(self, environ, encodings):
+        """A response serving a precompressed static file, or None."""
+        prefix = self.app.static_url_path.rstrip('/') + '/'
+        path = environ.get('PATH_INFO', '')
+        if not encodings or not path.startswith(prefix) or environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return None
+        filename = safe_join(self.app.static_folder, path[len(prefix):])
+        if filename is None or not os.path.isfile(filename):
+            return None
+        source_mtime = os.stat(filename).st_mtime
+        for encoding in encodings:
+            sibling = filename + SUFFIXES[encoding]
+            try:
+                if os.stat(sibling).st_mtime < source_mtime:
+                    continue
+            except OSError:
+                continue
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_file(sibling, environ, mimetype=mimetype, conditional=True, etag=True,
+                                 max_age=self.app.config['SEND_FILE_MAX_AGE_DEFAULT'])
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return cache_static_response(response, path[len(prefix):])
+        return None
+
+    def __call__(self, environ, start_response):
+        encodings = acceptable_encodings(environ.get('HTTP_ACCEPT_ENCODING'))
+        static = self._precompressed(environ, encodings)
+        if static is not None:
+            return static(environ, start_response)
+        if not self.app.config['COMPRESSION_ENABLED']:
+            return self.wsgi_app(environ, start_response)
+        body = _CompressingBody(self, environ, encodings, start_response)
+        body.app_iter = self.wsgi_app(environ, body.start_response)
+        return body
+
+
+def precompress_static(folder, min_size=0, force=False, echo=None):
+    """Write ``.gz`` (and ``.br``) siblings for the compressible files under ``folder``.
+
+    Siblings are written at maximum compression, only when smaller than the
+    source, and skipped when already newer than it unless ``force`` is set.
+    Returns the number of files written.
+    """
+    echo = echo or (lambda message: None)
+    encoders = {'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoders['br'] = lambda data: brotli.compress(data, quality=11)
+    written = 0
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.endswith(tuple(SUFFIXES.values())) or not is_compressible(mimetypes.guess_type(name)[0]):
+                continue
+            source = os.path.join(root, name)
+            if os.path.getsize(source) < min_size:
+                continue
+            data = None
+            for encoding, encode in encoders.items():
+                sibling = source + SUFFIXES[encoding]
+                if not force and os.path.exists(sibling) and os.stat(sibling).st_mtime >= os.stat(source).st_mtime:
+                    continue
+                if data is None:
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                compressed = encode(data)
+                if len(compressed) >= len(data):
+                    if os.path.exists(sibling):
+                        os.remove(sibling)
+                    continue
+                with open(sibling + '.tmp', 'wb') as f:
+                    f.write(compressed)
+                os.replace(sibling + '.tmp', sibling)
+                written += 1
+                echo(f'{os.path.relpath(sibling, folder)}: {len(data)} -> {len(compressed)} bytes')
+    return written
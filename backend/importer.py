@@ -0,0 +1,191 @@
+"""Bulk import of chapters with nested sections.
+
+Input is either NDJSON (one chapter object per line, read as a stream) or a
+JSON document holding a list of chapters (or ``{"chapters": [...]}``)::
+
+    {"name": "Chapter name", "sections": [{"name": "Intro", "content": "..."}]}
+
+Chapters are processed in batches. Each batch does one query to find which
+chapters the admin already has, one query each for the existing section names
+and the last section position of those chapters, and ``executemany`` inserts for the new chapters and sections.
+An existing chapter gets the new sections added to it. Rows that fail
+validation or duplicate an existing name are reported and skipped. The whole
+import runs in a single transaction, committed at the end.
+"""
+import json
+from collections import Counter
+from sqlalchemy import bindparam, insert, select, update
+from backend.app import db
+from backend.metrics import record_writes
+from backend.pagecache import invalidate
+from backend.models import Chapter, Section
+from backend.ordering import next_positions
+from backend.rendering import rendered_fields
+from backend.search import chapter_document, index_documents, section_document
+
+BATCH_CHAPTERS = 200
+
+
+class ImportResult:
+    def __init__(self):
+        self.chapters_created = 0
+        self.chapters_updated = 0
+        self.sections_created = 0
+        self.errors = []
+        self.chapter_ids = set()
+
+    def error(self, line, message, chapter=None, section=None):
+        self.errors.append({'line': line, 'chapter': chapter, 'section': section, 'message': message})
+
+    def as_dict(self):
+        return {
+            'chapters_created': self.chapters_created,
+            'chapters_updated': self.chapters_updated,
+            'sections_created': self.sections_created,
+            'errors': self.errors,
+        }
+
+
+def iter_ndjson(lines):
+    """Yield ``(line_number, record)`` from an iterable of NDJSON lines (bytes or str)."""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, e
+
+
+def iter_json(document):
+    """Yield ``(index, record)`` from a parsed JSON document."""
+    if isinstance(document, dict):
+        document = document.get('chapters', [])
+    if not isinstance(document, list):
+        raise ValueError('Expected a list of chapters')
+    yield from enumerate(document, start=1)
+
+
+def _validate(line, record, result):
+    if isinstance(record, ValueError):
+        result.error(line, f'Invalid JSON: {record}')
+        return None
+    if not isinstance(record, dict) or not isinstance(record.get('name'), str) or not record['name'].strip():
+        result.error(line, 'Chapter name required')
+        return None
+    sections = record.get('sections') or []
+    if not isinstance(sections, list):
+        result.error(line, 'sections must be a list', chapter=record['name'])
+        return None
+    valid = []
+    seen = set()
+    for section in sections:
+        name = section.get('name') if isinstance(section, dict) else None
+        if not isinstance(name, str) or not name.strip():
+            result.error(line, 'Section name required', chapter=record['name'])
+        elif name in seen:
+            result.error(line, 'Duplicate section name in import', chapter=record['name'], section=name)
+        elif section.get('content') is not None and not isinstance(section['content'], str):
+            result.error(line, 'Section content must be a string', chapter=record['name'], section=name)
+        else:
+            seen.add(name)
+            valid.append({'name': name, 'content': section.get('content')})
+    return {'line': line, 'name': record['name'], 'sections': valid}
+
+
+def _import_batch(connection, admin_id, batch, result):
+    names = {chapter['name'] for chapter in batch}
+    existing = dict(connection.execute(
+        select(Chapter.name, Chapter.id)
+        .where(Chapter.admin_id == admin_id, Chapter.name.in_(names))
+    ).all())
+
+    # The same chapter may appear more than once in a batch; merge into the first
+    merged = {}
+    for chapter in batch:
+        target = merged.setdefault(chapter['name'], {'line': chapter['line'], 'sections': []})
+        target['sections'].extend(dict(section, line=chapter['line']) for section in chapter['sections'])
+
+    new_names = [name for name in merged if name not in existing]
+    if new_names:
+        created = connection.execute(
+            insert(Chapter).returning(Chapter.id, Chapter.name, sort_by_parameter_order=True),
+            [{'name': name, 'admin_id': admin_id} for name in new_names],
+        ).all()
+        chapter_ids = {row.name: row.id for row in created}
+        result.chapters_created += len(chapter_ids)
+        index_documents(connection, [chapter_document(row.id, row.name) for row in created])
+    else:
+        chapter_ids = {}
+    result.chapters_updated += sum(1 for name in merged if name in existing)
+    chapter_ids.update(existing)
+    result.chapter_ids.update(chapter_ids.values())
+
+    # Existing section names, for the existing chapters only, in one query
+    taken = set()
+    if existing:
+        taken = set(connection.execute(
+            select(Section.chapter_id, Section.name)
+            .where(Section.chapter_id.in_(existing.values()))
+        ).tuples())
+
+    # New sections go after the existing ones, in import order
+    positions = next_positions(connection, existing.values())
+
+    rows = []
+    for name, chapter in merged.items():
+        chapter_id = chapter_ids[name]
+        position = positions.get(chapter_id, 1)
+        for section in chapter['sections']:
+            if (chapter_id, section['name']) in taken:
+                result.error(section['line'], 'A section with this name already exists in this chapter.',
+                             chapter=name, section=section['name'])
+                continue
+            taken.add((chapter_id, section['name']))
+            rows.append(dict(rendered_fields(section['content']), chapter_id=chapter_id, position=position,
+                             name=section['name'], content=section['content']))
+            position += 1
+    if not rows:
+        return
+
+    created = connection.execute(
+        insert(Section).returning(Section.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    result.sections_created += len(created)
+    index_documents(connection, [section_document(section_id, row['chapter_id'], row['name'], row['content'])
+                                 for section_id, row in zip(created, rows)])
+
+    # Core inserts bypass the mapper events, so adjust the counters here
+    per_chapter = Counter(row['chapter_id'] for row in rows)
+    connection.execute(
+        update(Chapter)
+        .where(Chapter.id == bindparam('chapter_id'))
+        .values(section_count=Chapter.section_count + bindparam('added')),
+        [{'chapter_id': chapter_id, 'added': added} for chapter_id, added in per_chapter.items()],
+    )
+
+
+def import_chapters(admin_id, records, batch_size=BATCH_CHAPTERS):
+    """Import ``(line, record)`` pairs for an admin and return an ``ImportResult``."""
+    result = ImportResult()
+    connection = db.session.connection()
+    batch = []
+    try:
+        for line, record in records:
+            chapter = _validate(line, record, result)
+            if chapter is None:
+                continue
+            batch.append(chapter)
+            if len(batch) >= batch_size:
+                _import_batch(connection, admin_id, batch, result)
+                batch = []
+        if batch:
+            _import_batch(connection, admin_id, batch, result)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    record_writes('section', 'insert', result.sections_created)
+    invalidate('catalog', 'search', *(f'chapter:{chapter_id}' for chapter_id in result.chapter_ids))
+    return result
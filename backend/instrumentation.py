@@ -0,0 +1,150 @@
+"""Per-request SQL instrumentation.
+
+Listeners on the primary and replica engines time every statement. While a
+request is being handled the numbers are collected on ``g`` and, when the
+response goes out:
+
+* a ``Server-Timing`` header reports DB time, statement count and total time
+  (``SERVER_TIMING=0`` to leave it off),
+* one structured (JSON) log line on the ``backend.sql`` logger records the
+  statement count, DB time, the slowest statements and any query run
+  ``SQL_REPEAT_THRESHOLD`` or more times, which is usually an N+1 loop,
+* repeated statements are also logged as a warning.
+
+Any statement slower than ``SLOW_QUERY_MS`` (0 disables) is logged on
+``backend.sql.slow``, inside a request or not (CLI commands, migrations).
+"""
+import heapq
+import json
+import logging
+import time
+from collections import Counter
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('backend.sql')
+slow_logger = logging.getLogger('backend.sql.slow')
+
+_STATEMENT_PREVIEW = 300
+
+
+def _preview(statement):
+    statement = ' '.join(statement.split())
+    if len(statement) > _STATEMENT_PREVIEW:
+        return statement[:_STATEMENT_PREVIEW] + '...'
+    return statement
+
+
+class RequestStats:
+    """SQL statements executed while handling one request."""
+
+    def __init__(self, keep_slowest):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.keep_slowest = keep_slowest
+        self.slowest = []  # min-heap of (seconds, sequence, statement)
+        self.statements = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        entry = (seconds, self.count, statement)
+        if len(self.slowest) < self.keep_slowest:
+            heapq.heappush(self.slowest, entry)
+        elif self.slowest and seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def repeated(self, threshold):
+        # Only reads: drivers may run an executemany INSERT/UPDATE row by row
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= threshold and statement.lstrip().upper().startswith(('SELECT', 'WITH'))]
+
+    def as_dict(self, threshold):
+        return {
+            'statements': self.count,
+            'db_ms': round(self.seconds * 1000, 2),
+            'slowest': [{'ms': round(seconds * 1000, 2), 'sql': _preview(statement)}
+                        for seconds, _, statement in sorted(self.slowest, reverse=True)],
+            'repeated': [{'count': count, 'sql': _preview(statement)}
+                         for statement, count in self.repeated(threshold)],
+        }
+
+
+def current_stats():
+    """Return the ``RequestStats`` of the current request, or None."""
+    if has_request_context():
+        return g.get('sql_stats')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, seconds)
+    threshold = current_app.config.get('SLOW_QUERY_MS', 0) if has_app_context() else 0
+    if threshold and seconds * 1000 >= threshold:
+        slow_logger.warning(json.dumps({
+            'event': 'slow_query',
+            'ms': round(seconds * 1000, 2),
+            'sql': _preview(statement),
+            'path': request.path if has_request_context() else None,
+        }))
+
+
+def instrument_engine(engine):
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _start_request():
+    g.sql_stats = RequestStats(current_app.config['SQL_SLOWEST_STATEMENTS'])
+
+
+def _finish_request(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+    config = current_app.config
+    total_ms = (time.perf_counter() - stats.started) * 1000
+    summary = stats.as_dict(config['SQL_REPEAT_THRESHOLD'])
+
+    if config['SERVER_TIMING']:
+        timing = [
+            f'db;dur={summary["db_ms"]};desc="{stats.count} queries"',
+            f'app;dur={round(total_ms, 2)}',
+        ]
+        response.headers.add('Server-Timing', ', '.join(timing))
+
+    logger.info(json.dumps(dict(
+        summary,
+        event='request_sql',
+        method=request.method,
+        path=request.path,
+        endpoint=request.endpoint,
+        status=response.status_code,
+        duration_ms=round(total_ms, 2),
+    )))
+    for repeat in summary['repeated']:
+        logger.warning('Possible N+1 in %s: statement ran %d times: %s',
+                       request.endpoint, repeat['count'], repeat['sql'])
+    return response
+
+
+def init_instrumentation(app, engines):
+    """Instrument the given engines and install the request hooks."""
+    for engine in engines:
+        instrument_engine(engine)
+    if app.config['SQL_INSTRUMENTATION']:
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
@@ -0,0 +1,148 @@
+"""Prometheus metrics, served at ``/metrics`` in the text exposition format.
+
+Tracked per worker and aggregated at scrape time:
+
+* requests by endpoint, method and status, with latency and response-size
+  histograms (unmatched URLs share the ``<unmatched>`` endpoint label),
+* template render time per template,
+* DB pool connections checked out and open, per engine,
+* committed content writes (sections and comments) by kind and action,
+* the depth of the comment write queue and the comments it refused.
+
+Under gunicorn, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty, writable
+directory before the workers start; every worker then writes its samples
+there and ``/metrics`` (answered by any one worker) sums them. The
+``gunicorn.conf.py`` hooks clear the directory on start and drop the files of
+workers that exit. Without the variable the metrics are per process.
+
+``METRICS_TOKEN``, when set, must be sent as ``Authorization: Bearer <token>``.
+"""
+import os
+import time
+from collections import Counter as Tally
+from flask import Response, abort, before_render_template, current_app, g, request, template_rendered
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+from backend.models import Section, ChapterComment, SectionComment
+from backend.routing import RoutingSession
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUESTS = Counter('scriptscope_http_requests_total', 'HTTP requests handled',
+                   ['method', 'endpoint', 'status'])
+LATENCY = Histogram('scriptscope_http_request_duration_seconds', 'Time spent handling a request',
+                    ['method', 'endpoint'], buckets=_LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('scriptscope_http_response_size_bytes', 'Response body size',
+                          ['endpoint'], buckets=_SIZE_BUCKETS)
+TEMPLATE_RENDER = Histogram('scriptscope_template_render_seconds', 'Time spent rendering a template',
+                            ['template'], buckets=_LATENCY_BUCKETS)
+POOL_CHECKED_OUT = Gauge('scriptscope_db_pool_checked_out', 'Connections currently checked out of the pool',
+                         ['engine'], multiprocess_mode='livesum')
+POOL_OPEN = Gauge('scriptscope_db_pool_connections', 'Open DBAPI connections held by the pool',
+                  ['engine'], multiprocess_mode='livesum')
+CONTENT_WRITES = Counter('scriptscope_content_writes_total', 'Committed section and comment writes',
+                         ['kind', 'action'])
+COMMENT_QUEUE_DEPTH = Gauge('scriptscope_comment_queue_depth', 'Accepted comments waiting to be written',
+                            multiprocess_mode='livesum')
+COMMENT_QUEUE_REJECTED = Counter('scriptscope_comment_queue_rejected_total',
+                                 'Comments refused because the write queue was full')
+
+_WRITE_KINDS = {Section: 'section', ChapterComment: 'chapter_comment', SectionComment: 'section_comment'}
+_PENDING_KEY = 'metrics_writes'
+
+
+def record_writes(kind, action, count=1):
+    """Count writes that bypass the ORM session (e.g. Core bulk inserts)."""
+    if count:
+        CONTENT_WRITES.labels(kind, action).inc(count)
+
+
+# Writes are tallied when flushed and only counted once the transaction commits
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _tally_writes(db_session, flush_context):
+    tally = db_session.info.setdefault(_PENDING_KEY, Tally())
+    for action, objects in (('insert', db_session.new), ('update', db_session.dirty),
+                            ('delete', db_session.deleted)):
+        for obj in objects:
+            kind = _WRITE_KINDS.get(type(obj))
+            if kind and (action != 'update' or db_session.is_modified(obj)):
+                tally[kind, action] += 1
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _count_writes(db_session):
+    for (kind, action), count in db_session.info.pop(_PENDING_KEY, {}).items():
+        record_writes(kind, action, count)
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_writes(db_session, previous_transaction):
+    if not previous_transaction.nested:
+        db_session.info.pop(_PENDING_KEY, None)
+
+
+def _instrument_pool(engine, label):
+    checked_out = POOL_CHECKED_OUT.labels(label)
+    open_connections = POOL_OPEN.labels(label)
+    event.listen(engine, 'checkout', lambda *args: checked_out.inc())
+    event.listen(engine, 'checkin', lambda *args: checked_out.dec())
+    event.listen(engine, 'connect', lambda *args: open_connections.inc())
+    event.listen(engine, 'close', lambda *args: open_connections.dec())
+
+
+def _endpoint():
+    return request.endpoint or '<unmatched>'
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    endpoint = _endpoint()
+    REQUESTS.labels(request.method, endpoint, str(response.status_code)).inc()
+    LATENCY.labels(request.method, endpoint).observe(time.perf_counter() - started)
+    if not response.is_streamed:
+        RESPONSE_SIZE.labels(endpoint).observe(response.calculate_content_length() or 0)
+    return response
+
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    starts = g.get('metrics_templates')
+    if starts:
+        TEMPLATE_RENDER.labels(template.name or '<string>').observe(time.perf_counter() - starts.pop())
+
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app, engines):
+    """Install the request hooks, pool listeners and the ``/metrics`` endpoint."""
+    if not app.config['METRICS_ENABLED']:
+        return
+    for number, engine in enumerate(engines):
+        _instrument_pool(engine, 'primary' if number == 0 else f'replica{number}')
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
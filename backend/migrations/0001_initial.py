@@ -0,0 +1,12 @@
+"""Create any missing tables from the current models.
+
+Fresh databases get the whole schema (columns and indexes included) here;
+the later migrations then find nothing to do. Databases created before the
+migration runner existed only gain the tables they lack.
+"""
+from backend.app import db
+
+
+def upgrade(connection):
+    from backend import models  # noqa: F401  (registers the tables)
+    db.metadata.create_all(bind=connection)
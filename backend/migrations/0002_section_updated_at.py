@@ -0,0 +1,7 @@
+"""Add Section.updated_at (formerly backend/add_updated_at_column.py)."""
+from sqlalchemy import Column, DateTime
+from backend.migrations.ops import add_column
+
+
+def upgrade(connection):
+    add_column(connection, 'section', Column('updated_at', DateTime))
@@ -0,0 +1,25 @@
+"""Add the denormalized section/comment counters and backfill them."""
+from sqlalchemy import Column, Integer, text
+from backend.migrations.ops import add_column
+
+
+def _counter(name):
+    return Column(name, Integer, nullable=False, server_default='0')
+
+
+def upgrade(connection):
+    added = [
+        add_column(connection, 'chapter', _counter('section_count')),
+        add_column(connection, 'chapter', _counter('comment_count')),
+        add_column(connection, 'section', _counter('comment_count')),
+    ]
+    if any(added):
+        connection.execute(text(
+            'UPDATE chapter SET '
+            'section_count = (SELECT COUNT(*) FROM section WHERE section.chapter_id = chapter.id), '
+            'comment_count = (SELECT COUNT(*) FROM chapter_comment WHERE chapter_comment.chapter_id = chapter.id)'
+        ))
+        connection.execute(text(
+            'UPDATE section SET '
+            'comment_count = (SELECT COUNT(*) FROM section_comment WHERE section_comment.section_id = section.id)'
+        ))
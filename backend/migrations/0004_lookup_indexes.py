@@ -0,0 +1,17 @@
+"""Index the duplicate-check and comment-listing lookups.
+
+Runs outside a transaction so Postgres can build the indexes CONCURRENTLY
+without blocking writes.
+"""
+from backend.migrations.ops import create_index
+
+transactional = False
+
+
+def upgrade(connection):
+    create_index(connection, 'ix_chapter_admin_id_name', 'chapter', ['admin_id', 'name'])
+    create_index(connection, 'ix_section_chapter_id_name', 'section', ['chapter_id', 'name'])
+    create_index(connection, 'ix_chapter_comment_chapter_id_created_at',
+                 'chapter_comment', ['chapter_id', 'created_at', 'id'])
+    create_index(connection, 'ix_section_comment_section_id_created_at',
+                 'section_comment', ['section_id', 'created_at', 'id'])
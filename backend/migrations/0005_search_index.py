@@ -0,0 +1,6 @@
+"""Create the full-text search index and populate it from existing content."""
+from backend.search import rebuild
+
+
+def upgrade(connection):
+    rebuild(connection)
@@ -0,0 +1,10 @@
+"""Store pre-rendered section HTML and render existing sections."""
+from sqlalchemy import Column, Integer, Text
+from backend.migrations.ops import add_column
+from backend.rendering import rerender
+
+
+def upgrade(connection):
+    add_column(connection, 'section', Column('rendered_html', Text, nullable=True))
+    add_column(connection, 'section', Column('renderer_version', Integer, nullable=True))
+    rerender(connection)
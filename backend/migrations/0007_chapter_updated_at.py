@@ -0,0 +1,9 @@
+"""Add Chapter.updated_at, used for conditional GET validators."""
+from sqlalchemy import Column, DateTime, text
+from backend.migrations.ops import add_column
+
+
+def upgrade(connection):
+    add_column(connection, 'chapter', Column('updated_at', DateTime))
+    connection.execute(text('UPDATE chapter SET updated_at = created_at WHERE updated_at IS NULL'))
+    connection.execute(text('UPDATE section SET updated_at = created_at WHERE updated_at IS NULL'))
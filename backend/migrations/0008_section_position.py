@@ -0,0 +1,12 @@
+"""Add Section.position, numbering existing sections by id within each chapter."""
+from sqlalchemy import Column, Integer, text
+from backend.migrations.ops import add_column
+
+
+def upgrade(connection):
+    if add_column(connection, 'section', Column('position', Integer, nullable=False, server_default='0')):
+        connection.execute(text(
+            'UPDATE section SET position = '
+            '(SELECT COUNT(*) FROM section AS earlier '
+            'WHERE earlier.chapter_id = section.chapter_id AND earlier.id <= section.id)'
+        ))
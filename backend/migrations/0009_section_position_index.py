@@ -0,0 +1,8 @@
+"""Index sections by (chapter_id, position) for ordered listings and prev/next lookups."""
+from backend.migrations.ops import create_index
+
+transactional = False
+
+
+def upgrade(connection):
+    create_index(connection, 'ix_section_chapter_id_position', 'section', ['chapter_id', 'position'])
@@ -0,0 +1,27 @@
+"""Store section content compressed (see backend/compression.py).
+
+On Postgres the column becomes ``bytea`` (existing text is kept as UTF-8
+bytes); SQLite keeps its TEXT column. A dictionary is trained on the existing
+content, then rows are rewritten in batches. Each batch commits on its own,
+and converted rows are skipped, so an interrupted run resumes where it left off.
+"""
+from sqlalchemy import LargeBinary, inspect, text
+from backend.compression import recompress, train_dictionary
+from backend.migrations.ops import has_table
+
+transactional = False
+
+
+def upgrade(connection):
+    from backend.models import CompressionDictionary
+    if not has_table(connection, CompressionDictionary.__tablename__):
+        CompressionDictionary.__table__.create(connection)
+    if connection.dialect.name == 'postgresql':
+        content = next(c for c in inspect(connection).get_columns('section') if c['name'] == 'content')
+        if not isinstance(content['type'], LargeBinary):
+            connection.execute(text(
+                "ALTER TABLE section ALTER COLUMN content TYPE bytea USING convert_to(content, 'UTF8')"
+            ))
+    if not connection.execute(text('SELECT 1 FROM compression_dictionary LIMIT 1')).first():
+        train_dictionary(connection)
+    recompress(connection)
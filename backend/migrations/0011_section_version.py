@@ -0,0 +1,7 @@
+"""Add Section.version, the base version that PATCH edits are checked against."""
+from sqlalchemy import Column, Integer
+from backend.migrations.ops import add_column
+
+
+def upgrade(connection):
+    add_column(connection, 'section', Column('version', Integer, nullable=False, server_default='1'))
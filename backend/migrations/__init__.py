@@ -0,0 +1,142 @@
+"""Versioned schema migrations.
+
+Each migration is a module in this package named ``<version>_<slug>.py``
+exposing an ``upgrade(connection)`` function. Versions are applied in
+lexical order and recorded in the ``schema_migrations`` table. A module may
+set ``transactional = False`` when its statements cannot run inside a
+transaction block (e.g. ``CREATE INDEX CONCURRENTLY`` on Postgres); it is
+then executed on an autocommit connection.
+
+Concurrent runs (several workers starting at once) migrate one at a time:
+Postgres takes an advisory lock, a SQLite file gets an ``flock`` on a
+``<database>.migrate.lock`` file next to it. Pending versions are read only
+once the lock is held.
+
+Migrations are written to be idempotent (see ``ops.py``) so a database
+created by an older ``db.create_all()`` can be brought up to date safely.
+"""
+import importlib
+import logging
+import pkgutil
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select, text
+
+try:
+    import fcntl
+except ImportError:  # Windows: SQLite migrations are not serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_lock so concurrent workers migrate one at a time
+ADVISORY_LOCK_KEY = 7263541
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', String(32), primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+class Migration:
+    def __init__(self, version, name, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    @property
+    def transactional(self):
+        return getattr(self.module, 'transactional', True)
+
+    def upgrade(self, connection):
+        self.module.upgrade(connection)
+
+
+def discover():
+    """Return every migration in this package, ordered by version."""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        version, _, name = info.name.partition('_')
+        if not version.isdigit():
+            continue
+        module = importlib.import_module(f'{__name__}.{info.name}')
+        migrations.append(Migration(version, name, module))
+    return sorted(migrations, key=lambda m: m.version)
+
+
+def applied_versions(engine):
+    _metadata.create_all(engine)
+    with engine.connect() as connection:
+        return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending(engine):
+    applied = applied_versions(engine)
+    return [m for m in discover() if m.version not in applied]
+
+
+def _record(connection, migration):
+    connection.execute(schema_migrations.insert().values(
+        version=migration.version,
+        name=migration.name,
+        applied_at=datetime.utcnow(),
+    ))
+
+
+def _apply(engine, migration):
+    logger.info('Applying migration %s_%s', migration.version, migration.name)
+    if migration.transactional:
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            _record(connection, migration)
+    else:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            migration.upgrade(connection)
+            _record(connection, migration)
+
+
+@contextmanager
+def _migration_lock(engine):
+    """Hold a lock that keeps other processes from migrating the same database."""
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as lock_connection:
+            lock_connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+            try:
+                yield
+            finally:
+                lock_connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+    elif engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:') and fcntl:
+        with open(engine.url.database + '.migrate.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+    else:
+        yield
+
+
+def upgrade(engine):
+    """Apply all pending migrations and return the versions that were applied."""
+    with _migration_lock(engine):
+        # Read under the lock: another process may have just applied some
+        todo = pending(engine)
+        for migration in todo:
+            _apply(engine, migration)
+        return [m.version for m in todo]
+
+
+def reset(engine):
+    """Drop every table (models, search index, migration history) and migrate from scratch.
+
+    Only meant for development and load-test databases.
+    """
+    from backend.app import db
+    from backend.search import get_backend
+    with engine.begin() as connection:
+        get_backend(connection.dialect.name).drop(connection)
+        db.metadata.drop_all(bind=connection)
+        _metadata.drop_all(bind=connection)
+    from backend.pagecache import clear
+    clear()
+    return upgrade(engine)
@@ -0,0 +1,45 @@
+"""Idempotent, dialect-aware schema operations for use inside migrations."""
+from sqlalchemy import inspect, text
+
+
+def has_table(connection, table):
+    return inspect(connection).has_table(table)
+
+
+def has_column(connection, table, column):
+    return any(c['name'] == column for c in inspect(connection).get_columns(table))
+
+
+def has_index(connection, table, index):
+    return any(i['name'] == index for i in inspect(connection).get_indexes(table))
+
+
+def add_column(connection, table, column):
+    """Add a ``sqlalchemy.Column`` to an existing table unless it is already there."""
+    if has_column(connection, table, column.name):
+        return False
+    dialect = connection.dialect
+    ddl = f'ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}'
+    if column.server_default is not None:
+        ddl += f' DEFAULT {column.server_default.arg}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    connection.execute(text(ddl))
+    return True
+
+
+def create_index(connection, name, table, columns, unique=False):
+    """Create an index unless it exists.
+
+    On Postgres the index is built ``CONCURRENTLY`` so the table stays
+    writable; callers must run on an autocommit connection (``transactional =
+    False`` in the migration module).
+    """
+    if has_index(connection, table, name):
+        return False
+    concurrently = 'CONCURRENTLY ' if connection.dialect.name == 'postgresql' else ''
+    unique = 'UNIQUE ' if unique else ''
+    connection.execute(text(
+        f'CREATE {unique}INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'
+    ))
+    return True
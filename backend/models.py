@@ -1,5 +1,7 @@
 from .app import db
 from datetime import datetime
+from sqlalchemy.orm import deferred
+from .compression import CompressedText
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(db.Model):
@@ -46,29 +48,76 @@ class Admin(db.Model):
         return f"{self.first_name} {self.last_name}"
 
 class Chapter(db.Model):
+    __table_args__ = (
+        db.Index('ix_chapter_admin_id_name', 'admin_id', 'name'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     admin_id = db.Column(db.Integer, db.ForeignKey('admin.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Denormalized counters, maintained by backend/counters.py
+    section_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     sections = db.relationship('Section', backref='chapter', lazy=True, cascade='all, delete-orphan')
     chapter_comments = db.relationship('ChapterComment', backref='chapter', lazy=True, cascade='all, delete-orphan')
 
 class Section(db.Model):
+    __table_args__ = (
+        db.Index('ix_section_chapter_id_name', 'chapter_id', 'name'),
+        db.Index('ix_section_chapter_id_position', 'chapter_id', 'position'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=True)
+    # The large text columns are deferred: listings only need names, so content
+    # is loaded on first access or with undefer() where it is displayed
+    content = deferred(db.Column(CompressedText, nullable=True))
     chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Order within the chapter (ties broken by id); new sections go last,
+    # see backend/ordering.py
+    position = db.Column(db.Integer, nullable=False, server_default='0')
+    
+    # Content rendered to HTML at write time, maintained by backend/rendering.py
+    rendered_html = deferred(db.Column(db.Text, nullable=True))
+    renderer_version = db.Column(db.Integer, nullable=True)
+    
+    # Denormalized counter, maintained by backend/counters.py
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Bumped by every ORM update, which only succeeds if the row still has the
+    # version it was read with; PATCH edits name it as their base version
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+    
     # Relationships
     section_comments = db.relationship('SectionComment', backref='section', lazy=True, cascade='all, delete-orphan')
 
 
+# Immutable compression dictionaries referenced by stored section content,
+# see backend/compression.py
+class CompressionDictionary(db.Model):
+    __tablename__ = 'compression_dictionary'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    codec = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 # Separate schemas for chapter and section comments
 class ChapterComment(db.Model):
+    __table_args__ = (
+        db.Index('ix_chapter_comment_chapter_id_created_at', 'chapter_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -76,6 +125,10 @@ class ChapterComment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class SectionComment(db.Model):
+    __table_args__ = (
+        db.Index('ix_section_comment_section_id_created_at', 'section_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -0,0 +1,54 @@
+"""Explicit section order within a chapter.
+
+``Section.position`` orders the sections of a chapter, ties broken by id, and
+is indexed together with ``chapter_id`` so ordered listings and previous/next
+lookups are index range scans. A section created through the ORM without a
+position is appended to the end of its chapter; Core inserts (import,
+synthetic data) assign positions themselves with ``next_positions()``.
+"""
+from datetime import datetime
+from sqlalchemy import bindparam, event, func, select, update
+from backend.models import Chapter, Section
+
+
+def next_positions(connection, chapter_ids):
+    """Return ``{chapter_id: first free position}`` for the given chapters in one query."""
+    chapter_ids = list(chapter_ids)
+    positions = dict.fromkeys(chapter_ids, 1)
+    if chapter_ids:
+        positions.update(connection.execute(
+            select(Section.chapter_id, func.max(Section.position) + 1)
+            .where(Section.chapter_id.in_(chapter_ids))
+            .group_by(Section.chapter_id)
+        ).all())
+    return positions
+
+
+@event.listens_for(Section, 'before_insert')
+def _append_new_section(mapper, connection, target):
+    if target.position is None and target.chapter_id is not None:
+        target.position = next_positions(connection, [target.chapter_id])[target.chapter_id]
+
+
+def reorder(connection, chapter_id, section_ids):
+    """Number the chapter's sections 1..n in the order of ``section_ids``.
+
+    ``section_ids`` must hold every section of the chapter exactly once;
+    raises ``ValueError`` otherwise. Section ``updated_at`` is left alone (the
+    content didn't change) and the chapter's is bumped instead, so pages that
+    list the sections revalidate.
+    """
+    current = set(connection.execute(
+        select(Section.id).where(Section.chapter_id == chapter_id)
+    ).scalars())
+    if len(section_ids) != len(set(section_ids)) or set(section_ids) != current:
+        raise ValueError('section_ids must list every section of the chapter exactly once')
+    if section_ids:
+        connection.execute(
+            update(Section)
+            .where(Section.id == bindparam('section_id'))
+            .values(position=bindparam('new_position'), updated_at=Section.updated_at),
+            [{'section_id': section_id, 'new_position': position}
+             for position, section_id in enumerate(section_ids, start=1)],
+        )
+    connection.execute(update(Chapter).where(Chapter.id == chapter_id).values(updated_at=datetime.utcnow()))
@@ -0,0 +1,458 @@
+"""Rendered fragment cache with dependency-tag invalidation.
+
+Views cache the expensive, viewer-independent part of a page (the chapter
+grid of the catalog, the body of a section page) under a key built from the
+route parameters and the viewer's role, and declare the tags it depends on:
+
+    catalog             chapter names, dates and section counts on the index
+    search              full-text results (any chapter or section text)
+    chapter:<id>        a chapter's name and its list of section names
+    section:<id>        one section's content and comments
+
+Every tag has a version. An entry stores the versions of its tags when it
+was rendered and is only served while they are unchanged, so invalidating a
+tag is a single version bump no matter how many entries depend on it. Tags
+are bumped after a commit that touched the content (session events below);
+Core writes that bypass the session call ``invalidate()`` or ``clear()``.
+
+Backends, picked by ``PAGE_CACHE_BACKEND``:
+
+    memory       per-process LRU; only correct with a single worker process
+    sqlite       a SQLite file shared by all workers on the host (default)
+    filesystem   one file per entry in a directory shared by all workers
+    none         caching off
+
+Size is bounded by ``PAGE_CACHE_MAX_ENTRIES`` and ``PAGE_CACHE_MAX_BYTES``;
+least recently used entries are evicted first (the filesystem backend checks
+every ``EVICT_EVERY`` writes, so it can briefly run over).
+
+With read replicas, a request that would render from a replica within
+``REPLICA_STICKY_SECONDS`` of a bump to one of the fragment's tags renders
+from the primary instead: the replica may not have the write behind the bump
+yet, and its stale render would be stored under the new versions.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context, session
+from sqlalchemy import event, inspect
+from backend.conditional import template_digest
+from backend.models import Chapter, Section, ChapterComment, SectionComment
+from backend.routing import RoutingSession, reading_replica, use_primary
+
+ALL = '*'  # every entry depends on this tag; bumping it clears the cache
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class MemoryBackend:
+    # Tags whose versions are remembered, per allowed entry
+    TAGS_PER_ENTRY = 4
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (payload, versions)
+        self.size = 0
+        # tag -> (version, bump time), least recently bumped first. Versions
+        # come from one counter; a forgotten tag reports ``floor``, the last
+        # version forgotten, which no entry rendered before that bump holds.
+        self.versions = OrderedDict()
+        self.counter = 0
+        self.floor = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, payload, versions):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self.entries[key] = (payload, versions)
+            self.size += len(payload)
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def delete(self, key):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+
+    def tag_versions(self, tags):
+        with self.lock:
+            return {tag: self.versions[tag][0] if tag in self.versions else self.floor for tag in tags}
+
+    def bumped_since(self, tags, since):
+        with self.lock:
+            return any(tag in self.versions and self.versions[tag][1] > since for tag in tags)
+
+    def bump(self, tags):
+        now = time.time()
+        with self.lock:
+            for tag in tags:
+                self.counter += 1
+                self.versions.pop(tag, None)
+                self.versions[tag] = (self.counter, now)
+            while len(self.versions) > self.TAGS_PER_ENTRY * self.max_entries:
+                _, (self.floor, _) = self.versions.popitem(last=False)
+
+
+class SqliteBackend:
+    # Recency is only refreshed once this many seconds have passed, so hits
+    # rarely need a write
+    TOUCH_AFTER = 30
+
+    def __init__(self, path, max_entries, max_bytes):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, payload BLOB NOT NULL, '
+                'versions TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed)')
+            connection.execute('CREATE TABLE IF NOT EXISTS tags (tag TEXT PRIMARY KEY, version INTEGER NOT NULL, '
+                               'bumped REAL NOT NULL DEFAULT 0)')
+            if 'bumped' not in [row[1] for row in connection.execute('PRAGMA table_info(tags)')]:
+                connection.execute('ALTER TABLE tags ADD COLUMN bumped REAL NOT NULL DEFAULT 0')
+            # Entry count and total size, kept up to date by triggers so writes
+            # don't have to add up the whole table
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), '
+                'count INTEGER NOT NULL, size INTEGER NOT NULL)')
+            connection.execute('INSERT OR IGNORE INTO totals SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM entries')
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN '
+                'UPDATE totals SET count = count + 1, size = size + NEW.size; END')
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN '
+                'UPDATE totals SET count = count - 1, size = size - OLD.size; END')
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN '
+                'UPDATE totals SET size = size - OLD.size + NEW.size; END')
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute('SELECT payload, versions, accessed FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[2] > self.TOUCH_AFTER:
+            connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        return row[0], json.loads(row[1])
+
+    def set(self, key, payload, versions):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete skips the triggers
+            connection.execute(
+                'INSERT INTO entries (key, payload, versions, size, accessed) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, versions = excluded.versions, '
+                'size = excluded.size, accessed = excluded.accessed',
+                (key, payload, json.dumps(versions), len(payload), time.time()))
+            count, size = connection.execute('SELECT count, size FROM totals').fetchone()
+            if count > self.max_entries or size > self.max_bytes:
+                self._evict(connection, count, size)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _evict(self, connection, count, size):
+        # Read only as far as needed, oldest first
+        rows = connection.execute('SELECT key, size FROM entries ORDER BY accessed')
+        doomed = []
+        for key, entry_size in rows:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            size -= entry_size
+        rows.close()
+        connection.executemany('DELETE FROM entries WHERE key = ?', doomed)
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def tag_versions(self, tags):
+        tags = list(tags)
+        placeholders = ', '.join('?' for _ in tags)
+        found = dict(self._connection().execute(
+            f'SELECT tag, version FROM tags WHERE tag IN ({placeholders})', tags).fetchall())
+        return {tag: found.get(tag, 0) for tag in tags}
+
+    def bumped_since(self, tags, since):
+        tags = list(tags)
+        placeholders = ', '.join('?' for _ in tags)
+        return self._connection().execute(
+            f'SELECT 1 FROM tags WHERE tag IN ({placeholders}) AND bumped > ? LIMIT 1',
+            tags + [since]).fetchone() is not None
+
+    def bump(self, tags):
+        now = time.time()
+        self._connection().executemany(
+            'INSERT INTO tags (tag, version, bumped) VALUES (?, 1, ?) '
+            'ON CONFLICT(tag) DO UPDATE SET version = version + 1, bumped = excluded.bumped',
+            [(tag, now) for tag in tags])
+
+
+class FilesystemBackend:
+    # Eviction scans the directory, so it runs on every Nth write per process
+    EVICT_EVERY = 50
+
+    def __init__(self, path, max_entries, max_bytes):
+        self.entries_dir = os.path.join(path, 'entries')
+        self.tags_dir = os.path.join(path, 'tags')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.writes = 0
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.tags_dir, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.entries_dir, _digest(key))
+
+    def _write(self, path, data):
+        # Readers in other workers must never see a half-written file
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                header = f.readline()
+                payload = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return payload, json.loads(header)
+
+    def set(self, key, payload, versions):
+        self._write(self._entry_path(key), json.dumps(versions).encode() + b'\n' + payload)
+        self.writes += 1
+        if self.writes % self.EVICT_EVERY == 0:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.entries_dir):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        count = len(entries)
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            count -= 1
+            size -= entry_size
+
+    def delete(self, key):
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def tag_versions(self, tags):
+        versions = {}
+        for tag in tags:
+            try:
+                with open(os.path.join(self.tags_dir, _digest(tag)), 'r') as f:
+                    versions[tag] = f.read()
+            except OSError:
+                versions[tag] = ''
+        return versions
+
+    def bumped_since(self, tags, since):
+        for tag in tags:
+            try:
+                if os.stat(os.path.join(self.tags_dir, _digest(tag))).st_mtime > since:
+                    return True
+            except OSError:
+                pass
+        return False
+
+    def bump(self, tags):
+        for tag in tags:
+            # A fresh random version, so concurrent bumps never collide
+            self._write(os.path.join(self.tags_dir, _digest(tag)), os.urandom(8).hex().encode())
+
+
+class PageCache:
+    def __init__(self, backend, namespace=''):
+        self.backend = backend
+        # Keeps entries from another database or an older set of templates apart
+        self.namespace = namespace
+
+    def fragment(self, key, tags, render):
+        """Return the cached value for ``key``, or call ``render()`` and cache its result.
+
+        ``render`` must return something JSON-serializable (typically a dict
+        holding the HTML and the few values the surrounding page needs).
+        """
+        if self.backend is None:
+            return render()
+        key = _digest(repr((self.namespace, key)))
+        tags = [ALL] + list(tags)
+        entry = self.backend.get(key)
+        if entry is not None:
+            payload, versions = entry
+            if self.backend.tag_versions(versions) == versions:
+                return json.loads(payload)
+            self.backend.delete(key)
+        # Read the versions before rendering: a write that lands during the
+        # render bumps them, so the entry is already stale when stored
+        versions = self.backend.tag_versions(tags)
+        if reading_replica() and self.backend.bumped_since(
+                tags, time.time() - current_app.config['REPLICA_STICKY_SECONDS']):
+            use_primary()
+        value = render()
+        self.backend.set(key, json.dumps(value).encode(), versions)
+        return value
+
+    def invalidate(self, *tags):
+        if self.backend is not None and tags:
+            self.backend.bump(set(tags))
+
+    def clear(self):
+        self.invalidate(ALL)
+
+
+def viewer_role():
+    """The part of the session that cached fragments may depend on."""
+    return ('user' if 'user_id' in session else '') + ('admin' if 'admin_id' in session else '') or 'anonymous'
+
+
+def create_backend(app):
+    config = app.config
+    name = config['PAGE_CACHE_BACKEND']
+    max_entries = config['PAGE_CACHE_MAX_ENTRIES']
+    max_bytes = config['PAGE_CACHE_MAX_BYTES']
+    if name == 'memory':
+        return MemoryBackend(max_entries, max_bytes)
+    if name == 'sqlite':
+        path = config['PAGE_CACHE_PATH'] or os.path.join(app.instance_path, 'page_cache.db')
+        return SqliteBackend(path, max_entries, max_bytes)
+    if name == 'filesystem':
+        path = config['PAGE_CACHE_PATH'] or os.path.join(app.instance_path, 'page_cache')
+        return FilesystemBackend(path, max_entries, max_bytes)
+    if name == 'none':
+        return None
+    raise ValueError(f'Unknown PAGE_CACHE_BACKEND {name!r}')
+
+
+def init_page_cache(app):
+    namespace = (app.config['SQLALCHEMY_DATABASE_URI'], template_digest(app))
+    app.extensions['page_cache'] = PageCache(create_backend(app), _digest(repr(namespace)))
+    return app.extensions['page_cache']
+
+
+def page_cache():
+    return current_app.extensions['page_cache']
+
+
+def invalidate(*tags):
+    """Invalidate tags from code outside a request (CLI, Core bulk writes); no-op without an app."""
+    if has_app_context() and 'page_cache' in current_app.extensions:
+        page_cache().invalidate(*tags)
+
+
+def clear():
+    invalidate(ALL)
+
+
+# Tags touched by a flush are collected on the session and only bumped once
+# the transaction commits, so no reader can re-cache the old content after
+# the invalidation.
+
+_PENDING_KEY = 'page_cache_tags'
+
+
+def _changed(obj, attribute):
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+
+def _tags_for(obj, action):
+    if isinstance(obj, Chapter):
+        if action == 'update' and not _changed(obj, 'name'):
+            return []
+        return ['catalog', 'search', f'chapter:{obj.id}']
+    if isinstance(obj, Section):
+        if action != 'update':
+            return ['catalog', 'search', f'chapter:{obj.chapter_id}', f'section:{obj.id}']
+        tags = []
+        if _changed(obj, 'name'):
+            tags += ['search', f'chapter:{obj.chapter_id}']
+        if _changed(obj, 'content'):
+            tags += ['search', f'section:{obj.id}']
+        return tags
+    if isinstance(obj, SectionComment):
+        return [f'section:{obj.section_id}']
+    if isinstance(obj, ChapterComment):
+        return [f'chapter:{obj.chapter_id}']
+    return []
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_tags(db_session, flush_context):
+    pending = db_session.info.setdefault(_PENDING_KEY, set())
+    for action, objects in (('insert', db_session.new), ('update', db_session.dirty),
+                            ('delete', db_session.deleted)):
+        for obj in objects:
+            pending.update(_tags_for(obj, action))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_committed(db_session):
+    tags = db_session.info.pop(_PENDING_KEY, None)
+    if tags:
+        invalidate(*tags)
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_tags(db_session, previous_transaction):
+    # A rolled-back savepoint keeps the tags of the outer transaction (over-invalidating is harmless)
+    if not previous_transaction.nested:
+        db_session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,214 @@
+"""On-demand profiling of individual requests.
+
+``ProfilingMiddleware`` wraps ``app.wsgi_app`` and profiles a request when
+
+* an admin (``admin_id`` in the session) sends the ``PROFILE_HEADER`` header
+  (default ``X-Profile: 1``), or
+* it is picked by ``PROFILE_SAMPLE_RATE`` (fraction of requests, default 0).
+
+A profiled request runs under cProfile while a background thread samples its
+stack every ``PROFILE_SAMPLE_INTERVAL_MS``. Profiling lasts until the
+response body has been sent. Three files go to ``PROFILE_DIR`` (default
+``<instance>/profiles``):
+
+    <id>.pstats      cProfile data, for ``python -m pstats`` or snakeviz
+    <id>.collapsed   sampled stacks in collapsed format, for flamegraph.pl
+                     or speedscope
+    <id>.json        method, path, status, duration and trigger
+
+Only the newest ``PROFILE_KEEP`` profiles are kept. Admins can list and
+download them through ``/api/admin/profiles``.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from werkzeug.wrappers import Request
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'pstats': 'application/octet-stream', 'collapsed': 'text/plain', 'json': 'application/json'}
+PROFILE_ID = re.compile(r'^[0-9T]+-[0-9a-f]+-[\w.-]+$')
+
+# cProfile can only be active once per process, so concurrent requests aren't profiled
+_active = threading.Lock()
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed stacks."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def profile_dir(app):
+    return app.config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles')
+
+
+def list_profiles(app):
+    """Return profile metadata, newest first."""
+    directory = profile_dir(app)
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # removed by rotation or still being written
+    return profiles
+
+
+def profile_path(app, profile_id, fmt):
+    """Return the file for a profile, or None when the id or format is unknown."""
+    if fmt not in FORMATS or not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(profile_dir(app), f'{profile_id}.{fmt}')
+    return path if os.path.isfile(path) else None
+
+
+class _ProfiledBody:
+    """Response body that stops profiling once it is exhausted or closed."""
+
+    def __init__(self, app_iter, finish):
+        self.app_iter = app_iter
+        self.finish = finish
+        self.finished = False
+
+    def __iter__(self):
+        try:
+            yield from self.app_iter
+        finally:
+            self._finish()
+
+    def close(self):
+        try:
+            if hasattr(self.app_iter, 'close'):
+                self.app_iter.close()
+        finally:
+            self._finish()
+
+    def _finish(self):
+        if not self.finished:
+            self.finished = True
+            self.finish()
+
+
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.app = app
+
+    def _trigger(self, environ):
+        config = self.app.config
+        header = 'HTTP_' + config['PROFILE_HEADER'].upper().replace('-', '_')
+        if environ.get(header) and self._is_admin(environ):
+            return 'header'
+        rate = config['PROFILE_SAMPLE_RATE']
+        if rate and random.random() < rate:
+            return 'sample'
+        return None
+
+    def _is_admin(self, environ):
+        flask_session = self.app.session_interface.open_session(self.app, Request(environ))
+        return flask_session is not None and 'admin_id' in flask_session
+
+    def __call__(self, environ, start_response):
+        trigger = self._trigger(environ)
+        if trigger is None or not _active.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+
+        status = {}
+
+        def capture_status(code, headers, exc_info=None):
+            status['code'] = int(code.split(' ', 1)[0])
+            return start_response(code, headers, exc_info)
+
+        interval = self.app.config['PROFILE_SAMPLE_INTERVAL_MS'] / 1000
+        sampler = StackSampler(threading.get_ident(), interval)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+
+        def finish():
+            profiler.disable()
+            sampler.stop()
+            _active.release()
+            self._save(environ, trigger, status.get('code'), time.perf_counter() - started, profiler, sampler)
+
+        try:
+            app_iter = self.wsgi_app(environ, capture_status)
+        except Exception:
+            finish()
+            raise
+        return _ProfiledBody(app_iter, finish)
+
+    def _save(self, environ, trigger, status, seconds, profiler, sampler):
+        directory = profile_dir(self.app)
+        path = environ.get('PATH_INFO', '/')
+        slug = re.sub(r'[^\w.-]+', '_', path.strip('/'))[:60] or 'root'
+        profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid():x}-{slug}"
+        base = os.path.join(directory, profile_id)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(base + '.pstats')
+            with open(base + '.collapsed', 'w') as f:
+                f.write(sampler.collapsed())
+            with open(base + '.json', 'w') as f:
+                json.dump({
+                    'id': profile_id,
+                    'method': environ.get('REQUEST_METHOD'),
+                    'path': path,
+                    'query': environ.get('QUERY_STRING', ''),
+                    'status': status,
+                    'duration_ms': round(seconds * 1000, 2),
+                    'samples': sum(sampler.stacks.values()),
+                    'trigger': trigger,
+                    'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+                }, f)
+            self._rotate(directory)
+        except OSError:
+            logger.exception('Could not save profile for %s', path)
+
+    def _rotate(self, directory):
+        keep = self.app.config['PROFILE_KEEP']
+        ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+        for profile_id in ids[:-keep] if keep else []:
+            for fmt in FORMATS:
+                try:
+                    os.remove(os.path.join(directory, f'{profile_id}.{fmt}'))
+                except FileNotFoundError:
+                    pass
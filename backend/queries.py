@@ -0,0 +1,296 @@
+import base64
+from datetime import datetime
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import aliased, contains_eager
+from backend.app import db
+from backend.models import User, Chapter, Section, ChapterComment, SectionComment
+
+
+def chapter_listing(admin_id=None, search=None, sort_by='name', chapter_ids=None):
+    """Return chapter rows with their section and comment counts.
+
+    Each row exposes ``id``, ``name``, ``admin_id``, ``created_at``,
+    ``section_count`` and ``comment_count``. The counts are the denormalized
+    columns kept by ``backend/counters.py``, so templates never touch the
+    ``sections`` relationship just to count it.
+    """
+    stmt = select(
+        Chapter.id,
+        Chapter.name,
+        Chapter.admin_id,
+        Chapter.created_at,
+        Chapter.section_count,
+        Chapter.comment_count,
+    )
+
+    if admin_id is not None:
+        stmt = stmt.where(Chapter.admin_id == admin_id)
+    if search:
+        stmt = stmt.where(Chapter.name.ilike(f'%{search}%'))
+    if chapter_ids is not None:
+        stmt = stmt.where(Chapter.id.in_(chapter_ids))
+
+    if sort_by == 'date':
+        stmt = stmt.order_by(Chapter.created_at.desc())
+    else:
+        stmt = stmt.order_by(Chapter.name)
+
+    return db.session.execute(stmt).all()
+
+
+def admin_sections(admin_id):
+    """Return every section owned by an admin with its chapter loaded in the same query."""
+    return (
+        Section.query.join(Section.chapter)
+        .filter(Chapter.admin_id == admin_id)
+        .options(contains_eager(Section.chapter))
+        .order_by(Section.chapter_id, Section.position, Section.id)
+        .all()
+    )
+
+
+def admin_section_names(admin_id):
+    """Return ``(id, name)`` rows for every section owned by an admin, for pickers."""
+    return db.session.execute(
+        select(Section.id, Section.name)
+        .join(Chapter, Chapter.id == Section.chapter_id)
+        .where(Chapter.admin_id == admin_id)
+        .order_by(Section.chapter_id, Section.position, Section.id)
+    ).all()
+
+
+def chapter_sections(chapter_id):
+    """Return the sections of a chapter in display order."""
+    return (
+        Section.query.filter_by(chapter_id=chapter_id)
+        .order_by(Section.position, Section.id)
+        .all()
+    )
+
+
+def section_outline(chapter_id):
+    """Return ``(id, name)`` rows for a chapter's sections in display order, for navigation."""
+    return db.session.execute(
+        select(Section.id, Section.name)
+        .where(Section.chapter_id == chapter_id)
+        .order_by(Section.position, Section.id)
+    ).all()
+
+
+def section_neighbors(section):
+    """Return the ``(id, name)`` rows before and after a section (either may be None).
+
+    Two single-row range scans on ``(chapter_id, position)`` instead of
+    loading the whole chapter.
+    """
+    key = tuple_(Section.position, Section.id)
+    current = tuple_(section.position, section.id)
+    neighbors = select(Section.id, Section.name).where(Section.chapter_id == section.chapter_id)
+    prev_section = db.session.execute(
+        neighbors.where(key < current)
+        .order_by(Section.position.desc(), Section.id.desc())
+        .limit(1)
+    ).first()
+    next_section = db.session.execute(
+        neighbors.where(key > current)
+        .order_by(Section.position, Section.id)
+        .limit(1)
+    ).first()
+    return prev_section, next_section
+
+
+# Sparse fieldsets for the JSON APIs: ``?fields=id,name`` selects only those
+# columns, so a client listing names never pulls section content.
+
+SECTION_FIELDS = ('id', 'name', 'content', 'chapter_id', 'position', 'created_at', 'updated_at',
+                  'comment_count', 'version')
+CHAPTER_FIELDS = ('id', 'name', 'created_at', 'updated_at', 'section_count', 'comment_count')
+
+
+def parse_fields(value, allowed, default):
+    """Parse a comma-separated ``fields`` parameter into a tuple of column names.
+
+    ``id`` is always included and the order follows ``allowed``. Returns
+    ``default`` when the parameter is missing; raises ``ValueError`` for
+    unknown names.
+    """
+    if not value:
+        return default
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add('id')
+    return tuple(name for name in allowed if name in requested)
+
+
+def _fieldset(model, fields):
+    return select(*(getattr(model, name) for name in fields))
+
+
+def section_fields(section_id, fields):
+    """Return the requested columns of one section as a mapping, or None."""
+    row = db.session.execute(_fieldset(Section, fields).where(Section.id == section_id)).first()
+    return dict(row._mapping) if row else None
+
+
+def chapter_section_fields(chapter_id, fields):
+    """Return the requested columns of a chapter's sections, in display order."""
+    rows = db.session.execute(
+        _fieldset(Section, fields)
+        .where(Section.chapter_id == chapter_id)
+        .order_by(Section.position, Section.id)
+    ).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def admin_chapter_fields(admin_id, fields):
+    """Return the requested columns of an admin's chapters."""
+    rows = db.session.execute(_fieldset(Chapter, fields).where(Chapter.admin_id == admin_id)).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def encode_cursor(created_at, comment_id):
+    raw = f'{created_at.isoformat()}|{comment_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)`` from a cursor string, raising ``ValueError`` if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, comment_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def comment_page(model, parent_column, parent_id, cursor=None, limit=20):
+    """Return one page of comments (newest first) and the cursor of the next page.
+
+    Pages are keyset-paginated on ``(created_at, id)`` so every page is a
+    bounded index range scan, and the author name is joined in the same query.
+    """
+    stmt = (
+        select(model.id, model.content, model.created_at, User.first_name, User.last_name)
+        .join(User, User.id == model.user_id)
+        .where(parent_column == parent_id)
+        .order_by(model.created_at.desc(), model.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        created_at, comment_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(model.created_at, model.id) < tuple_(created_at, comment_id))
+
+    rows = db.session.execute(stmt).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return [comment_dict(row) for row in rows], next_cursor
+
+
+def comment_dict(row):
+    """The JSON shape of a comment row (``id``, ``content``, ``created_at`` and the author's name)."""
+    return {
+        'id': row.id,
+        'content': row.content,
+        'user_name': f'{row.first_name} {row.last_name}',
+        'created_at': row.created_at.strftime('%B %d, %Y at %I:%M %p')
+    }
+
+
+def comments_after(model, parent_column, parent_id, after_id, limit=200):
+    """Comments of one parent with an id above ``after_id``, oldest first (the newest ``limit`` of them)."""
+    rows = db.session.execute(
+        select(model.id, model.content, model.created_at, User.first_name, User.last_name)
+        .join(User, User.id == model.user_id)
+        .where(parent_column == parent_id, model.id > after_id)
+        .order_by(model.id.desc())
+        .limit(limit)
+    ).all()
+    return [comment_dict(row) for row in reversed(rows)]
+
+
+def latest_comment_id(model):
+    """The highest comment id in one comment table (0 when empty)."""
+    return db.session.execute(select(func.max(model.id))).scalar() or 0
+
+
+def recent_comments(model, parent_column, after_id):
+    """Every comment with an id above ``after_id``, with its parent id as ``parent_id``."""
+    return db.session.execute(
+        select(model.id, model.content, model.created_at, parent_column.label('parent_id'),
+               User.first_name, User.last_name)
+        .join(User, User.id == model.user_id)
+        .where(model.id > after_id)
+        .order_by(model.id)
+    ).all()
+
+
+# Page state for conditional GET: the few columns that change whenever
+# anything a page shows changes, read without loading the rows themselves.
+
+def _latest_section_update():
+    sibling = aliased(Section)
+    return (
+        select(func.max(sibling.updated_at))
+        .where(sibling.chapter_id == Chapter.id)
+        .scalar_subquery()
+    )
+
+
+def _latest_comment(model, parent_column, parent_id_column):
+    return (
+        select(func.max(model.created_at))
+        .where(parent_column == parent_id_column)
+        .scalar_subquery()
+    )
+
+
+def chapter_page_state(chapter_id):
+    """Return the state row behind ``chapter_detail``, or None if the chapter doesn't exist."""
+    return db.session.execute(
+        select(
+            Chapter.updated_at,
+            Chapter.section_count,
+            Chapter.comment_count,
+            _latest_section_update().label('sections_updated_at'),
+            _latest_comment(ChapterComment, ChapterComment.chapter_id, Chapter.id).label('commented_at'),
+        ).where(Chapter.id == chapter_id)
+    ).first()
+
+
+def section_page_state(chapter_id, section_id):
+    """Return the state row behind ``section_detail``, or None if the section isn't in the chapter."""
+    return db.session.execute(
+        select(
+            Chapter.updated_at.label('chapter_updated_at'),
+            Chapter.section_count,
+            _latest_section_update().label('sections_updated_at'),
+            Section.updated_at,
+            Section.comment_count,
+            Section.renderer_version,
+            _latest_comment(SectionComment, SectionComment.section_id, Section.id).label('commented_at'),
+        )
+        .join(Chapter, Chapter.id == Section.chapter_id)
+        .where(Section.id == section_id, Section.chapter_id == chapter_id)
+    ).first()
+
+
+def section_state(section_id):
+    """Return the state row behind ``api_get_section``, or None."""
+    return db.session.execute(
+        select(Section.updated_at, Section.version).where(Section.id == section_id)
+    ).first()
+
+
+def comments_state(model, parent_model, parent_column, parent_id):
+    """Return the state row behind a comment listing, or None if the parent doesn't exist."""
+    return db.session.execute(
+        select(
+            parent_model.comment_count,
+            _latest_comment(model, parent_column, parent_model.id).label('commented_at'),
+        ).where(parent_model.id == parent_id)
+    ).first()
@@ -0,0 +1,108 @@
+"""Section content rendering: Markdown to sanitized HTML.
+
+Content is rendered once, when a section is written, and stored in
+``Section.rendered_html`` together with ``RENDERER_VERSION``; section pages
+only print the stored HTML. Fenced code blocks are highlighted on the server
+with Pygments (styles in ``static/css/highlight.css``). Raw HTML in the
+Markdown passes through the sanitizer, so legacy HTML content keeps working
+but scripts, event handlers and the like are dropped.
+
+Bump ``RENDERER_VERSION`` whenever the output changes (new extension,
+sanitizer rules, ...) and run ``flask --app main render-sections`` to
+re-render stored rows. Until then, rows with an older version are rendered on
+read.
+"""
+import threading
+import markdown
+import nh3
+from sqlalchemy import bindparam, event, inspect, or_, select, update
+from backend.models import Section
+
+RENDERER_VERSION = 2
+
+_EXTENSIONS = ['fenced_code', 'codehilite', 'tables', 'sane_lists']
+_EXTENSION_CONFIGS = {'codehilite': {'guess_lang': False, 'css_class': 'highlight'}}
+
+_ALLOWED_TAGS = nh3.ALLOWED_TAGS | {'span', 'div', 'pre', 'code', 'hr', 'table', 'thead', 'tbody',
+                                    'tr', 'th', 'td'}
+_ALLOWED_ATTRIBUTES = dict(nh3.ALLOWED_ATTRIBUTES)
+for _tag in ('span', 'div', 'pre', 'code'):
+    # Pygments token classes
+    _ALLOWED_ATTRIBUTES[_tag] = set(_ALLOWED_ATTRIBUTES.get(_tag, ())) | {'class'}
+for _tag in ('th', 'td'):
+    # Markdown tables align cells with style="text-align: ..."
+    _ALLOWED_ATTRIBUTES[_tag] = set(_ALLOWED_ATTRIBUTES.get(_tag, ())) | {'align', 'style'}
+# Every other inline CSS property is stripped from the style attributes above
+_ALLOWED_STYLE_PROPERTIES = {'text-align'}
+
+# markdown.Markdown instances are reusable but not thread-safe
+_local = threading.local()
+
+
+def _converter():
+    converter = getattr(_local, 'converter', None)
+    if converter is None:
+        converter = _local.converter = markdown.Markdown(
+            extensions=_EXTENSIONS, extension_configs=_EXTENSION_CONFIGS)
+    return converter.reset()
+
+
+def render(content):
+    """Render Markdown (or legacy HTML) content to sanitized HTML."""
+    if not content:
+        return ''
+    html = _converter().convert(content)
+    return nh3.clean(html, tags=_ALLOWED_TAGS, attributes=_ALLOWED_ATTRIBUTES,
+                     filter_style_properties=_ALLOWED_STYLE_PROPERTIES)
+
+
+def rendered_fields(content):
+    """Column values to store alongside ``content``, for Core inserts."""
+    return {'rendered_html': render(content), 'renderer_version': RENDERER_VERSION}
+
+
+def section_html(section):
+    """HTML for a section, rendering now only if the stored copy is missing or stale."""
+    if section.renderer_version == RENDERER_VERSION and section.rendered_html is not None:
+        return section.rendered_html
+    return render(section.content)
+
+
+@event.listens_for(Section, 'before_insert')
+def _render_new_section(mapper, connection, target):
+    target.rendered_html = render(target.content)
+    target.renderer_version = RENDERER_VERSION
+
+
+@event.listens_for(Section, 'before_update')
+def _render_changed_section(mapper, connection, target):
+    if inspect(target).attrs.content.history.has_changes():
+        target.rendered_html = render(target.content)
+        target.renderer_version = RENDERER_VERSION
+
+
+def rerender(connection, batch_size=500, force=False, echo=None):
+    """Re-render stored sections that are missing or behind ``RENDERER_VERSION``.
+
+    With ``force`` every section is rendered again. Returns the number of rows
+    updated. Rows are read in primary-key order, ``batch_size`` at a time.
+    """
+    echo = echo or (lambda message: None)
+    stale = or_(Section.renderer_version.is_(None), Section.renderer_version != RENDERER_VERSION)
+    table = Section.__table__
+    # Re-rendering isn't an edit, so updated_at is kept rather than bumped by onupdate
+    statement = update(table).where(table.c.id == bindparam('section_id')) \
+        .values(rendered_html=bindparam('html'), renderer_version=RENDERER_VERSION, updated_at=table.c.updated_at)
+    last_id = 0
+    total = 0
+    while True:
+        query = select(Section.id, Section.content).where(Section.id > last_id)
+        if not force:
+            query = query.where(stale)
+        rows = connection.execute(query.order_by(Section.id).limit(batch_size)).all()
+        if not rows:
+            return total
+        connection.execute(statement, [{'section_id': row.id, 'html': render(row.content)} for row in rows])
+        total += len(rows)
+        last_id = rows[-1].id
+        echo(f'rendered {total} sections')
@@ -1,10 +1,29 @@
 
 # ...existing imports...
-from flask import render_template, request, redirect, url_for, session, flash, jsonify, current_app, Blueprint
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, current_app, Blueprint, send_file, make_response, abort
 from backend.app import db
 from backend.models import User, Admin, Chapter, Section, ChapterComment, SectionComment
+from backend.queries import (chapter_listing, admin_sections, admin_section_names, chapter_sections,
+                             section_outline, section_neighbors, comment_page, comments_after, chapter_page_state,
+                             section_page_state, section_state, latest_comment_id, comments_state, parse_fields,
+                             SECTION_FIELDS, CHAPTER_FIELDS, section_fields, chapter_section_fields,
+                             admin_chapter_fields)
+from backend.conditional import make_etag, last_modified, not_modified, viewer, with_validators
+from backend.pagecache import invalidate, page_cache, viewer_role
+from backend.search import search_chapters
+from backend.database import pool_stats
+from backend.importer import import_chapters, iter_json, iter_ndjson
+from backend.ordering import reorder
+from backend.profiling import FORMATS, list_profiles, profile_path
+from backend.rendering import section_html
+from backend.comment_queue import QueueFull, comment_queue
+from backend.comment_stream import TooManyStreams, broker, event_stream, notify
+from backend.batch import MODES as BATCH_MODES, run_batch
+from backend.textpatch import apply_edits
 from werkzeug.security import generate_password_hash
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm import joinedload, undefer
 from datetime import datetime
 
 routes_bp = Blueprint('routes_bp', __name__)
@@ -14,12 +33,22 @@ routes_bp = Blueprint('routes_bp', __name__)
 # --- API: Get Section by ID (for edit form) ---
 @routes_bp.route('/api/section/<int:section_id>', methods=['GET'])
 def api_get_section(section_id):
-    section = Section.query.get_or_404(section_id)
-    return jsonify({'id': section.id, 'name': section.name, 'content': section.content})
-
-@routes_bp.route('/')
-def home():
-    return redirect(url_for('routes_bp.dashboard'))
+    try:
+        fields = parse_fields(request.args.get('fields'), SECTION_FIELDS, ('id', 'name', 'content'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    state = section_state(section_id)
+    if state is None:
+        abort(404)
+    etag = make_etag('api_get_section', section_id, fields, tuple(state))
+    cached = not_modified(etag, state.updated_at, private=False)
+    if cached is not None:
+        return cached
+    section = section_fields(section_id, fields)
+    if section is None:
+        abort(404)
+    response = jsonify(section)
+    return with_validators(response, etag, state.updated_at, private=False)
 
 # Optional: /admin/ route redirects to admin dashboard
 @routes_bp.route('/admin/')
@@ -49,7 +78,7 @@ def edit_section_form():
     if 'admin_id' not in session:
         flash('Admin access required', 'error')
         return redirect(url_for('routes_bp.admin_auth'))
-    sections = Section.query.join(Chapter).filter(Chapter.admin_id==session['admin_id']).all()
+    sections = admin_section_names(session['admin_id'])
     return render_template('edit_section.html', sections=sections)
 
 @routes_bp.route('/admin/section/delete', methods=['GET'])
@@ -57,7 +86,7 @@ def delete_section_form():
     if 'admin_id' not in session:
         flash('Admin access required', 'error')
         return redirect(url_for('routes_bp.admin_auth'))
-    sections = Section.query.join(Chapter).filter(Chapter.admin_id==session['admin_id']).all()
+    sections = admin_section_names(session['admin_id'])
     return render_template('delete_section.html', sections=sections)
 @routes_bp.route('/admin/chapter/create', methods=['GET'])
 def create_chapter_form():
@@ -122,6 +151,49 @@ def api_delete_chapter(chapter_id):
     db.session.commit()
     return jsonify({'success': True})
 
+@routes_bp.route('/api/chapters/<int:chapter_id>/sections/order', methods=['PUT'])
+def api_reorder_sections(chapter_id):
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin login required'}), 401
+    chapter = Chapter.query.get_or_404(chapter_id)
+    if chapter.admin_id != session['admin_id']:
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    data = request.get_json(silent=True) or {}
+    section_ids = data.get('section_ids')
+    if not isinstance(section_ids, list) or not all(isinstance(section_id, int) for section_id in section_ids):
+        return jsonify({'success': False, 'message': 'section_ids must be a list of section ids'}), 400
+    try:
+        reorder(db.session.connection(), chapter_id, section_ids)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    db.session.commit()
+    # Core updates bypass the session's cache invalidation
+    invalidate(f'chapter:{chapter_id}')
+    return jsonify({'success': True})
+
+# --- API: Bulk import ---
+@routes_bp.route('/api/admin/import', methods=['POST'])
+def api_bulk_import():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin login required'}), 401
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        # Parsed line by line straight from the request body
+        records = iter_ndjson(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if data is None:
+            return jsonify({'success': False, 'message': 'Expected a JSON or NDJSON body'}), 400
+        try:
+            records = list(iter_json(data))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    try:
+        result = import_chapters(session['admin_id'], records)
+    except SQLAlchemyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    return jsonify(dict(result.as_dict(), success=True))
+
 # --- API: Sections CRUD ---
 @routes_bp.route('/api/sections', methods=['POST'])
 def api_create_section():
@@ -161,8 +233,60 @@ def api_edit_section(section_id):
     section.name = name
     section.content = content
     section.updated_at = datetime.utcnow()
-    db.session.commit()
-    return jsonify({'success': True})
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return _lost_section_race(section_id)
+    return jsonify({'success': True, 'version': section.version})
+
+def _lost_section_race(section_id):
+    """Answer a save that hit StaleDataError: the row was either edited or deleted meanwhile."""
+    state = section_state(section_id)
+    if state is None:
+        return jsonify({'success': False, 'message': 'The section was deleted'}), 404
+    return _section_conflict(state.version)
+
+def _section_conflict(version):
+    """409 for an edit based on an outdated version of the section."""
+    return jsonify({'success': False, 'message': 'The section was changed by someone else; reload it',
+                    'version': version}), 409
+
+@routes_bp.route('/api/sections/<int:section_id>', methods=['PATCH'])
+def api_patch_section(section_id):
+    # Only the changed text is sent: edits against base_version (backend/textpatch.py)
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin login required'}), 401
+    section = Section.query.get_or_404(section_id)
+    chapter = Chapter.query.get(section.chapter_id)
+    if not chapter or chapter.admin_id != session['admin_id']:
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    data = request.get_json(silent=True) or {}
+    base_version = data.get('base_version')
+    if not isinstance(base_version, int) or isinstance(base_version, bool):
+        return jsonify({'success': False, 'message': 'base_version required'}), 400
+    if base_version != section.version:
+        return _section_conflict(section.version)
+    name = data.get('name', section.name)
+    if not name or not isinstance(name, str):
+        return jsonify({'success': False, 'message': 'Section name required'}), 400
+    edits = data.get('edits', [])
+    if edits:
+        try:
+            section.content = apply_edits(section.content, edits, data.get('length'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    if name != section.name:
+        section.name = name
+    if db.session.is_modified(section):
+        section.updated_at = datetime.utcnow()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # Another edit committed between our read and write
+            db.session.rollback()
+            return _lost_section_race(section_id)
+    return jsonify({'success': True, 'version': section.version})
 
 @routes_bp.route('/api/sections/<int:section_id>', methods=['DELETE'])
 def api_delete_section(section_id):
@@ -176,24 +300,58 @@ def api_delete_section(section_id):
     db.session.commit()
     return jsonify({'success': True})
 
+# --- API: Batched chapter/section writes ---
+@routes_bp.route('/api/batch', methods=['POST'])
+def api_batch():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin login required'}), 401
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    mode = data.get('mode', 'atomic')
+    if mode not in BATCH_MODES:
+        return jsonify({'success': False, 'message': f"mode must be one of {', '.join(BATCH_MODES)}"}), 400
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'success': False, 'message': 'operations must be a non-empty list'}), 400
+    limit = current_app.config['BATCH_MAX_OPERATIONS']
+    if len(operations) > limit:
+        return jsonify({'success': False, 'message': f'At most {limit} operations per batch'}), 413
+    results, committed = run_batch(session['admin_id'], operations, mode)
+    response = {'success': all(result['success'] for result in results), 'mode': mode, 'results': results}
+    if not committed:
+        # The whole batch was rolled back; answer with the failed operation's status
+        failed = next(result for result in results if not result['success'])
+        return jsonify(response), failed['status']
+    return jsonify(response)
+
 
 @routes_bp.route('/')
 def index():
     # Allow non-authenticated users to view chapters but with limited functionality
     search = request.args.get('search', '').strip()
     sort_by = request.args.get('sort', 'name')
-    
-    query = Chapter.query
-    
-    if search:
-        query = query.filter(Chapter.name.ilike(f'%{search}%'))
-    
-    if sort_by == 'date':
-        chapters = query.order_by(Chapter.created_at.desc()).all()
-    else:
-        chapters = query.order_by(Chapter.name).all()
-    
-    return render_template('index.html', chapters=chapters, search=search, sort_by=sort_by)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = current_app.config['SEARCH_PAGE_SIZE']
+    
+    def render_grid():
+        snippets = {}
+        if search:
+            # Full-text matches over chapter names and section names/content, best first
+            hits, total = search_chapters(search, page=page, per_page=per_page)
+            rows = {row.id: row for row in chapter_listing(chapter_ids=[hit['chapter_id'] for hit in hits])}
+            chapters = [rows[hit['chapter_id']] for hit in hits if hit['chapter_id'] in rows]
+            snippets = {hit['chapter_id']: hit['snippet'] for hit in hits}
+        else:
+            chapters = chapter_listing(sort_by=sort_by)
+            total = len(chapters)
+        html = render_template('partials/chapter_grid.html', chapters=chapters, search=search,
+                               snippets=snippets, page=page,
+                               pages=max((total + per_page - 1) // per_page, 1))
+        return {'html': html, 'total': total}
+    
+    tags = ['catalog', 'search'] if search else ['catalog']
+    grid = page_cache().fragment(('index', search, sort_by, page, viewer_role()), tags, render_grid)
+    return render_template('index.html', grid_html=grid['html'], search=search, sort_by=sort_by,
+                           total=grid['total'])
 
 @routes_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -300,7 +458,7 @@ def dashboard():
         return redirect(url_for('routes_bp.login'))
     
     user = User.query.get(session['user_id'])
-    chapters = Chapter.query.all()
+    chapters = chapter_listing()
     return render_template('dashboard.html', user=user, chapters=chapters)
 
 @routes_bp.route('/admin/dashboard')
@@ -310,15 +468,13 @@ def admin_dashboard():
         return redirect(url_for('routes_bp.admin_auth'))
     
     admin = Admin.query.get(session['admin_id'])
-    chapters = Chapter.query.filter_by(admin_id=session['admin_id']).all()
+    chapters = chapter_listing(admin_id=session['admin_id'])
     
     # Get all sections for this admin's chapters
-    sections = []
-    for chapter in chapters:
-        sections.extend(chapter.sections)
+    sections = admin_sections(session['admin_id'])
     
     total_sections = len(sections)
-    total_comments = sum(len(chapter.comments) for chapter in chapters)
+    total_comments = sum(chapter.comment_count for chapter in chapters)
     
     return render_template('admin_dashboard.html', 
                          admin=admin, 
@@ -333,11 +489,21 @@ def chapter_detail(chapter_id):
         flash('Please log in to view chapter details', 'warning')
         return redirect(url_for('routes_bp.login'))
     
+    # Answer revalidations from a one-row state query before loading the page
+    state = chapter_page_state(chapter_id)
+    if state is None:
+        abort(404)
+    etag = make_etag('chapter_detail', chapter_id, tuple(state), viewer())
+    modified = last_modified(*state)
+    cached = not_modified(etag, modified)
+    if cached is not None:
+        return cached
+    
     chapter = Chapter.query.get_or_404(chapter_id)
-    sections = Section.query.filter_by(chapter_id=chapter_id).all()
-    comments = ChapterComment.query.filter_by(chapter_id=chapter_id).order_by(ChapterComment.created_at.desc()).all()
+    sections = chapter_sections(chapter_id)
     
-    return render_template('chapter_detail.html', chapter=chapter, sections=sections, comments=comments)
+    response = make_response(render_template('chapter_detail.html', chapter=chapter, sections=sections))
+    return with_validators(response, etag, modified)
 
 @routes_bp.route('/admin/chapter/create', methods=['GET', 'POST'])
 def create_chapter():
@@ -427,32 +593,49 @@ def section_detail(chapter_id, section_id):
         flash('Please log in to view section details', 'warning')
         return redirect(url_for('routes_bp.login'))
     
-    chapter = Chapter.query.get_or_404(chapter_id)
-    section = Section.query.get_or_404(section_id)
-    
-    # Verify section belongs to chapter
-    if section.chapter_id != chapter_id:
+    # Answer revalidations from a one-row state query before loading the page
+    state = section_page_state(chapter_id, section_id)
+    if state is None:
+        Chapter.query.get_or_404(chapter_id)
+        Section.query.get_or_404(section_id)
+        # Verify section belongs to chapter
         flash('Section not found in this chapter', 'error')
         return redirect(url_for('routes_bp.chapter_detail', chapter_id=chapter_id))
-    
-    # Get all sections for navigation
-    all_sections = Section.query.filter_by(chapter_id=chapter_id).order_by(Section.id).all()
-    
-    # Find previous and next sections
-    current_index = next((i for i, s in enumerate(all_sections) if s.id == section_id), None)
-    prev_section = all_sections[current_index - 1] if current_index and current_index > 0 else None
-    next_section = all_sections[current_index + 1] if current_index is not None and current_index < len(all_sections) - 1 else None
-    
-    # Get comments for this section
-    comments = SectionComment.query.filter_by(section_id=section_id).order_by(SectionComment.created_at.desc()).all()
-    
-    return render_template('section_detail.html', 
-                         chapter=chapter, 
-                         section=section, 
-                         all_sections=all_sections,
-                         prev_section=prev_section,
-                         next_section=next_section,
-                         comments=comments)
+    etag = make_etag('section_detail', section_id, tuple(state), viewer())
+    modified = last_modified(*state)
+    cached = not_modified(etag, modified)
+    if cached is not None:
+        return cached
+    
+    def render_body():
+        chapter = Chapter.query.get_or_404(chapter_id)
+        section = Section.query.options(undefer(Section.rendered_html)).get_or_404(section_id)
+        
+        # Section names for the sidebar, and the neighbours by position
+        all_sections = section_outline(chapter_id)
+        prev_section, next_section = section_neighbors(section)
+        
+        # Get comments for this section
+        comments = (SectionComment.query.filter_by(section_id=section_id)
+                    .options(joinedload(SectionComment.user))
+                    .order_by(SectionComment.created_at.desc()).all())
+        
+        return {
+            'title': f'{section.name} - {chapter.name}',
+            'html': render_template('partials/section_body.html',
+                                    chapter=chapter,
+                                    section=section,
+                                    section_html=section_html(section),
+                                    all_sections=all_sections,
+                                    prev_section=prev_section,
+                                    next_section=next_section,
+                                    comments=comments),
+        }
+    
+    body = page_cache().fragment(('section_detail', section_id, viewer_role()),
+                                 [f'chapter:{chapter_id}', f'section:{section_id}'], render_body)
+    response = make_response(render_template('section_detail.html', title=body['title'], body_html=body['html']))
+    return with_validators(response, etag, modified)
 
 @routes_bp.route('/logout')
 def logout():
@@ -471,9 +654,12 @@ def add_chapter_comment():
     chapter_id = data.get('chapter_id')
     if not content or not chapter_id:
         return jsonify({'success': False, 'message': 'Comment content and chapter_id required'}), 400
+    if comment_queue() is not None:
+        return _queue_comment('chapter', Chapter, chapter_id, content)
     comment = ChapterComment(content=content, user_id=session['user_id'], chapter_id=chapter_id)
     db.session.add(comment)
     db.session.commit()
+    notify()
     return jsonify({'success': True, 'message': 'Comment added successfully'})
 
 @routes_bp.route('/api/section_comments', methods=['POST'])
@@ -485,47 +671,155 @@ def add_section_comment():
     section_id = data.get('section_id')
     if not content or not section_id:
         return jsonify({'success': False, 'message': 'Comment content and section_id required'}), 400
+    if comment_queue() is not None:
+        return _queue_comment('section', Section, section_id, content)
     comment = SectionComment(content=content, user_id=session['user_id'], section_id=section_id)
     db.session.add(comment)
     db.session.commit()
+    notify()
     return jsonify({'success': True, 'message': 'Comment added successfully'})
 
 
+def _queue_comment(kind, parent_model, parent_id, content):
+    """Validate a comment and hand it to the write-behind queue (COMMENT_WRITE_MODE=queued)."""
+    try:
+        parent_id = int(parent_id)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': f'Invalid {kind}_id'}), 400
+    if not isinstance(content, str):
+        return jsonify({'success': False, 'message': 'Comment content must be a string'}), 400
+    if db.session.get(parent_model, parent_id) is None:
+        return jsonify({'success': False, 'message': f'{kind.capitalize()} not found'}), 404
+    try:
+        comment_queue().enqueue(kind, parent_id, session['user_id'], content)
+    except QueueFull:
+        response = jsonify({'success': False, 'message': 'Too many comments right now, please try again'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    return jsonify({'success': True, 'message': 'Comment added successfully'}), 202
+
+
+def _comment_page_response(model, parent_model, parent_column, parent_id):
+    state = comments_state(model, parent_model, parent_column, parent_id)
+    if state is not None:
+        etag = make_etag(model.__table__.name, parent_id, tuple(state))
+        cached = not_modified(etag, state.commented_at, private=False)
+        if cached is not None:
+            return cached
+    default_limit = current_app.config['COMMENTS_PAGE_SIZE']
+    max_limit = current_app.config['COMMENTS_MAX_PAGE_SIZE']
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    try:
+        comments, next_cursor = comment_page(model, parent_column, parent_id,
+                                             cursor=request.args.get('cursor'), limit=limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    response = jsonify({'comments': comments, 'next_cursor': next_cursor})
+    if state is not None:
+        with_validators(response, etag, state.commented_at, private=False)
+    return response
+
+
 @routes_bp.route('/api/chapter_comments/<int:chapter_id>')
 def get_chapter_comments(chapter_id):
-    comments = ChapterComment.query.filter_by(chapter_id=chapter_id).order_by(ChapterComment.created_at.desc()).all()
-    comments_data = [{
-        'id': comment.id,
-        'content': comment.content,
-        'user_name': comment.user.full_name,
-        'created_at': comment.created_at.strftime('%B %d, %Y at %I:%M %p')
-    } for comment in comments]
-    return jsonify(comments_data)
+    return _comment_page_response(ChapterComment, Chapter, ChapterComment.chapter_id, chapter_id)
 
 
 @routes_bp.route('/api/section_comments/<int:section_id>')
 def get_section_comments(section_id):
-    comments = SectionComment.query.filter_by(section_id=section_id).order_by(SectionComment.created_at.desc()).all()
-    comments_data = [{
-        'id': comment.id,
-        'content': comment.content,
-        'user_name': comment.user.full_name,
-        'created_at': comment.created_at.strftime('%B %d, %Y at %I:%M %p')
-    } for comment in comments]
-    return jsonify(comments_data)
+    return _comment_page_response(SectionComment, Section, SectionComment.section_id, section_id)
+
+def _comment_stream_response(kind, model, parent_model, parent_column, parent_id):
+    if not current_app.config['COMMENT_STREAM_ENABLED'] or db.session.get(parent_model, parent_id) is None:
+        abort(404)
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid Last-Event-ID'}), 400
+    config = current_app.config
+    since = latest_comment_id(model)
+    try:
+        subscription = broker().subscribe(kind, parent_id, since)
+    except TooManyStreams:
+        response = jsonify({'success': False, 'message': 'Too many open comment streams'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    # Read the backlog only now: a comment committed before the subscription
+    # existed may already be behind a running broker. It is then in the
+    # backlog, and overlap with live comments is sent once.
+    backlog = comments_after(model, parent_column, parent_id, since if last_id is None else last_id,
+                             limit=config['COMMENT_STREAM_BACKLOG'])
+    body = event_stream(subscription, backlog, config['COMMENT_STREAM_HEARTBEAT_S'],
+                        config['COMMENT_STREAM_MAX_SECONDS'])
+    response = current_app.response_class(body, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@routes_bp.route('/api/chapter_comments/<int:chapter_id>/stream')
+def stream_chapter_comments(chapter_id):
+    return _comment_stream_response('chapter', ChapterComment, Chapter, ChapterComment.chapter_id, chapter_id)
+
+
+@routes_bp.route('/api/section_comments/<int:section_id>/stream')
+def stream_section_comments(section_id):
+    return _comment_stream_response('section', SectionComment, Section, SectionComment.section_id, section_id)
+
+@routes_bp.route('/api/search')
+def api_search():
+    term = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = max(1, min(request.args.get('per_page', current_app.config['SEARCH_PAGE_SIZE'], type=int), 100))
+    hits, total = search_chapters(term, page=page, per_page=per_page) if term else ([], 0)
+    names = {row.id: row.name for row in chapter_listing(chapter_ids=[hit['chapter_id'] for hit in hits])}
+    results = [{
+        'chapter_id': hit['chapter_id'],
+        'name': names.get(hit['chapter_id']),
+        'snippet': hit['snippet']
+    } for hit in hits]
+    return jsonify({'results': results, 'total': total, 'page': page, 'per_page': per_page})
+
+@routes_bp.route('/api/admin/pool')
+def get_pool_stats():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin login required'}), 401
+    return jsonify({
+        'primary': pool_stats(db.engine),
+        'replicas': [pool_stats(engine) for engine in current_app.extensions.get('db_replicas', [])]
+    })
+
+@routes_bp.route('/api/admin/profiles')
+def get_profiles():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin login required'}), 401
+    return jsonify({'profiles': list_profiles(current_app)})
+
+@routes_bp.route('/api/admin/profiles/<profile_id>.<fmt>')
+def download_profile(profile_id, fmt):
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin login required'}), 401
+    path = profile_path(current_app, profile_id, fmt)
+    if path is None:
+        return jsonify({'success': False, 'message': 'Profile not found'}), 404
+    return send_file(path, mimetype=FORMATS[fmt], as_attachment=True)
 
 @routes_bp.route('/api/admin/chapters')
 def get_admin_chapters():
     if 'admin_id' not in session:
         return jsonify([]), 401
     
-    chapters = Chapter.query.filter_by(admin_id=session['admin_id']).all()
-    chapters_data = [{
-        'id': chapter.id,
-        'name': chapter.name
-    } for chapter in chapters]
+    try:
+        fields = parse_fields(request.args.get('fields'), CHAPTER_FIELDS, ('id', 'name'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    return jsonify(chapters_data)
+    return jsonify(admin_chapter_fields(session['admin_id'], fields))
 
 @routes_bp.route('/api/admin/sections/<int:chapter_id>')
 def get_admin_sections(chapter_id):
@@ -536,11 +830,9 @@ def get_admin_sections(chapter_id):
     if chapter.admin_id != session['admin_id']:
         return jsonify([]), 403
     
-    sections = Section.query.filter_by(chapter_id=chapter_id).all()
-    sections_data = [{
-        'id': section.id,
-        'name': section.name,
-        'content': section.content
-    } for section in sections]
+    try:
+        fields = parse_fields(request.args.get('fields'), SECTION_FIELDS, ('id', 'name', 'content'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    return jsonify(sections_data)
\ No newline at end of file
+    return jsonify(chapter_section_fields(chapter_id, fields))
\ No newline at end of file
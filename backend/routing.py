@@ -0,0 +1,103 @@
+"""Read-replica routing for the Flask-SQLAlchemy session.
+
+When ``DATABASE_REPLICA_URLS`` (comma-separated) is set, queries issued while
+handling ``GET``/``HEAD`` requests go to a randomly chosen replica engine.
+Everything else uses the primary:
+
+* non-GET requests (all writes),
+* any request once the session has flushed, so reads that follow a write in
+  the same request see it,
+* requests for ``REPLICA_STICKY_SECONDS`` after the same client wrote, so a
+  redirect after a POST doesn't read stale data while replicas catch up,
+* code outside a request (CLI commands, migrations),
+* anything explicitly wrapped with ``use_primary()``.
+"""
+import os
+import random
+import time
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from .database import configure_engine, engine_options
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+_STICKY_KEY = '_db_primary_until'
+
+
+def replica_engines():
+    if not has_request_context():
+        return []
+    return current_app.extensions.get('db_replicas', [])
+
+
+def use_primary():
+    """Pin the rest of the current request to the primary database."""
+    if has_request_context():
+        g.db_pinned = True
+
+
+def reading_replica():
+    """Whether the current request's next reads go to a replica."""
+    return bool(replica_engines()) and g.get('db_read_only', False) and not g.get('db_pinned', False)
+
+
+def _reads_from_replica(db_session):
+    return (
+        has_request_context()
+        and g.get('db_read_only', False)
+        and not g.get('db_pinned', False)
+        and not db_session._flushing
+    )
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _reads_from_replica(self):
+            replicas = replica_engines()
+            if replicas:
+                if 'db_replica' not in g:
+                    # One replica per request keeps its reads consistent
+                    g.db_replica = random.choice(replicas)
+                return g.db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_after_write(db_session, flush_context):
+    use_primary()
+    if has_request_context():
+        g.db_wrote = True
+
+
+def _route_request():
+    sticky_until = session.get(_STICKY_KEY, 0)
+    g.db_read_only = request.method in READ_METHODS and sticky_until < time.time()
+
+
+def _remember_write(response):
+    sticky = current_app.config['REPLICA_STICKY_SECONDS']
+    # Only writes make the client sticky; a request pinned just to read fresh data doesn't
+    if g.get('db_wrote') and sticky > 0 and current_app.extensions.get('db_replicas'):
+        session[_STICKY_KEY] = time.time() + sticky
+    return response
+
+
+def init_replicas(app):
+    """Create replica engines from DATABASE_REPLICA_URLS and install the request hooks."""
+    urls = [url.strip() for url in app.config['DATABASE_REPLICA_URLS'].split(',') if url.strip()]
+    engines = []
+    for url in urls:
+        url = make_url(url)
+        if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+                and not os.path.isabs(url.database):
+            # Resolve relative SQLite paths like Flask-SQLAlchemy does for the primary
+            url = url.set(database=os.path.join(app.instance_path, url.database))
+        engine = create_engine(url, **engine_options(url))
+        configure_engine(engine)
+        engines.append(engine)
+    app.extensions['db_replicas'] = engines
+    if engines:
+        app.before_request(_route_request)
+        app.after_request(_remember_write)
+    return engines
@@ -7,11 +7,12 @@ Run this to populate the database with educational content.
 import sys
 import os
 
-# Add the current directory to Python path to allow imports
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Add the project root to Python path to allow imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.app import app, db
-from models import User, Admin, Chapter, Section, Comment
+from backend.models import User, Admin, Chapter, Section, ChapterComment
+from backend.migrations import reset
 import datetime
 
 def create_sample_data():
@@ -19,8 +20,7 @@ def create_sample_data():
         print("Creating sample data...")
         
         # Clear existing data (be careful in production!)
-        db.drop_all()
-        db.create_all()
+        reset(db.engine)
         
         # Create sample admin
         admin1 = Admin(
@@ -584,11 +584,10 @@ DELETE FROM students WHERE id = 3;
         for i, user in enumerate(user_objects):
             for j, chapter in enumerate(chapters):
                 if (i + j) % 3 == 0:  # Add comments to some chapters
-                    comment = Comment(
+                    comment = ChapterComment(
                         content=comments_data[j % len(comments_data)],
                         user_id=user.id,
-                        chapter_id=chapter.id,
-                        section_id=None
+                        chapter_id=chapter.id
                     )
                     db.session.add(comment)
         
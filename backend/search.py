@@ -0,0 +1,249 @@
+"""Full-text search over chapter names, section names and section content.
+
+Every chapter and section has one document in the search index: SQLite uses
+an FTS5 virtual table, Postgres a table with a weighted ``tsvector`` column
+and a GIN index. The backend follows the connection's dialect, so it is
+chosen by ``DATABASE_URL``. Documents are written from mapper events inside
+the same flush as the chapter/section change, like the counters in
+``backend/counters.py``.
+"""
+import html
+import re
+from sqlalchemy import event, inspect, select, text
+from backend.app import db
+from backend.models import Chapter, Section
+
+# Private-use characters mark highlighted terms until the snippet is escaped
+_MARK_START = '\ue000'
+_MARK_END = '\ue001'
+_TAG_RE = re.compile(r'<[^>]+>')
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def plain_text(content):
+    """Strip markup from stored section content before indexing it."""
+    if not content:
+        return ''
+    return html.unescape(_TAG_RE.sub(' ', content))
+
+
+def render_snippet(snippet):
+    """Escape a raw snippet and turn the highlight markers into ``<mark>`` tags."""
+    escaped = html.escape(snippet or '')
+    return escaped.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+class SqliteSearch:
+    # FTS5 can only look rows up efficiently by rowid, so each document's
+    # rowid is derived from its kind and primary key.
+    @staticmethod
+    def _rowid(kind, ref_id):
+        return ref_id * 2 + (1 if kind == 'chapter' else 0)
+
+    def create(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "title, body, chapter_id UNINDEXED, "
+            "tokenize='porter unicode61')"
+        ))
+
+    def upsert_many(self, connection, documents):
+        params = [dict(doc, rowid=self._rowid(doc['kind'], doc['ref_id'])) for doc in documents]
+        if not params:
+            return
+        connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), params)
+        connection.execute(text(
+            'INSERT INTO search_index (rowid, title, body, chapter_id) '
+            'VALUES (:rowid, :title, :body, :chapter_id)'
+        ), params)
+
+    def delete(self, connection, kind, ref_id):
+        connection.execute(text(
+            'DELETE FROM search_index WHERE rowid = :rowid'
+        ), {'rowid': self._rowid(kind, ref_id)})
+
+    def clear(self, connection):
+        connection.execute(text('DELETE FROM search_index'))
+
+    def drop(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+    def _match(self, term):
+        # Quote every word so user input can never be parsed as FTS5 syntax;
+        # the trailing * makes the last word a prefix match while typing.
+        words = _TERM_RE.findall(term)
+        if not words:
+            return None
+        return ' '.join(f'"{w}"' for w in words[:-1]) + f' "{words[-1]}"*'
+
+    def search_chapters(self, connection, term, limit, offset):
+        match = self._match(term)
+        if match is None:
+            return [], 0
+        rows = connection.execute(text(
+            'WITH matches AS ('
+            '  SELECT CAST(chapter_id AS INTEGER) AS chapter_id,'
+            '         bm25(search_index, 10.0, 1.0) AS score,'
+            '         snippet(search_index, -1, :start, :stop, \'…\', 24) AS snippet'
+            '  FROM search_index WHERE search_index MATCH :match'
+            '), best AS ('
+            '  SELECT chapter_id, score, snippet,'
+            '         ROW_NUMBER() OVER (PARTITION BY chapter_id ORDER BY score) AS rn'
+            '  FROM matches'
+            ') '
+            'SELECT chapter_id, score, snippet, COUNT(*) OVER () AS total '
+            'FROM best WHERE rn = 1 ORDER BY score LIMIT :limit OFFSET :offset'
+        ), {'match': match, 'start': _MARK_START, 'stop': _MARK_END,
+            'limit': limit, 'offset': offset}).all()
+        return rows, (rows[0].total if rows else 0)
+
+
+class PostgresSearch:
+    def create(self, connection):
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS search_document ('
+            '  kind VARCHAR(16) NOT NULL,'
+            '  ref_id INTEGER NOT NULL,'
+            '  chapter_id INTEGER NOT NULL,'
+            '  title TEXT NOT NULL,'
+            '  body TEXT NOT NULL,'
+            "  tsv TSVECTOR GENERATED ALWAYS AS ("
+            "    setweight(to_tsvector('english', title), 'A') ||"
+            "    setweight(to_tsvector('english', body), 'B')) STORED,"
+            '  PRIMARY KEY (kind, ref_id))'
+        ))
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_search_document_tsv ON search_document USING GIN (tsv)'
+        ))
+
+    def upsert_many(self, connection, documents):
+        if not documents:
+            return
+        connection.execute(text(
+            'INSERT INTO search_document (kind, ref_id, chapter_id, title, body) '
+            'VALUES (:kind, :ref_id, :chapter_id, :title, :body) '
+            'ON CONFLICT (kind, ref_id) DO UPDATE SET '
+            'chapter_id = EXCLUDED.chapter_id, title = EXCLUDED.title, body = EXCLUDED.body'
+        ), list(documents))
+
+    def delete(self, connection, kind, ref_id):
+        connection.execute(text(
+            'DELETE FROM search_document WHERE kind = :kind AND ref_id = :ref_id'
+        ), {'kind': kind, 'ref_id': ref_id})
+
+    def clear(self, connection):
+        connection.execute(text('TRUNCATE search_document'))
+
+    def drop(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS search_document'))
+
+    def search_chapters(self, connection, term, limit, offset):
+        if not _TERM_RE.search(term):
+            return [], 0
+        # ts_headline is only computed for the rows on the requested page
+        rows = connection.execute(text(
+            "WITH q AS (SELECT websearch_to_tsquery('english', :term) AS query), "
+            'best AS ('
+            '  SELECT DISTINCT ON (d.chapter_id) d.chapter_id, d.title, d.body,'
+            '         ts_rank_cd(d.tsv, q.query) AS score'
+            '  FROM search_document d, q WHERE d.tsv @@ q.query'
+            '  ORDER BY d.chapter_id, score DESC'
+            '), page AS ('
+            '  SELECT chapter_id, title, body, score, COUNT(*) OVER () AS total'
+            '  FROM best ORDER BY score DESC LIMIT :limit OFFSET :offset'
+            ') '
+            "SELECT chapter_id, score, total, ts_headline('english', "
+            "         CASE WHEN body = '' THEN title ELSE body END, q.query,"
+            "         'MaxFragments=1, MaxWords=24, MinWords=8, StartSel=' || :start || ', StopSel=' || :stop"
+            '       ) AS snippet '
+            'FROM page, q ORDER BY score DESC'
+        ), {'term': term, 'start': _MARK_START, 'stop': _MARK_END,
+            'limit': limit, 'offset': offset}).all()
+        return rows, (rows[0].total if rows else 0)
+
+
+_BACKENDS = {
+    'sqlite': SqliteSearch(),
+    'postgresql': PostgresSearch(),
+}
+
+
+def get_backend(dialect_name):
+    try:
+        return _BACKENDS[dialect_name]
+    except KeyError:
+        raise RuntimeError(f'Full-text search is not supported on {dialect_name}') from None
+
+
+def search_chapters(term, page=1, per_page=20):
+    """Return ``(hits, total)`` for chapters matching ``term``, best match first.
+
+    Each hit has ``chapter_id``, ``score`` and an HTML-safe ``snippet`` from
+    the best matching document (the chapter itself or one of its sections).
+    """
+    connection = db.session.connection()
+    backend = get_backend(connection.dialect.name)
+    rows, total = backend.search_chapters(connection, term, per_page, (page - 1) * per_page)
+    hits = [{'chapter_id': row.chapter_id, 'score': row.score, 'snippet': render_snippet(row.snippet)}
+            for row in rows]
+    return hits, total
+
+
+def chapter_document(chapter_id, name):
+    return {'kind': 'chapter', 'ref_id': chapter_id, 'chapter_id': chapter_id, 'title': name, 'body': ''}
+
+
+def section_document(section_id, chapter_id, name, content):
+    return {'kind': 'section', 'ref_id': section_id, 'chapter_id': chapter_id,
+            'title': name, 'body': plain_text(content)}
+
+
+def index_documents(connection, documents):
+    """Write a batch of documents built by ``chapter_document``/``section_document``."""
+    get_backend(connection.dialect.name).upsert_many(connection, documents)
+
+
+def rebuild(connection, batch_size=500):
+    """Repopulate the whole index from the chapter and section tables."""
+    backend = get_backend(connection.dialect.name)
+    backend.create(connection)
+    backend.clear(connection)
+    chapters = connection.execute(select(Chapter.id, Chapter.name)).all()
+    for start in range(0, len(chapters), batch_size):
+        backend.upsert_many(connection, [chapter_document(row.id, row.name)
+                                         for row in chapters[start:start + batch_size]])
+    result = connection.execution_options(yield_per=batch_size).execute(
+        select(Section.id, Section.chapter_id, Section.name, Section.content)
+    )
+    for rows in result.partitions():
+        backend.upsert_many(connection, [section_document(row.id, row.chapter_id, row.name, row.content)
+                                         for row in rows])
+
+
+@event.listens_for(Chapter, 'after_insert')
+@event.listens_for(Chapter, 'after_update')
+def _index_chapter(mapper, connection, target):
+    index_documents(connection, [chapter_document(target.id, target.name)])
+
+
+@event.listens_for(Chapter, 'after_delete')
+def _unindex_chapter(mapper, connection, target):
+    get_backend(connection.dialect.name).delete(connection, 'chapter', target.id)
+
+
+@event.listens_for(Section, 'after_insert')
+def _index_section(mapper, connection, target):
+    index_documents(connection, [section_document(target.id, target.chapter_id, target.name, target.content)])
+
+
+@event.listens_for(Section, 'after_update')
+def _reindex_section(mapper, connection, target):
+    # Content is deferred; don't load it for updates that leave the document alone
+    attrs = inspect(target).attrs
+    if any(attrs[key].history.has_changes() for key in ('name', 'content', 'chapter_id')):
+        _index_section(mapper, connection, target)
+
+
+@event.listens_for(Section, 'after_delete')
+def _unindex_section(mapper, connection, target):
+    get_backend(connection.dialect.name).delete(connection, 'section', target.id)
@@ -0,0 +1,213 @@
+"""Deterministic synthetic data for load and performance testing.
+
+``generate()`` writes admins, users, chapters, sections and chapter/section
+comments at whatever scale is asked for, using Core ``executemany`` inserts
+in batches. The same seed and parameters always produce the same rows.
+Primary keys are assigned up front, after the current maximum ids, so no
+row has to be read back, and the denormalized counters are written with
+their final values.
+
+All synthetic accounts use the password ``SYNTHETIC_PASSWORD`` (hashed once).
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, text
+from werkzeug.security import generate_password_hash
+from backend.app import db
+from backend.models import User, Admin, Chapter, Section, ChapterComment, SectionComment
+
+SYNTHETIC_PASSWORD = 'student123'
+BASE_TIME = datetime(2024, 1, 1)
+
+_WORDS = (
+    'python function variable loop class object module import return value list dict '
+    'string integer query index table join select insert update delete schema database '
+    'request response server client route template render cache session token browser '
+    'style layout element event handler callback promise async await thread process '
+    'memory buffer stream parse compile test debug deploy build package version release'
+).split()
+
+_CODE_SNIPPETS = (
+    'def greet(name):\n    return f"Hello, {name}!"\n\nprint(greet("World"))',
+    'SELECT name, COUNT(*)\nFROM section\nGROUP BY chapter_id;',
+    'const items = data.map(item => item.name);\nconsole.log(items);',
+    'for i in range(10):\n    if i % 2 == 0:\n        print(i)',
+)
+
+
+class _Ids:
+    """Hands out primary keys after the current maximum of a table."""
+
+    def __init__(self, connection, model):
+        self.next = (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+    def take(self, count):
+        start = self.next
+        self.next += count
+        return range(start, start + count)
+
+
+def _sentence(rng, words=12):
+    text_ = ' '.join(rng.choice(_WORDS) for _ in range(words))
+    return text_.capitalize() + '.'
+
+
+def _content(rng, size):
+    """Markdown-ish body of roughly ``size`` characters with headings and code blocks."""
+    parts = [f'# {_sentence(rng, 4)[:-1]}']
+    length = len(parts[0])
+    while length < size:
+        roll = rng.random()
+        if roll < 0.1:
+            part = f'## {_sentence(rng, 3)[:-1]}'
+        elif roll < 0.2:
+            part = f'```python\n{rng.choice(_CODE_SNIPPETS)}\n```'
+        else:
+            part = ' '.join(_sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 5)))
+        parts.append(part)
+        length += len(part) + 2
+    return '\n\n'.join(parts)[:max(size, 1)]
+
+
+def _timestamp(rng, after=BASE_TIME, days=365):
+    return after + timedelta(seconds=rng.randint(0, days * 86400))
+
+
+def _insert(connection, model, rows, batch_size):
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(insert(model.__table__), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        connection.execute(insert(model.__table__), batch)
+        total += len(batch)
+    return total
+
+
+def _sync_sequences(connection):
+    # Explicit ids don't advance Postgres sequences; move them past the new rows
+    for model in (User, Admin, Chapter, Section, ChapterComment, SectionComment):
+        table = model.__table__.name
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))"
+        ))
+
+
+def generate(admins=1, users=100, chapters=20, sections_per_chapter=10,
+             comments_per_chapter=5, comments_per_section=5, content_size=2000,
+             seed=42, batch_size=5000, build_search_index=True, render_content=True, echo=None):
+    """Insert a synthetic dataset and return the number of rows written per table."""
+    rng = random.Random(seed)
+    echo = echo or (lambda message: None)
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+    counts = {}
+
+    with db.engine.begin() as connection:
+        admin_ids = list(_Ids(connection, Admin).take(admins))
+        user_ids = list(_Ids(connection, User).take(users))
+        chapter_ids = _Ids(connection, Chapter).take(chapters)
+        section_ids = _Ids(connection, Section)
+        chapter_comment_ids = _Ids(connection, ChapterComment)
+        section_comment_ids = _Ids(connection, SectionComment)
+
+    def people(ids, kind):
+        for person_id in ids:
+            yield {
+                'id': person_id,
+                'first_name': f'{kind.capitalize()}{person_id}',
+                'last_name': 'Synthetic',
+                'email': f'{kind}{person_id}@synthetic.test',
+                'password_hash': password_hash,
+                'created_at': _timestamp(rng, days=30),
+            }
+
+    with db.engine.begin() as connection:
+        counts['admin'] = _insert(connection, Admin, people(admin_ids, 'admin'), batch_size)
+        counts['user'] = _insert(connection, User, people(user_ids, 'user'), batch_size)
+    echo(f"admins: {counts['admin']}, users: {counts['user']}")
+
+    chapter_rows = [{
+        'id': chapter_id,
+        'name': f'Chapter {chapter_id}: {_sentence(rng, 3)[:-1]}',
+        'admin_id': rng.choice(admin_ids),
+        'created_at': _timestamp(rng),
+        'section_count': sections_per_chapter,
+        'comment_count': comments_per_chapter if user_ids else 0,
+    } for chapter_id in chapter_ids]
+    for chapter in chapter_rows:
+        chapter['updated_at'] = chapter['created_at']
+    with db.engine.begin() as connection:
+        counts['chapter'] = _insert(connection, Chapter, chapter_rows, batch_size)
+    echo(f"chapters: {counts['chapter']}")
+
+    def sections():
+        for chapter in chapter_rows:
+            for n, section_id in enumerate(section_ids.take(sections_per_chapter), start=1):
+                created_at = _timestamp(rng, after=chapter['created_at'], days=30)
+                yield {
+                    'id': section_id,
+                    'name': f'Section {n}: {_sentence(rng, 3)[:-1]}',
+                    'content': _content(rng, content_size),
+                    'chapter_id': chapter['id'],
+                    'position': n,
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                    'comment_count': comments_per_section if user_ids else 0,
+                }
+
+    def chapter_comments():
+        if not user_ids:
+            return
+        for chapter in chapter_rows:
+            for comment_id in chapter_comment_ids.take(comments_per_chapter):
+                yield {
+                    'id': comment_id,
+                    'content': _sentence(rng, rng.randint(5, 30)),
+                    'user_id': rng.choice(user_ids),
+                    'chapter_id': chapter['id'],
+                    'created_at': _timestamp(rng, after=chapter['created_at'], days=60),
+                }
+
+    def section_comments(first_section_id, total_sections):
+        if not user_ids:
+            return
+        for section_id in range(first_section_id, first_section_id + total_sections):
+            for comment_id in section_comment_ids.take(comments_per_section):
+                yield {
+                    'id': comment_id,
+                    'content': _sentence(rng, rng.randint(5, 30)),
+                    'user_id': rng.choice(user_ids),
+                    'section_id': section_id,
+                    'created_at': _timestamp(rng, days=400),
+                }
+
+    first_section_id = section_ids.next
+    with db.engine.begin() as connection:
+        counts['section'] = _insert(connection, Section, sections(), batch_size)
+    echo(f"sections: {counts['section']}")
+    with db.engine.begin() as connection:
+        counts['chapter_comment'] = _insert(connection, ChapterComment, chapter_comments(), batch_size)
+        counts['section_comment'] = _insert(connection, SectionComment,
+                                            section_comments(first_section_id, counts['section']), batch_size)
+        if connection.dialect.name == 'postgresql':
+            _sync_sequences(connection)
+    echo(f"chapter comments: {counts['chapter_comment']}, section comments: {counts['section_comment']}")
+
+    if build_search_index:
+        from backend.search import rebuild
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        echo('search index rebuilt')
+    if render_content:
+        from backend.rendering import rerender
+        with db.engine.begin() as connection:
+            rerender(connection)
+        echo('section content rendered')
+    from backend.pagecache import clear
+    clear()
+    return counts
@@ -0,0 +1,56 @@
+"""Apply text edits sent by ``PATCH /api/sections/<id>``.
+
+An edit replaces ``text[start:end]`` of the base text with ``text``::
+
+    {"start": 1200, "end": 1204, "text": "their"}
+
+Offsets count UTF-16 code units, the same units as JavaScript string
+indices, so the editor can compute them straight from its strings. All
+offsets refer to the base text, and edits must be sorted and must not
+overlap. ``apply_edits`` raises ``ValueError`` for anything that does not
+apply cleanly.
+"""
+
+_UNIT = 2  # bytes per UTF-16 code unit
+
+
+def _offset(edit, key, limit):
+    value = edit.get(key)
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= limit:
+        raise ValueError(f'{key} must be an offset between 0 and {limit}')
+    return value
+
+
+def apply_edits(base, edits, length=None):
+    """Return ``base`` with ``edits`` applied.
+
+    ``length`` is the expected length of the result in UTF-16 code units;
+    when given, a mismatch is an error, which catches clients that computed
+    the edits against different text.
+    """
+    if not isinstance(edits, list):
+        raise ValueError('edits must be a list')
+    data = (base or '').encode('utf-16-le')
+    units = len(data) // _UNIT
+    parts = []
+    position = 0
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise ValueError('Each edit must be an object')
+        start = _offset(edit, 'start', units)
+        end = _offset(edit, 'end', units)
+        text = edit.get('text', '')
+        if not isinstance(text, str):
+            raise ValueError('text must be a string')
+        if start < position or end < start:
+            raise ValueError('Edits must be sorted and must not overlap')
+        parts += [data[position * _UNIT:start * _UNIT], text.encode('utf-16-le', 'surrogatepass')]
+        position = end
+    parts.append(data[position * _UNIT:])
+    data = b''.join(parts)
+    if length is not None and len(data) // _UNIT != length:
+        raise ValueError('The edited text does not have the expected length')
+    try:
+        return data.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError('An edit splits a character')
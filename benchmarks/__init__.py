@@ -0,0 +1 @@
+# Route benchmark suite (see benchmarks/run.py)
@@ -0,0 +1,48 @@
+"""Compare two benchmark result files route by route.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import json
+import sys
+
+
+def _change(old, new):
+    if not old:
+        return '    n/a'
+    return f'{(new - old) / old * 100:+6.1f}%'
+
+
+def compare(old, new, metric='p50_ms'):
+    lines = []
+    for scale, result in new['scales'].items():
+        baseline = old['scales'].get(scale, {}).get('routes', {})
+        lines.append(f"[{scale}] {old['meta']['commit']} -> {new['meta']['commit']} ({metric}, sql/request)")
+        for name, route in result['routes'].items():
+            before = baseline.get(name)
+            if before is None:
+                lines.append(f'  {name:<24} {route[metric]:>9.2f}  (new)')
+                continue
+            lines.append(
+                f'  {name:<24} {before[metric]:>9.2f} -> {route[metric]:>9.2f} {_change(before[metric], route[metric])}'
+                f"   sql {before['sql_per_request']:>6} -> {route['sql_per_request']:>6}"
+            )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--metric', default='p50_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'])
+    args = parser.parse_args(argv)
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(compare(old, new, args.metric))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""Route benchmarks: seed a database at several scales and time every route.
+
+Usage::
+
+    python -m benchmarks.run                       # small and medium
+    python -m benchmarks.run --scale large -n 200
+    python -m benchmarks.run --only index,section_detail
+    python -m benchmarks.compare old.json new.json
+
+Each scale runs in its own process against a fresh SQLite file (or the
+database given by ``--database-url``, which is wiped). Every scenario in
+``scenarios.py`` is requested through the Flask test client; the report has
+p50/p95/p99 latency, throughput, SQL statements per request and peak Python
+memory (from a separate ``tracemalloc`` pass, so it doesn't skew timings).
+Results are written as JSON under ``benchmarks/results/`` by default.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+SCALES = {
+    'small': dict(admins=1, users=50, chapters=20, sections_per_chapter=10,
+                  comments_per_chapter=10, comments_per_section=10, content_size=2000),
+    'medium': dict(admins=1, users=500, chapters=200, sections_per_chapter=25,
+                   comments_per_chapter=50, comments_per_section=50, content_size=4000),
+    'large': dict(admins=1, users=2000, chapters=1000, sections_per_chapter=20,
+                  comments_per_chapter=100, comments_per_section=50, content_size=4000),
+}
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class _StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def _fixture_ids(db):
+    from sqlalchemy import func, select
+    from backend.models import Chapter, Section
+    chapter_id = db.session.execute(select(func.min(Chapter.id)).where(Chapter.admin_id == 1)).scalar()
+    section_ids = db.session.execute(
+        select(func.min(Section.id), func.max(Section.id)).where(Section.chapter_id == chapter_id)
+    ).one()
+    db.session.remove()
+    return {'chapter': chapter_id, 'section': section_ids[0], 'last_section': section_ids[1]}
+
+
+def _client(app, role):
+    client = app.test_client()
+    if role:
+        with client.session_transaction() as flask_session:
+            flask_session['admin_id' if role == 'admin' else 'user_id'] = 1
+    return client
+
+
+def _request(client, scenario, ids, n):
+    if scenario.setup:
+        ids = dict(ids, **scenario.setup(client, ids, n))
+    path = scenario.path(ids, n) if callable(scenario.path) else scenario.path
+    body = scenario.body(ids, n) if callable(scenario.body) else scenario.body
+    return lambda: client.open(path, method=scenario.method, json=body)
+
+
+def _measure(app, scenario, ids, iterations, warmup, counter, offset):
+    client = _client(app, scenario.role)
+    for n in range(warmup):
+        _request(client, scenario, ids, offset + n)()
+    timings, statements, statuses = [], [], set()
+    for n in range(warmup, warmup + iterations):
+        send = _request(client, scenario, ids, offset + n)
+        before = counter.count
+        start = time.perf_counter()
+        response = send()
+        timings.append(time.perf_counter() - start)
+        statements.append(counter.count - before)
+        statuses.add(response.status_code)
+
+    tracemalloc.start()
+    send = _request(client, scenario, ids, offset + warmup + iterations)
+    tracemalloc.reset_peak()
+    send()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    total = sum(timings)
+    return {
+        'method': scenario.method,
+        'iterations': iterations,
+        'statuses': sorted(statuses),
+        'p50_ms': round(_percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(_percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(_percentile(timings, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'throughput_rps': round(iterations / total, 1) if total else None,
+        'sql_per_request': round(statistics.fmean(statements), 2),
+        'sql_max': max(statements),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_scale(scale, iterations, warmup, only=None, database_url=None):
+    """Seed one scale and benchmark every scenario; must run in a fresh process."""
+    workdir = None
+    if not database_url:
+        workdir = tempfile.mkdtemp(prefix='scriptscope-bench-')
+        database_url = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('PAGE_CACHE_PATH', os.path.join(tempfile.mkdtemp(prefix='scriptscope-cache-'), 'cache.db'))
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import event
+    from backend.app import app, db
+    from backend.migrations import reset
+    from backend import synthetic
+    from backend.routing import replica_engines
+    from benchmarks.scenarios import SCENARIOS
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with app.app_context():
+        reset(db.engine)
+        seed_start = time.perf_counter()
+        rows = synthetic.generate(seed=42, **SCALES[scale])
+        seed_seconds = time.perf_counter() - seed_start
+        ids = _fixture_ids(db)
+
+        counter = _StatementCounter()
+        engines = [db.engine]
+        with app.test_request_context():
+            engines += replica_engines()
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', counter)
+
+    results = {}
+    for offset, scenario in enumerate(SCENARIOS):
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = _measure(app, scenario, ids, iterations, warmup, counter,
+                                          offset * (warmup + iterations + 1))
+        print(f"  {scale:<7} {scenario.name:<24} p50 {results[scenario.name]['p50_ms']:>8.2f} ms  "
+              f"p95 {results[scenario.name]['p95_ms']:>8.2f} ms  "
+              f"sql {results[scenario.name]['sql_per_request']:>6}", file=sys.stderr)
+
+    return {
+        'database': db.engine.url.render_as_string(hide_password=True) if not workdir else 'sqlite (temporary file)',
+        'parameters': SCALES[scale],
+        'rows': rows,
+        'seed_seconds': round(seed_seconds, 2),
+        'routes': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', action='append', choices=sorted(SCALES),
+                        help='scale to run (repeatable, default: small and medium)')
+    parser.add_argument('-n', '--iterations', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests per route')
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--database-url', help='database to seed and benchmark (it is wiped)')
+    parser.add_argument('-o', '--output', help='result file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    only = set(args.only.split(',')) if args.only else None
+
+    if args.worker:
+        # Child process: one scale, result as JSON on stdout
+        result = run_scale(args.worker, args.iterations, args.warmup, only, args.database_url)
+        json.dump(result, sys.stdout)
+        return 0
+
+    commit = _git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+        },
+        'scales': {},
+    }
+    for scale in args.scale or ['small', 'medium']:
+        print(f'Benchmarking {scale} ...', file=sys.stderr)
+        command = [sys.executable, '-m', 'benchmarks.run', '--worker', scale,
+                   '-n', str(args.iterations), '--warmup', str(args.warmup)]
+        if args.only:
+            command += ['--only', args.only]
+        if args.database_url:
+            command += ['--database-url', args.database_url]
+        # Each scale gets a fresh interpreter so the app binds to its own database
+        completed = subprocess.run(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            print(f'{scale} failed', file=sys.stderr)
+            return completed.returncode
+        report['scales'][scale] = json.loads(completed.stdout)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{stamp}-{commit}.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Requests driven by the benchmark, covering every route in backend/routes.py.
+
+``path`` and ``body`` may be callables taking the fixture ids and the
+iteration number, so scenarios can refer to rows of the seeded data and
+writes don't collide. ``setup`` runs untimed before each request and may add
+ids (e.g. a fresh section for the delete scenario to remove).
+"""
+from collections import namedtuple
+
+Scenario = namedtuple('Scenario', 'name role method path body setup', defaults=(None, None))
+
+
+def _new_section(client, ids, n):
+    response = client.post('/api/sections', json={
+        'chapter_id': ids['chapter'], 'name': f'Doomed section {n}', 'content': 'x'})
+    return {'victim': response.get_json()['section']['id']}
+
+
+def _new_chapter(client, ids, n):
+    response = client.post('/api/chapters', json={'name': f'Doomed chapter {n}'})
+    return {'victim': response.get_json()['chapter']['id']}
+
+
+def _new_sections(client, ids, n, count=10):
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'create', 'type': 'section', 'chapter_id': ids['chapter'], 'name': f'Doomed section {n}.{i}',
+         'content': 'x'} for i in range(count)]})
+    return {'victims': [result['section']['id'] for result in response.get_json()['results']]}
+
+
+def _section_base(client, ids, n):
+    section = client.get(f"/api/section/{ids['section']}?fields=content,version").get_json()
+    return {'version': section['version'], 'first': (section['content'] or ' ')[0]}
+
+
+def _reversed_order(client, ids, n):
+    sections = client.get(f"/api/admin/sections/{ids['chapter']}").get_json()
+    return {'order': [section['id'] for section in reversed(sections)]}
+
+
+READ = [
+    Scenario('index', None, 'GET', '/'),
+    Scenario('index_sort_date', None, 'GET', '/?sort=date'),
+    Scenario('index_search', None, 'GET', '/?search=python+function'),
+    Scenario('admin_home', None, 'GET', '/admin/'),
+    Scenario('login', None, 'GET', '/login'),
+    Scenario('admin_auth', None, 'GET', '/admin'),
+    Scenario('dashboard', 'user', 'GET', '/dashboard'),
+    Scenario('chapter_detail', 'user', 'GET', lambda ids, n: f"/chapter/{ids['chapter']}"),
+    Scenario('section_detail', 'user', 'GET',
+             lambda ids, n: f"/chapter/{ids['chapter']}/section/{ids['section']}"),
+    Scenario('section_detail_last', 'user', 'GET',
+             lambda ids, n: f"/chapter/{ids['chapter']}/section/{ids['last_section']}"),
+    Scenario('api_get_section', 'admin', 'GET', lambda ids, n: f"/api/section/{ids['section']}"),
+    Scenario('get_chapter_comments', 'user', 'GET', lambda ids, n: f"/api/chapter_comments/{ids['chapter']}"),
+    Scenario('get_section_comments', 'user', 'GET', lambda ids, n: f"/api/section_comments/{ids['section']}"),
+    Scenario('api_search', None, 'GET', '/api/search?q=database+index'),
+    Scenario('admin_dashboard', 'admin', 'GET', '/admin/dashboard'),
+    Scenario('edit_chapter_form', 'admin', 'GET', '/admin/chapter/edit'),
+    Scenario('delete_chapter_form', 'admin', 'GET', '/admin/chapter/delete'),
+    Scenario('edit_section_form', 'admin', 'GET', '/admin/section/edit'),
+    Scenario('delete_section_form', 'admin', 'GET', '/admin/section/delete'),
+    Scenario('create_chapter_form', 'admin', 'GET', '/admin/chapter/create'),
+    Scenario('create_section_form', 'admin', 'GET', '/admin/section/create'),
+    Scenario('edit_chapter', 'admin', 'GET', lambda ids, n: f"/admin/chapter/{ids['chapter']}/edit"),
+    Scenario('create_section', 'admin', 'GET', lambda ids, n: f"/admin/chapter/{ids['chapter']}/section/create"),
+    Scenario('get_admin_chapters', 'admin', 'GET', '/api/admin/chapters'),
+    Scenario('get_admin_sections', 'admin', 'GET', lambda ids, n: f"/api/admin/sections/{ids['chapter']}"),
+    Scenario('get_pool_stats', 'admin', 'GET', '/api/admin/pool'),
+]
+
+WRITE = [
+    Scenario('add_chapter_comment', 'user', 'POST', '/api/chapter_comments',
+             lambda ids, n: {'chapter_id': ids['chapter'], 'content': f'Benchmark comment {n}'}),
+    Scenario('add_section_comment', 'user', 'POST', '/api/section_comments',
+             lambda ids, n: {'section_id': ids['section'], 'content': f'Benchmark comment {n}'}),
+    Scenario('api_create_chapter', 'admin', 'POST', '/api/chapters',
+             lambda ids, n: {'name': f'Benchmark chapter {n}'}),
+    Scenario('api_edit_chapter', 'admin', 'PUT', lambda ids, n: f"/api/chapters/{ids['chapter']}",
+             lambda ids, n: {'name': f'Renamed chapter {n}'}),
+    Scenario('api_delete_chapter', 'admin', 'DELETE', lambda ids, n: f"/api/chapters/{ids['victim']}",
+             setup=_new_chapter),
+    Scenario('api_create_section', 'admin', 'POST', '/api/sections',
+             lambda ids, n: {'chapter_id': ids['chapter'], 'name': f'Benchmark section {n}',
+                             'content': 'Benchmark body ' * 200}),
+    Scenario('api_edit_section', 'admin', 'PUT', lambda ids, n: f"/api/sections/{ids['section']}",
+             lambda ids, n: {'name': 'Edited section', 'content': f'Edited body {n} ' * 200}),
+    Scenario('api_patch_section', 'admin', 'PATCH', lambda ids, n: f"/api/sections/{ids['section']}",
+             lambda ids, n: {'base_version': ids['version'],
+                             'edits': [{'start': 0, 'end': 1, 'text': 'y' if ids['first'] == 'x' else 'x'}]},
+             setup=_section_base),
+    Scenario('api_delete_section', 'admin', 'DELETE', lambda ids, n: f"/api/sections/{ids['victim']}",
+             setup=_new_section),
+    Scenario('api_reorder_sections', 'admin', 'PUT', lambda ids, n: f"/api/chapters/{ids['chapter']}/sections/order",
+             lambda ids, n: {'section_ids': ids['order']}, setup=_reversed_order),
+    Scenario('api_batch_delete_sections', 'admin', 'POST', '/api/batch',
+             lambda ids, n: {'operations': [{'op': 'delete', 'type': 'section', 'id': victim}
+                                            for victim in ids['victims']]}, setup=_new_sections),
+    Scenario('api_bulk_import', 'admin', 'POST', '/api/admin/import',
+             lambda ids, n: [{'name': f'Imported chapter {n}',
+                              'sections': [{'name': f'Part {i}', 'content': 'Imported body'} for i in range(20)]}]),
+]
+
+SCENARIOS = READ + WRITE
@@ -1,68 +1,182 @@
-// JS for chapter_detail.html
-
-document.addEventListener('DOMContentLoaded', function() {
-    const commentContent = document.getElementById('commentContent');
-    if (commentContent) {
-        commentContent.removeAttribute('disabled');
-        commentContent.removeAttribute('readonly');
-        commentContent.value = '';
-    }
-
-    const addCommentModal = document.getElementById('addCommentModal');
-    addCommentModal.addEventListener('show.bs.modal', function (event) {
-        if (commentContent) {
-            commentContent.value = '';
-            commentContent.focus();
-        }
-        const form = document.getElementById('addCommentForm');
-        form.removeAttribute('data-chapter-id');
-        form.removeAttribute('data-section-id');
-        const button = event.relatedTarget;
-        if (button && button.hasAttribute('data-chapter-id')) {
-            form.setAttribute('data-chapter-id', button.getAttribute('data-chapter-id'));
-        } else if (button && button.hasAttribute('data-section-id')) {
-            form.setAttribute('data-section-id', button.getAttribute('data-section-id'));
-        }
-    });
-
-    const addCommentForm = document.getElementById('addCommentForm');
-    addCommentForm.addEventListener('submit', function(e) {
-        e.preventDefault();
-        const content = commentContent.value.trim();
-        if (!content) {
-            alert('Comment cannot be empty.');
-            return;
-        }
-        let endpoint = '';
-        let payload = { content: content };
-        if (addCommentForm.hasAttribute('data-chapter-id')) {
-            endpoint = '/api/chapter_comments';
-            payload.chapter_id = addCommentForm.getAttribute('data-chapter-id');
-        } else if (addCommentForm.hasAttribute('data-section-id')) {
-            endpoint = '/api/section_comments';
-            payload.section_id = addCommentForm.getAttribute('data-section-id');
-        } else {
-            alert('No target for comment.');
-            return;
-        }
-        fetch(endpoint, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(payload)
-        })
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                var modalInstance = bootstrap.Modal.getOrCreateInstance(addCommentModal);
-                modalInstance.hide();
-                alert('Comment added successfully!');
-                addCommentForm.reset();
-            } else {
-                alert(data.message || 'Failed to add comment.');
-            }
-        })
-        .catch(() => {
-            alert('Error submitting comment.');
-        });
-    });
-});
+// JS for chapter_detail.html
+
+// Comments are fetched one keyset page at a time; "Load more" follows next_cursor
+function renderComment(comment) {
+    const item = document.createElement('div');
+    item.className = 'comment-item mb-3';
+    item.dataset.commentId = comment.id;
+    const author = document.createElement('strong');
+    author.textContent = comment.user_name;
+    const body = document.createElement('div');
+    body.textContent = comment.content;
+    const time = document.createElement('small');
+    time.className = 'text-muted';
+    time.textContent = comment.created_at;
+    item.append(author, body, time);
+    return item;
+}
+
+function loadComments(type, id, cursor) {
+    const container = document.getElementById('commentsContainer');
+    const params = new URLSearchParams();
+    if (cursor) {
+        params.set('cursor', cursor);
+    } else {
+        container.innerHTML = '<div class="text-center text-muted">Loading...</div>';
+    }
+    const endpoint = `/api/${type}_comments/${id}?${params}`;
+    return fetch(endpoint)
+        .then(response => response.json())
+        .then(data => {
+            if (!cursor) {
+                container.innerHTML = '';
+            }
+            const moreButton = container.querySelector('.load-more-comments');
+            if (moreButton) {
+                moreButton.remove();
+            }
+            if (!cursor) {
+                followComments(type, id, data.comments.length ? data.comments[0].id : 0);
+            }
+            if (!cursor && data.comments.length === 0) {
+                container.innerHTML = '<div class="text-center text-muted no-comments">No Comments</div>';
+                return;
+            }
+            data.comments.forEach(comment => container.appendChild(renderComment(comment)));
+            if (data.next_cursor) {
+                const button = document.createElement('button');
+                button.type = 'button';
+                button.className = 'btn btn-outline-secondary btn-sm w-100 load-more-comments';
+                button.textContent = 'Load more';
+                button.addEventListener('click', () => loadComments(type, id, data.next_cursor));
+                container.appendChild(button);
+            }
+        })
+        .catch(() => {
+            container.innerHTML = '<div class="text-center text-danger">Error loading comments.</div>';
+        });
+}
+
+// New comments show up while the list is open. With COMMENT_STREAM_ENABLED
+// they arrive over Server-Sent Events; on reconnect the browser sends
+// Last-Event-ID and the server fills the gap. Otherwise the first page of the
+// listing is fetched again every COMMENT_REFRESH_MS.
+const COMMENT_REFRESH_MS = 15000;
+let commentStream = null;
+let commentRefresh = null;
+
+function showNewComment(comment) {
+    const container = document.getElementById('commentsContainer');
+    if (container.querySelector(`[data-comment-id="${comment.id}"]`)) {
+        return;
+    }
+    const placeholder = container.querySelector('.no-comments');
+    if (placeholder) {
+        placeholder.remove();
+    }
+    container.prepend(renderComment(comment));
+}
+
+function followComments(type, id, lastId) {
+    stopFollowingComments();
+    if (window.commentStreamEnabled && window.EventSource) {
+        commentStream = new EventSource(`/api/${type}_comments/${id}/stream?last_event_id=${lastId}`);
+        commentStream.addEventListener('comment', event => showNewComment(JSON.parse(event.data)));
+        return;
+    }
+    commentRefresh = setInterval(() => {
+        fetch(`/api/${type}_comments/${id}`)
+            .then(response => response.json())
+            // Newest first, so prepend the oldest new one first
+            .then(data => data.comments.slice().reverse().forEach(showNewComment))
+            .catch(() => {});
+    }, COMMENT_REFRESH_MS);
+}
+
+function stopFollowingComments() {
+    if (commentStream) {
+        commentStream.close();
+        commentStream = null;
+    }
+    if (commentRefresh) {
+        clearInterval(commentRefresh);
+        commentRefresh = null;
+    }
+}
+
+function showCommentsFor(type, id) {
+    loadComments(type, id);
+    bootstrap.Modal.getOrCreateInstance(document.getElementById('commentModal')).show();
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const commentContent = document.getElementById('commentContent');
+    if (commentContent) {
+        commentContent.removeAttribute('disabled');
+        commentContent.removeAttribute('readonly');
+        commentContent.value = '';
+    }
+
+    const commentModal = document.getElementById('commentModal');
+    if (commentModal) {
+        commentModal.addEventListener('hidden.bs.modal', stopFollowingComments);
+    }
+
+    const addCommentModal = document.getElementById('addCommentModal');
+    addCommentModal.addEventListener('show.bs.modal', function (event) {
+        if (commentContent) {
+            commentContent.value = '';
+            commentContent.focus();
+        }
+        const form = document.getElementById('addCommentForm');
+        form.removeAttribute('data-chapter-id');
+        form.removeAttribute('data-section-id');
+        const button = event.relatedTarget;
+        if (button && button.hasAttribute('data-chapter-id')) {
+            form.setAttribute('data-chapter-id', button.getAttribute('data-chapter-id'));
+        } else if (button && button.hasAttribute('data-section-id')) {
+            form.setAttribute('data-section-id', button.getAttribute('data-section-id'));
+        }
+    });
+
+    const addCommentForm = document.getElementById('addCommentForm');
+    addCommentForm.addEventListener('submit', function(e) {
+        e.preventDefault();
+        const content = commentContent.value.trim();
+        if (!content) {
+            alert('Comment cannot be empty.');
+            return;
+        }
+        let endpoint = '';
+        let payload = { content: content };
+        if (addCommentForm.hasAttribute('data-chapter-id')) {
+            endpoint = '/api/chapter_comments';
+            payload.chapter_id = addCommentForm.getAttribute('data-chapter-id');
+        } else if (addCommentForm.hasAttribute('data-section-id')) {
+            endpoint = '/api/section_comments';
+            payload.section_id = addCommentForm.getAttribute('data-section-id');
+        } else {
+            alert('No target for comment.');
+            return;
+        }
+        fetch(endpoint, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(payload)
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                var modalInstance = bootstrap.Modal.getOrCreateInstance(addCommentModal);
+                modalInstance.hide();
+                alert('Comment added successfully!');
+                addCommentForm.reset();
+            } else {
+                alert(data.message || 'Failed to add comment.');
+            }
+        })
+        .catch(() => {
+            alert('Error submitting comment.');
+        });
+    });
+});
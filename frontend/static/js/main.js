@@ -294,21 +294,33 @@ class ScriptScopeApp {
     }
 
     // Load data functions
+    chapters() {
+        // One request fills every chapter dropdown until the next write
+        if (!this.chaptersRequest) {
+            this.chaptersRequest = fetch('/api/admin/chapters').then(response => {
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                return response.json();
+            });
+            this.chaptersRequest.catch(() => { this.chaptersRequest = null; });
+        }
+        return this.chaptersRequest;
+    }
+
+    fillChapterSelect(select, placeholder, chapters) {
+        if (!select) return;
+        select.innerHTML = placeholder === null ? '' : `<option value="">${placeholder}</option>`;
+        chapters.forEach(chapter => {
+            const option = document.createElement('option');
+            option.value = chapter.id;
+            option.textContent = chapter.name;
+            select.appendChild(option);
+        });
+    }
+
     async loadChaptersForEdit() {
         try {
-            const response = await fetch('/api/admin/chapters');
-            const chapters = await response.json();
-            const select = document.getElementById('editChapterSelect');
-            
-            if (select) {
-                select.innerHTML = '<option value="">Choose a chapter to edit...</option>';
-                chapters.forEach(chapter => {
-                    const option = document.createElement('option');
-                    option.value = chapter.id;
-                    option.textContent = chapter.name;
-                    select.appendChild(option);
-                });
-            }
+            const chapters = await this.chapters();
+            this.fillChapterSelect(document.getElementById('editChapterSelect'), 'Choose a chapter to edit...', chapters);
         } catch (error) {
             this.showToast('Failed to load chapters', 'error');
             console.error('Error loading chapters:', error);
@@ -317,19 +329,9 @@ class ScriptScopeApp {
 
     async loadChaptersForDelete() {
         try {
-            const response = await fetch('/api/admin/chapters');
-            const chapters = await response.json();
-            const select = document.getElementById('deleteChapterSelect');
-            
-            if (select) {
-                select.innerHTML = '<option value="">Choose a chapter to delete...</option>';
-                chapters.forEach(chapter => {
-                    const option = document.createElement('option');
-                    option.value = chapter.id;
-                    option.textContent = chapter.name;
-                    select.appendChild(option);
-                });
-            }
+            const chapters = await this.chapters();
+            // Multi-select: no placeholder option
+            this.fillChapterSelect(document.getElementById('deleteChapterSelect'), null, chapters);
         } catch (error) {
             this.showToast('Failed to load chapters', 'error');
             console.error('Error loading chapters:', error);
@@ -338,44 +340,10 @@ class ScriptScopeApp {
 
     async loadChaptersForSection() {
         try {
-            const response = await fetch('/api/admin/chapters');
-            const chapters = await response.json();
-            
-            // Load for create section modal
-            const createSelect = document.getElementById('createSectionChapterSelect');
-            if (createSelect) {
-                createSelect.innerHTML = '<option value="">Choose a chapter...</option>';
-                chapters.forEach(chapter => {
-                    const option = document.createElement('option');
-                    option.value = chapter.id;
-                    option.textContent = chapter.name;
-                    createSelect.appendChild(option);
-                });
-            }
-
-            // Load for edit section modal
-            const editSelect = document.getElementById('editSectionChapterSelect');
-            if (editSelect) {
-                editSelect.innerHTML = '<option value="">Choose a chapter...</option>';
-                chapters.forEach(chapter => {
-                    const option = document.createElement('option');
-                    option.value = chapter.id;
-                    option.textContent = chapter.name;
-                    editSelect.appendChild(option);
-                });
-            }
-
-            // Load for delete section modal
-            const deleteSelect = document.getElementById('deleteSectionChapterSelect');
-            if (deleteSelect) {
-                deleteSelect.innerHTML = '<option value="">Choose a chapter...</option>';
-                chapters.forEach(chapter => {
-                    const option = document.createElement('option');
-                    option.value = chapter.id;
-                    option.textContent = chapter.name;
-                    deleteSelect.appendChild(option);
-                });
-            }
+            const chapters = await this.chapters();
+            ['createSectionChapterSelect', 'editSectionChapterSelect', 'deleteSectionChapterSelect'].forEach(id => {
+                this.fillChapterSelect(document.getElementById(id), 'Choose a chapter...', chapters);
+            });
         } catch (error) {
             this.showToast('Failed to load chapters', 'error');
             console.error('Error loading chapters:', error);
@@ -384,12 +352,12 @@ class ScriptScopeApp {
 
     async loadSectionsForChapter(chapterId, sectionSelectId) {
         try {
-            const response = await fetch(`/api/admin/sections/${chapterId}`);
+            const response = await fetch(`/api/admin/sections/${chapterId}?fields=id,name`);
             const sections = await response.json();
             const select = document.getElementById(sectionSelectId);
             
             if (select) {
-                select.innerHTML = '<option value="">Choose a section...</option>';
+                select.innerHTML = select.multiple ? '' : '<option value="">Choose a section...</option>';
                 sections.forEach(section => {
                     const option = document.createElement('option');
                     option.value = section.id;
@@ -404,13 +372,13 @@ class ScriptScopeApp {
     }
 
     async loadSectionData(sectionId) {
+        this.editSectionVersion = undefined;
         try {
-            const chapterId = document.getElementById('editSectionChapterSelect').value;
-            const response = await fetch(`/api/admin/sections/${chapterId}`);
-            const sections = await response.json();
-            
-            const section = sections.find(s => s.id == sectionId);
-            if (section) {
+            const response = await fetch(`/api/section/${sectionId}?fields=name,content,version`);
+            if (response.ok) {
+                const section = await response.json();
+                // Saving fails with a conflict if someone else edits the section meanwhile
+                this.editSectionVersion = section.version;
                 const nameInput = document.getElementById('editSectionName');
                 if (nameInput) nameInput.value = section.name;
                 
@@ -425,183 +393,132 @@ class ScriptScopeApp {
     }
 
     // CRUD Operations
-    async createChapter(e) {
-        const formData = new FormData(e.target);
-        const data = {
-            name: formData.get('name')
-        };
+    // Every admin write goes through POST /api/batch: several operations
+    // (e.g. a multi-select delete) cost one request and one transaction.
+    async batch(operations, mode = 'atomic') {
+        const response = await fetch('/api/batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ mode, operations })
+        });
+        const result = await response.json();
+        if (result.results) {
+            // Chapter dropdowns are refetched after any change
+            this.chaptersRequest = null;
+        }
+        return result;
+    }
 
-        try {
-            const response = await fetch('/api/chapters', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(data)
-            });
+    // The first failure of a batch, as a message for a toast
+    batchError(result, fallback) {
+        const failed = (result.results || []).find(r => !r.success && r.status !== 424);
+        return (failed && failed.message) || result.message || fallback;
+    }
 
-            const result = await response.json();
-            
+    async runAdminBatch(operations, { success, failure, modal }) {
+        try {
+            const result = await this.batch(operations);
             if (result.success) {
-                this.showToast('Chapter created successfully!', 'success');
-                this.closeModal('createChapterModal');
+                this.showToast(success, 'success');
+                if (modal) this.closeModal(modal);
                 setTimeout(() => location.reload(), 1000);
             } else {
-                this.showToast(result.message || 'Failed to create chapter', 'error');
+                this.showToast(this.batchError(result, failure), 'error');
             }
+            return result;
         } catch (error) {
-            this.showToast('Error creating chapter', 'error');
-            console.error('Error creating chapter:', error);
+            this.showToast(failure, 'error');
+            console.error(failure, error);
         }
     }
 
+    async createChapter(e) {
+        const formData = new FormData(e.target);
+        await this.runAdminBatch([{ op: 'create', type: 'chapter', name: formData.get('name') }], {
+            success: 'Chapter created successfully!',
+            failure: 'Failed to create chapter',
+            modal: 'createChapterModal'
+        });
+    }
+
     async updateChapter(e) {
         const formData = new FormData(e.target);
         const chapterId = formData.get('chapter_id');
-        const data = {
-            name: formData.get('name')
-        };
 
         if (!chapterId) {
             this.showToast('Please select a chapter to edit', 'error');
             return;
         }
 
-        try {
-            const response = await fetch(`/api/chapters/${chapterId}`, {
-                method: 'PUT',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(data)
-            });
-
-            const result = await response.json();
-            
-            if (result.success) {
-                this.showToast('Chapter updated successfully!', 'success');
-                this.closeModal('editChapterModal');
-                setTimeout(() => location.reload(), 1000);
-            } else {
-                this.showToast(result.message || 'Failed to update chapter', 'error');
-            }
-        } catch (error) {
-            this.showToast('Error updating chapter', 'error');
-            console.error('Error updating chapter:', error);
-        }
+        await this.runAdminBatch([{ op: 'update', type: 'chapter', id: Number(chapterId), name: formData.get('name') }], {
+            success: 'Chapter updated successfully!',
+            failure: 'Failed to update chapter',
+            modal: 'editChapterModal'
+        });
     }
 
     async createSection(e) {
         const formData = new FormData(e.target);
         const content = this.createQuillEditor ? this.createQuillEditor.root.innerHTML : formData.get('content');
-        
-        const data = {
-            chapter_id: formData.get('chapter_id'),
+
+        await this.runAdminBatch([{
+            op: 'create',
+            type: 'section',
+            chapter_id: Number(formData.get('chapter_id')),
             name: formData.get('name'),
             content: content
-        };
-
-        try {
-            const response = await fetch('/api/sections', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(data)
-            });
-
-            const result = await response.json();
-            
-            if (result.success) {
-                this.showToast('Section created successfully!', 'success');
-                this.closeModal('createSectionModal');
-                setTimeout(() => location.reload(), 1000);
-            } else {
-                this.showToast(result.message || 'Failed to create section', 'error');
-            }
-        } catch (error) {
-            this.showToast('Error creating section', 'error');
-            console.error('Error creating section:', error);
-        }
+        }], {
+            success: 'Section created successfully!',
+            failure: 'Failed to create section',
+            modal: 'createSectionModal'
+        });
     }
 
     async updateSection(e) {
         const formData = new FormData(e.target);
         const sectionId = formData.get('section_id');
         const content = this.editQuillEditor ? this.editQuillEditor.root.innerHTML : formData.get('content');
-        
-        const data = {
-            name: formData.get('name'),
-            content: content
-        };
 
         if (!sectionId) {
             this.showToast('Please select a section to edit', 'error');
             return;
         }
 
-        try {
-            const response = await fetch(`/api/sections/${sectionId}`, {
-                method: 'PUT',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(data)
-            });
-
-            const result = await response.json();
-            
-            if (result.success) {
-                this.showToast('Section updated successfully!', 'success');
-                this.closeModal('editSectionModal');
-                setTimeout(() => location.reload(), 1000);
-            } else {
-                this.showToast(result.message || 'Failed to update section', 'error');
-            }
-        } catch (error) {
-            this.showToast('Error updating section', 'error');
-            console.error('Error updating section:', error);
-        }
+        const operation = { op: 'update', type: 'section', id: Number(sectionId), name: formData.get('name'), content: content };
+        if (this.editSectionVersion !== undefined) operation.base_version = this.editSectionVersion;
+        await this.runAdminBatch([operation], {
+            success: 'Section updated successfully!',
+            failure: 'Failed to update section',
+            modal: 'editSectionModal'
+        });
     }
 
-    async deleteChapter(chapterId) {
-        try {
-            const response = await fetch(`/api/chapters/${chapterId}`, {
-                method: 'DELETE'
-            });
+    async deleteChapters(chapterIds, modal) {
+        const count = chapterIds.length;
+        await this.runAdminBatch(chapterIds.map(id => ({ op: 'delete', type: 'chapter', id: Number(id) })), {
+            success: count === 1 ? 'Chapter deleted successfully!' : `${count} chapters deleted successfully!`,
+            failure: count === 1 ? 'Failed to delete chapter' : 'Failed to delete chapters',
+            modal
+        });
+    }
 
-            const result = await response.json();
-            
-            if (result.success) {
-                this.showToast('Chapter deleted successfully!', 'success');
-                setTimeout(() => location.reload(), 1000);
-            } else {
-                this.showToast(result.message || 'Failed to delete chapter', 'error');
-            }
-        } catch (error) {
-            this.showToast('Error deleting chapter', 'error');
-            console.error('Error deleting chapter:', error);
-        }
+    async deleteSections(sectionIds, modal) {
+        const count = sectionIds.length;
+        await this.runAdminBatch(sectionIds.map(id => ({ op: 'delete', type: 'section', id: Number(id) })), {
+            success: count === 1 ? 'Section deleted successfully!' : `${count} sections deleted successfully!`,
+            failure: count === 1 ? 'Failed to delete section' : 'Failed to delete sections',
+            modal
+        });
     }
 
-    async deleteSection(sectionId) {
-        try {
-            const response = await fetch(`/api/sections/${sectionId}`, {
-                method: 'DELETE'
-            });
+    deleteChapter(chapterId) {
+        return this.deleteChapters([chapterId]);
+    }
 
-            const result = await response.json();
-            
-            if (result.success) {
-                this.showToast('Section deleted successfully!', 'success');
-                setTimeout(() => location.reload(), 1000);
-            } else {
-                this.showToast(result.message || 'Failed to delete section', 'error');
-            }
-        } catch (error) {
-            this.showToast('Error deleting section', 'error');
-            console.error('Error deleting section:', error);
-        }
+    deleteSection(sectionId) {
+        return this.deleteSections([sectionId]);
     }
 
     // Comment functionality
@@ -700,30 +617,41 @@ class ScriptScopeApp {
 }
 
 // Global functions for template usage
-function showConfirmDelete(type, id, name) {
+// ``ids`` and ``names`` may be single values or arrays (multi-select deletes)
+function showConfirmDelete(type, ids, names, sourceModalId) {
     const modal = document.getElementById('confirmDeleteModal');
     const modalBody = modal.querySelector('.modal-body');
     const confirmBtn = document.getElementById('confirmDeleteActionBtn');
-    
+    ids = [].concat(ids);
+    names = [].concat(names);
+
+    const escape = (text) => {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    };
+    const what = ids.length === 1
+        ? `the ${type} <strong>"${escape(names[0])}"</strong>`
+        : `these ${ids.length} ${type}s:<ul class="mb-0 mt-2">${names.map(name => `<li>${escape(name)}</li>`).join('')}</ul>`;
     modalBody.innerHTML = `
         <div class="alert alert-danger">
             <i class="fas fa-exclamation-triangle me-2"></i>
-            Are you sure you want to delete the ${type} <strong>"${name}"</strong>?
-            ${type === 'chapter' ? '<br><small>This will also delete all sections within this chapter.</small>' : ''}
+            Are you sure you want to delete ${what}
+            ${type === 'chapter' ? '<br><small>This will also delete all sections within ' + (ids.length === 1 ? 'this chapter' : 'these chapters') + '.</small>' : ''}
         </div>
         <p class="text-muted">This action cannot be undone.</p>
     `;
-    
+
     confirmBtn.onclick = () => {
         if (type === 'chapter') {
-            window.scriptScopeApp.deleteChapter(id);
+            window.scriptScopeApp.deleteChapters(ids, sourceModalId);
         } else if (type === 'section') {
-            window.scriptScopeApp.deleteSection(id);
+            window.scriptScopeApp.deleteSections(ids, sourceModalId);
         }
         bootstrap.Modal.getInstance(modal).hide();
     };
-    
-    const bsModal = new bootstrap.Modal(modal);
+
+    const bsModal = bootstrap.Modal.getOrCreateInstance(modal);
     bsModal.show();
 }
 
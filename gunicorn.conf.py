@@ -0,0 +1,29 @@
+# Picked up automatically by `gunicorn main:app` when run from the project root.
+import os
+import shutil
+
+# Live comment streams (COMMENT_STREAM_ENABLED=1) keep a request open per
+# reader. A sync worker serves one request at a time, so a few readers would
+# take every worker; enable streams only with `-k gevent` or `-k gthread`
+# (with --threads above the expected number of readers per worker).
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+
+def on_starting(server):
+    # Samples left by a previous run would be summed into the new one
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def when_ready(server):
+    if os.environ.get('COMMENT_STREAM_ENABLED') == '1' and server.cfg.worker_class_str == 'sync':
+        server.log.warning('COMMENT_STREAM_ENABLED is on with sync workers; '
+                           'each open comment stream will hold a whole worker')
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)